@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+# Adaptive replication: run every point of a sweep with more seeds, in waves,
+# until the confidence interval of its PDR (or another metric of the parse
+# scripts) is narrow enough.
+#
+# Every wave dispatches the next seeds of the points that have not converged
+# yet (min_seeds seeds in the first wave, wave_size seeds in later waves), with
+# parsing on the workers (see run_simulation). After the wave, the metric of
+# every new run is taken from the per-simulation output of the parse scripts
+# and the Student t confidence interval of the mean is computed per point. A
+# point stops once the interval is at most target_width wide or it has run
+# max_seeds seeds, so the compute goes to the points with a high variance.
+#
+# Replica 0 of a point is its original command (so earlier results are
+# reused), replica r runs with seed randomSeed + r*seed_stride and writes its
+# output to <outputFileNamePrefix>_<r>.
+import math
+from ns3_command import get_ns3_arg, set_ns3_arg
+from simulation_tasks import parse_simulation_output
+from utils import dispatch_simulation_tasks
+
+default_metric = "parse_macpackets_trace:simulationCompact:PDR"
+
+# Continued fraction of the regularised incomplete beta function (Numerical
+# Recipes, betacf)
+def incomplete_beta_fraction(a, b, x):
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        for aa in (m * (b - m) * x / ((a + m2 - 1.0) * (a + m2)), -(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1.0))):
+            d = 1.0 + aa * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + aa / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return h
+
+# Regularised incomplete beta function I_x(a, b)
+def incomplete_beta(a, b, x):
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * incomplete_beta_fraction(a, b, x) / a
+    return 1.0 - front * incomplete_beta_fraction(b, a, 1.0 - x) / b
+
+# Cumulative distribution function of the Student t distribution
+def t_cdf(t, degrees_of_freedom):
+    tail = 0.5 * incomplete_beta(degrees_of_freedom / 2.0, 0.5, degrees_of_freedom / (degrees_of_freedom + t * t))
+    return 1.0 - tail if t >= 0 else tail
+
+# Returns t such that P(T <= t) = p for the Student t distribution (bisection)
+def t_quantile(p, degrees_of_freedom):
+    low, high = 0.0, 1.0
+    while t_cdf(high, degrees_of_freedom) < p:
+        high *= 2
+    for i in range(100):
+        middle = (low + high) / 2
+        if t_cdf(middle, degrees_of_freedom) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+# Returns (mean, standard deviation, half width of the confidence interval of
+# the mean) of values; the half width is infinite with fewer than two values
+def confidence_interval(values, confidence):
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, 0.0, float('inf')
+    std_dev = math.sqrt(sum((v - mean)**2 for v in values) / (n - 1))
+    return mean, std_dev, t_quantile(0.5 + confidence / 2, n - 1) * std_dev / math.sqrt(n)
+
+# Returns the command of replica replica of the simulation command
+def replica_command(command, replica, seed_stride):
+    if replica == 0:
+        return command
+    seed = get_ns3_arg(command, 'randomSeed')
+    prefix = get_ns3_arg(command, 'outputFileNamePrefix')
+    if seed is None or prefix is None:
+        raise ValueError("Adaptive replication requires --randomSeed and --outputFileNamePrefix in {}".format(command))
+    command = set_ns3_arg(command, 'randomSeed', str(int(seed) + replica*seed_stride))
+    return set_ns3_arg(command, 'outputFileNamePrefix', "{}_{}".format(prefix, replica))
+
+# Returns the value of metric ("<parse script>:<output>:<column>", e.g.
+# "parse_macpackets_trace:simulationCompact:PDR") in parsed_outputs (see
+# parse_simulation_output), None when the parse script did not run
+def get_metric(parsed_outputs, metric):
+    module_name, output_name, column = metric.split(':')
+    if module_name not in parsed_outputs:
+        return None
+    header, lines = parsed_outputs[module_name][output_name]
+    columns = [name.strip('<>') for name in header.strip().split(',')]
+    return float(lines[0].strip().split(',')[columns.index(column)])
+
+# Dispatch commands with parsing on the workers (dispatch_args are passed on to
+# dispatch_simulation_tasks) and return the value of metric for every command,
+# None when the simulation failed. Commands that are skipped because they
+# completed earlier are parsed here (None when parsing their traces fails).
+def dispatch_and_measure(commands, metric, **dispatch_args):
+    results = dispatch_simulation_tasks(commands, parse=True, **dispatch_args)
+    values = []
+    for j, command in enumerate(commands):
+        value = None
+        result = results.get(j)
+        if result is None:
+            try:
+                value = get_metric(parse_simulation_output(get_ns3_arg(command, 'outputFileNamePrefix'), [metric.split(':')[0]]), metric)
+            except Exception as e: # e.g. traces of the completed simulation that were removed or truncated
+                print("Parsing the traces of {} has failed: {}".format(command, e))
+        elif not isinstance(result, Exception) and result['returncode'] == 0 and result.get('parsedOutputs'):
+            value = get_metric(result['parsedOutputs'], metric)
+        values.append(value)
+    return values
+
+# Run commands (one per sweep point) with adaptive replication. dispatch_args
+# are passed on to dispatch_simulation_tasks. Returns a list with a dict per
+# command: {'command', 'values', 'mean', 'stdDev', 'ciHalfWidth', 'converged'}
+def run_adaptive_replication(commands, target_width, confidence=0.95, min_seeds=3, max_seeds=10, wave_size=2, metric=default_metric, seed_stride=100000, **dispatch_args):
+    points = [{'command': command, 'values': [], 'mean': None, 'stdDev': None, 'ciHalfWidth': float('inf'), 'converged': False} for command in commands]
+    active = list(range(len(points)))
+    wave = 0
+    while active:
+        wave_commands = []
+        wave_points = []
+        for i in active:
+            replicas = len(points[i]['values']) + points[i].get('failed', 0)
+            for replica in range(replicas, min(replicas + (wave_size if replicas else min_seeds), max_seeds)):
+                wave_commands.append(replica_command(points[i]['command'], replica, seed_stride))
+                wave_points.append(i)
+        print("\nReplication wave {}: {} simulations for {} sweep points".format(wave, len(wave_commands), len(active)))
+        values = dispatch_and_measure(wave_commands, metric, **dispatch_args)
+        dispatch_args['resume'] = True # later waves append to the journal of the first wave
+
+        for i, value in zip(wave_points, values):
+            if value is None:
+                points[i]['failed'] = points[i].get('failed', 0) + 1
+            else:
+                points[i]['values'].append(value)
+
+        still_active = []
+        for i in active:
+            point = points[i]
+            if point['values']:
+                point['mean'], point['stdDev'], point['ciHalfWidth'] = confidence_interval(point['values'], confidence)
+            point['converged'] = len(point['values']) >= min(min_seeds, max_seeds) and 2*point['ciHalfWidth'] <= target_width
+            replicas = len(point['values']) + point.get('failed', 0)
+            if not point['converged'] and replicas < max_seeds:
+                still_active.append(i)
+            print("{} seeds, {} = {} +/- {:.4f}{}: {}".format(len(point['values']), metric, "{:.4f}".format(point['mean']) if point['mean'] is not None else "?",
+                                                                point['ciHalfWidth'], " (converged)" if point['converged'] else "", get_ns3_arg(point['command'], 'outputFileNamePrefix')))
+        active = still_active
+        wave += 1
+    return points
+
+# Write the result of run_adaptive_replication to the CSV file file_name
+def write_replication_output(points, file_name, metric=default_metric):
+    column = metric.split(':')[2]
+    with open(file_name, 'w') as output_file:
+        output_file.write("<outputFileNamePrefix>,<nSeeds>,<mean{0}>,<stdDev{0}>,<ciHalfWidth{0}>,<converged>\n".format(column))
+        for point in points:
+            output_file.write("{},{},{:1.4f},{:1.4f},{:1.4f},{}\n".format(get_ns3_arg(point['command'], 'outputFileNamePrefix'), len(point['values']),
+                                                                       point['mean'] if point['mean'] is not None else float('nan'), point['stdDev'] or 0.0,
+                                                                       point['ciHalfWidth'], int(point['converged'])))
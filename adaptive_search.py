@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# Adaptive search: instead of running every value of a swept setting (e.g. the
+# 13 drCalcPerLimit values of sweeps/drcalc.json), search the value that
+# maximises a metric of the parse scripts (e.g. the PHY PDR) with a golden
+# section search, separately for every combination of the other swept settings
+# (e.g. every nEndDevices).
+#
+# The searches of all combinations advance together: every wave dispatches the
+# next value to evaluate of every search at once (two values in the first
+# wave), with parsing on the workers. A search stops once the bracket around
+# the optimum is narrower than tolerance (in log10 units with scale 'log'), so
+# a search over [0.001, 0.9] with tolerance 0.1 takes 10 simulations.
+# The metric is assumed to be unimodal in the searched setting.
+import math
+import itertools
+from sweep import get_sweep_blocks, get_dimensions, make_sweep_point
+from adaptive_replication import dispatch_and_measure
+
+default_metric = "parse_phytx_trace:simulation:PDR"
+inverse_golden_ratio = (math.sqrt(5) - 1) / 2
+
+# Golden section search for the maximum of a function over [low, high]. This
+# is a generator: it yields the positions to evaluate (lists, so the searches
+# of several functions can be evaluated together) and is sent the values of
+# the function at these positions (None for a failed evaluation).
+def golden_section_search(low, high, tolerance):
+    a, b = low, high
+    c = b - inverse_golden_ratio * (b - a)
+    d = a + inverse_golden_ratio * (b - a)
+    fc, fd = yield [c, d]
+    while b - a > tolerance:
+        if (fc if fc is not None else -math.inf) >= (fd if fd is not None else -math.inf):
+            b, d, fd = d, c, fc
+            c = b - inverse_golden_ratio * (b - a)
+            fc, = yield [c]
+        else:
+            a, c, fc = c, d, fd
+            d = a + inverse_golden_ratio * (b - a)
+            fd, = yield [d]
+
+# Returns the list of searches over setting in spec, one per combination of the
+# values of the other swept settings of the blocks that sweep setting: a dict
+# with the block, the values of the other settings ('fixed', a list of dicts)
+# and the range of the swept values of setting
+def get_searches(spec, setting):
+    searches = []
+    for block in get_sweep_blocks(spec):
+        dimensions = get_dimensions(block)
+        search_dimensions = [i for i, dimension in enumerate(block['sweep']) if setting in dimension]
+        if not search_dimensions:
+            continue
+        if len(block['sweep'][search_dimensions[0]]) != 1:
+            raise ValueError("Can not search {}, it is zipped with other settings".format(setting))
+        swept_values = [float(v) for v in block['sweep'][search_dimensions[0]][setting]]
+        other_dimensions = [dimension for i, dimension in enumerate(dimensions) if i != search_dimensions[0]]
+        for fixed in itertools.product(*other_dimensions):
+            searches.append({'block': block, 'fixed': list(fixed), 'range': (min(swept_values), max(swept_values))})
+    return searches
+
+# Search the value of setting that maximises metric for every combination of
+# the other swept settings of spec. dispatch_args are passed on to
+# dispatch_simulation_tasks. Returns the searches (see get_searches) with the
+# evaluated points ('evaluations', a list of (value, metric, command)) and the
+# best one ('best').
+def run_adaptive_search(spec, setting, metric=default_metric, scale='log', tolerance=0.1, value_range=None, **dispatch_args):
+    to_position = math.log10 if scale == 'log' else float
+    to_value = (lambda position: float("{:.3g}".format(10**position))) if scale == 'log' else (lambda position: float("{:.3g}".format(position)))
+
+    searches = get_searches(spec, setting)
+    if not searches:
+        raise ValueError("Setting {} is not swept in sweep {}".format(setting, spec.get('name')))
+    pending = {} # index in searches -> positions to evaluate
+    for i, search in enumerate(searches):
+        low, high = value_range or search['range']
+        search['evaluations'] = []
+        search['cache'] = {} # value -> metric, values are rounded so positions close to each other can share a simulation
+        search['generator'] = golden_section_search(to_position(low), to_position(high), tolerance)
+        pending[i] = next(search['generator'])
+
+    wave = 0
+    while pending:
+        wave_commands = []
+        wave_searches = []
+        for i, positions in pending.items():
+            for position in positions:
+                value = to_value(position)
+                if value not in searches[i]['cache'] and (i, value) not in wave_searches:
+                    point, command = make_sweep_point(searches[i]['block'], searches[i]['fixed'] + [{setting: value}])
+                    wave_commands.append(command)
+                    wave_searches.append((i, value))
+        print("\nSearch wave {}: {} simulations for {} searches".format(wave, len(wave_commands), len(pending)))
+        values = dispatch_and_measure(wave_commands, metric, **dispatch_args)
+        dispatch_args['resume'] = True # later waves append to the journal of the first wave
+        for (i, value), command, metric_value in zip(wave_searches, wave_commands, values):
+            searches[i]['cache'][value] = metric_value
+            searches[i]['evaluations'].append((value, metric_value, command))
+
+        next_pending = {}
+        for i, positions in pending.items():
+            search = searches[i]
+            try:
+                next_pending[i] = search['generator'].send([search['cache'][to_value(position)] for position in positions])
+            except StopIteration:
+                evaluated = [e for e in search['evaluations'] if e[1] is not None]
+                search['best'] = max(evaluated, key=lambda e: e[1]) if evaluated else None
+                fixed = ", ".join("{}={}".format(name, value) for values in search['fixed'] for name, value in values.items())
+                if search['best']:
+                    print("Best {} for {}: {} ({} = {:.4f}, {} simulations)".format(setting, fixed, search['best'][0], metric, search['best'][1], len(search['evaluations'])))
+                else:
+                    print("No successful simulations for {}".format(fixed))
+        pending = next_pending
+        wave += 1
+    return searches
+
+# Write the result of run_adaptive_search to the CSV file file_name: one line
+# per evaluated point, the best point of every search is marked
+def write_search_output(searches, setting, file_name, metric=default_metric):
+    column = metric.split(':')[2]
+    fixed_names = sorted(set(name for search in searches for values in search['fixed'] for name in values))
+    with open(file_name, 'w') as output_file:
+        output_file.write("".join("<{}>,".format(name) for name in fixed_names) + "<{}>,<{}>,<best>\n".format(setting, column))
+        for search in searches:
+            fixed = {}
+            for values in search['fixed']:
+                fixed.update(values)
+            for value, metric_value, command in sorted(search['evaluations']):
+                output_file.write("".join("{},".format(fixed.get(name, "")) for name in fixed_names) +
+                                  "{},{},{}\n".format(value, "{:1.4f}".format(metric_value) if metric_value is not None else "", int(search.get('best') is not None and value == search['best'][0])))
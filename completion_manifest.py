@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+# Completion manifest of finished simulations: one JSON record per line with
+# the fingerprint of the simulation (see ns3_command.command_fingerprint), its
+# command and the output files (and their sizes) it produced. Used by the
+# dispatcher to skip simulations whose output is already available.
+import json
+import os
+import time
+from ns3_command import cwd, ns3_root_dir, get_ns3_arg, list_output_files
+
+manifest_file_name = os.path.join(cwd, "output", "completion-manifest.jsonl")
+
+# Returns a dict with the latest manifest record for every fingerprint
+def load_manifest(file_name=None):
+    file_name = file_name or manifest_file_name
+    manifest = {}
+    if not os.path.exists(file_name):
+        return manifest
+    with open(file_name) as manifest_file:
+        for line in manifest_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # e.g. partially written last line
+            manifest[record['fingerprint']] = record
+    return manifest
+
+# A simulation is completed when the manifest has a record for its fingerprint
+# and all output files listed in that record still exist with the same size
+def is_completed(manifest, fingerprint):
+    if fingerprint not in manifest:
+        return False
+    output_files = manifest[fingerprint]['outputFiles']
+    if not any(f.endswith("sim-settings.txt") for f in output_files):
+        return False
+    for output_file, size in output_files.items():
+        path = os.path.join(ns3_root_dir, output_file)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return False
+    return True
+
+# Append a record for a successfully finished simulation to the manifest
+def record_completion(fingerprint, command, summary, file_name=None):
+    file_name = file_name or manifest_file_name
+    output_file_name_prefix = get_ns3_arg(command, 'outputFileNamePrefix')
+    if not output_file_name_prefix:
+        return
+    output_files = {}
+    for output_file in list_output_files(output_file_name_prefix):
+        output_files[output_file] = os.path.getsize(os.path.join(ns3_root_dir, output_file))
+    record = {"fingerprint": fingerprint, "command": command, "completedAt": time.time(),
+              "wallTime": summary['wallTime'], "outputFiles": output_files}
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, 'a') as manifest_file:
+        manifest_file.write(json.dumps(record) + "\n")
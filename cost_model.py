@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# Cost model for simulation tasks, used to dispatch the most expensive
+# simulations first (longest processing time first scheduling, per window of
+# dispatched simulations, see iter_dispatch_order in utils.py).
+#
+# The run time of a simulation is modelled as
+#   log(t) = b0 + b1*log(nEndDevices) + b2*log(totalTime/usDataPeriod) + b3*log(nGateways) + b4*<number of enabled traces>
+# The coefficients are fitted to the wall times of earlier runs recorded in the
+# completion manifest. The fit is regularised towards prior_coefficients, so a
+# handful of recorded runs already gives sensible estimates and no recorded runs
+# gives the prior model.
+import math
+from ns3_command import parse_ns3_args
+from completion_manifest import load_manifest
+
+prior_coefficients = [0.0, 1.0, 1.0, 0.5, 0.25]
+regularisation = 1.0
+
+# Returns the feature vector of command
+def cost_features(command):
+    ns3_args = dict(parse_ns3_args(command))
+    n_end_devices = float(ns3_args.get('nEndDevices', 1))
+    total_time = float(ns3_args.get('totalTime', 1))
+    us_data_period = float(ns3_args.get('usDataPeriod', 1))
+    n_gateways = float(ns3_args.get('nGateways', 1))
+    n_traces = len([name for name, value in ns3_args.items() if name.startswith('trace') and value != '0'])
+    return [1.0,
+            math.log(max(n_end_devices, 1.0)),
+            math.log(max(total_time/us_data_period, 1.0)),
+            math.log(max(n_gateways, 1.0)),
+            float(n_traces)]
+
+# Solve the linear system a*x = b with gaussian elimination (a is small)
+def solve_linear_system(a, b):
+    n = len(b)
+    m = [list(a[i]) + [b[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(n):
+            if r != col and m[col][col] != 0:
+                f = m[r][col] / m[col][col]
+                for c in range(col, n + 1):
+                    m[r][c] -= f * m[col][c]
+    return [m[i][n] / m[i][i] if m[i][i] != 0 else 0.0 for i in range(n)]
+
+# Fit the model coefficients to a list of (command, wall time) tuples
+def calibrate(run_times):
+    n = len(prior_coefficients)
+    xtx = [[regularisation if i == j else 0.0 for j in range(n)] for i in range(n)]
+    xty = [regularisation * c for c in prior_coefficients]
+    for command, wall_time in run_times:
+        if wall_time <= 0:
+            continue
+        x = cost_features(command)
+        y = math.log(wall_time)
+        for i in range(n):
+            xty[i] += x[i] * y
+            for j in range(n):
+                xtx[i][j] += x[i] * x[j]
+    return solve_linear_system(xtx, xty)
+
+# Returns the (command, wall time) tuples of all runs in the completion manifest
+def load_run_times():
+    return [(record['command'], record['wallTime']) for record in load_manifest().values()]
+
+# Returns the estimated run time of command in seconds (or in arbitrary units
+# when no run times have been recorded yet)
+def estimate_cost(command, coefficients=None):
+    coefficients = coefficients or prior_coefficients
+    x = cost_features(command)
+    return math.exp(sum(b*xi for b, xi in zip(coefficients, x)))
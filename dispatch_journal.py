@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+# Append-only journal of a dispatcher: one JSON record per line for every
+# submitted, reattached, completed or failed task, written (and synced to disk)
+# as soon as the event happens. When the dispatcher dies, the journal tells a
+# new dispatcher (--resume) which tasks were still in flight and which ones
+# never finished.
+import json
+import os
+import time
+
+def open_journal(file_name, resume):
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    journal_file = open(file_name, 'a')
+    if journal_file.tell() > 0:
+        with open(file_name, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                journal_file.write("\n") # terminate a partially written last record
+    write_journal_event(journal_file, "resume" if resume else "start")
+    return journal_file
+
+def write_journal_event(journal_file, event, **fields):
+    record = {"event": event, "time": time.time()}
+    record.update(fields)
+    journal_file.write(json.dumps(record) + "\n")
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+
+# Returns a dict with the state of the latest task of every command in the
+# journal: command -> {'taskId': ..., 'status': 'submitted'|'completed'|'failed'}
+def load_journal(file_name):
+    commands = {}
+    task_commands = {}
+    if not os.path.exists(file_name):
+        return commands
+    with open(file_name) as journal_file:
+        for line in journal_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # e.g. partially written last line
+            event = record['event']
+            if event in ("submitted", "reattached"):
+                task_commands[record['taskId']] = record['command']
+                commands[record['command']] = {'taskId': record['taskId'], 'status': 'submitted'}
+            elif event in ("completed", "failed"):
+                command = task_commands.get(record['taskId'])
+                if command is not None and commands[command]['taskId'] == record['taskId']:
+                    commands[command]['status'] = event
+    return commands
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# Dispatch the simulations of a sweep specification file (see sweep.py and the
+# sweeps folder) to the celery workers or a local pool of processes
+import argparse
+import os
+from utils import dispatch_simulation_tasks, add_dispatch_arguments
+from sweep import load_sweep_spec, iter_sweep_points, count_sweep_points
+from cost_model import calibrate, load_run_times, estimate_cost
+from ns3_command import cwd
+from adaptive_replication import run_adaptive_replication, write_replication_output, default_metric
+from adaptive_search import run_adaptive_search, write_search_output
+import adaptive_search
+
+parser = argparse.ArgumentParser(description='Dispatch the ns-3 lorawan simulations of a sweep specification.')
+parser.add_argument('specfile', help='The sweep specification (JSON) file, e.g. sweeps/confirmed.json')
+parser.add_argument('--count', action='store_true', help='Only print the number of simulations in the sweep')
+parser.add_argument('--dry-run', dest='dryrun', action='store_true', help='Print every simulation with its estimated cost instead of dispatching them')
+parser.add_argument('--replicate', action='store_true', help='Adaptive replication: run every point with more seeds, in waves, until the confidence interval of its PDR is narrow enough')
+parser.add_argument('--ci-width', dest='ciwidth', type=float, default=0.02, help='Target width of the confidence interval (with --replicate, default: 0.02)')
+parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the confidence interval (with --replicate, default: 0.95)')
+parser.add_argument('--min-seeds', dest='minseeds', type=int, default=3, help='Number of seeds per point in the first wave (with --replicate, default: 3)')
+parser.add_argument('--max-seeds', dest='maxseeds', type=int, default=10, help='Maximum number of seeds per point (with --replicate, default: 10)')
+parser.add_argument('--wave-size', dest='wavesize', type=int, default=2, help='Number of seeds added per point in every later wave (with --replicate, default: 2)')
+parser.add_argument('--metric', default=default_metric, help='Metric of the confidence interval, <parse script>:<output>:<column> (with --replicate, default: {})'.format(default_metric))
+parser.add_argument('--replication-output', dest='replicationoutput', default=None, help='Output CSV file with the mean and confidence interval per point (with --replicate, default: output/<sweep name>-replication.csv)')
+parser.add_argument('--search', default=None, help='Adaptive search: instead of running every value of this swept setting (e.g. drCalcPerLimit), search the value with the highest metric for every combination of the other swept settings')
+parser.add_argument('--search-metric', dest='searchmetric', default=adaptive_search.default_metric, help='Metric to maximise, <parse script>:<output>:<column> (with --search, default: {})'.format(adaptive_search.default_metric))
+parser.add_argument('--search-scale', dest='searchscale', choices=['linear', 'log'], default='log', help='Search the setting on a linear or logarithmic scale (with --search, default: log)')
+parser.add_argument('--search-range', dest='searchrange', type=float, nargs=2, default=None, metavar=('LOW', 'HIGH'), help='Range to search (with --search, default: the range of the swept values)')
+parser.add_argument('--search-tolerance', dest='searchtolerance', type=float, default=0.1, help='Stop when the optimum is bracketed this narrowly, in decades with --search-scale log (with --search, default: 0.1)')
+parser.add_argument('--search-output', dest='searchoutput', default=None, help='Output CSV file with the evaluated and best values (with --search, default: output/<sweep name>-search.csv)')
+add_dispatch_arguments(parser)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    spec = load_sweep_spec(args.specfile)
+    print("Sweep {}: {} simulations".format(spec.get('name', args.specfile), count_sweep_points(spec)))
+
+    if args.count:
+        pass
+    elif args.dryrun:
+        coefficients = calibrate(load_run_times())
+        total_cost = 0
+        for point, cli_command in iter_sweep_points(spec):
+            cost = estimate_cost(cli_command, coefficients)
+            total_cost += cost
+            print("[estimated cost {:.1f}] {}".format(cost, cli_command))
+        print("Total estimated cost: {:.1f}".format(total_cost))
+    else:
+        journal_file_name = args.journal or os.path.join(cwd, "output", "{}.journal.jsonl".format(spec.get('name', 'sweep')))
+        dispatch_args = dict(skip_completed=args.skipcompleted, backend=args.backend, processes=args.processes,
+                             journal_file_name=journal_file_name, resume=args.resume,
+                             parse_output_dir=args.parseoutputdir, sweep_name=spec.get('name', 'sweep'))
+        if args.replicate:
+            cli_commands = [cli_command for point, cli_command in iter_sweep_points(spec)]
+            points = run_adaptive_replication(cli_commands, args.ciwidth, confidence=args.confidence, min_seeds=args.minseeds, max_seeds=args.maxseeds,
+                                              wave_size=args.wavesize, metric=args.metric, **dispatch_args)
+            replication_output = args.replicationoutput or os.path.join(cwd, "output", "{}-replication.csv".format(spec.get('name', 'sweep')))
+            print("Writing the mean and confidence interval per point to {}".format(replication_output))
+            write_replication_output(points, replication_output, args.metric)
+        elif args.search:
+            searches = run_adaptive_search(spec, args.search, metric=args.searchmetric, scale=args.searchscale, tolerance=args.searchtolerance,
+                                           value_range=args.searchrange, **dispatch_args)
+            search_output = args.searchoutput or os.path.join(cwd, "output", "{}-search.csv".format(spec.get('name', 'sweep')))
+            print("Writing the evaluated values of {} to {}".format(args.search, search_output))
+            write_search_output(searches, args.search, search_output, args.searchmetric)
+        else:
+            # the commands are expanded from the spec while they are dispatched
+            cli_commands = (cli_command for point, cli_command in iter_sweep_points(spec))
+            dispatch_simulation_tasks(cli_commands, parse=args.parse, num_commands=count_sweep_points(spec), **dispatch_args)
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+# Helpers for inspecting the ns-3 command lines that are dispatched as
+# simulation tasks, e.g.
+# ./waf --run=lorawan-example-tracing --command-template="%s --randomSeed=12345 ... --outputFileNamePrefix=simulations/output/test"
+import shlex
+import re
+import os
+import glob
+import hashlib
+
+cwd = os.path.dirname(os.path.realpath(__file__))
+ns3_root_dir = cwd + "/.."
+ns3_program_name = "lorawan-example-tracing"
+
+# Returns the list of (name, value) tuples of the ns-3 program arguments in
+# command, in the order they appear on the command line
+def parse_ns3_args(command):
+    argv = shlex.split(command)
+    program_argv = argv[1:]
+    for arg in argv[1:]:
+        if arg.startswith('--command-template='):
+            program_argv = shlex.split(arg[len('--command-template='):])[1:] # skip %s
+        elif arg.startswith('--run=') and ' ' in arg:
+            program_argv = shlex.split(arg[len('--run='):])[1:] # skip the program name
+
+    ns3_args = []
+    for arg in program_argv:
+        if arg.startswith('--') and '=' in arg:
+            name, value = arg[2:].split('=', 1)
+            ns3_args.append((name, value))
+    return ns3_args
+
+# Returns the name of the program run by a waf command (./waf --run=<program>),
+# None if command is not a waf command
+def get_waf_program(command):
+    argv = shlex.split(command)
+    if not argv or os.path.basename(argv[0]) != 'waf':
+        return None
+    for arg in argv[1:]:
+        if arg.startswith('--run='):
+            return arg[len('--run='):].split()[0]
+    return None
+
+# Returns the value of ns-3 argument name in command or default when absent
+def get_ns3_arg(command, name, default=None):
+    for arg_name, value in parse_ns3_args(command):
+        if arg_name == name:
+            return value
+    return default
+
+# Returns command with the value of ns-3 argument name replaced by value
+def set_ns3_arg(command, name, value):
+    return re.sub(r'(--{}=)[^\s"\']*'.format(re.escape(name)), lambda m: m.group(1) + value, command)
+
+# Returns the canonical form of the ns-3 arguments in command: every argument
+# once, sorted by name, independent of how the command line was built
+def canonical_ns3_args(command):
+    return " ".join("--{}={}".format(name, value) for name, value in sorted(dict(parse_ns3_args(command)).items()))
+
+# Returns the path of the built ns3_program_name program (None when it has not
+# been built) and the list of ns-3 shared libraries it links against
+def find_ns3_build_files():
+    program = None
+    for file_name in sorted(glob.glob(os.path.join(ns3_root_dir, "build", "scratch", "*" + ns3_program_name + "*"))):
+        if os.path.isfile(file_name) and os.access(file_name, os.X_OK) and not file_name.endswith(".o"):
+            program = file_name
+            break
+    libraries = sorted(glob.glob(os.path.join(ns3_root_dir, "build", "lib", "*.so*")))
+    return program, libraries
+
+# Returns an identifier of the current ns-3 build: a hash over the name, size
+# and modification time of the built program and the ns-3 shared libraries.
+# Rebuilding ns-3 changes the build id.
+def get_ns3_build_id():
+    program, libraries = find_ns3_build_files()
+    build_files = libraries + ([program] if program else [])
+    h = hashlib.sha1()
+    for file_name in sorted(build_files):
+        st = os.stat(file_name)
+        h.update("{} {} {}\n".format(os.path.basename(file_name), st.st_size, st.st_mtime_ns).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+# Returns a fingerprint of a simulation: a hash of its canonical ns-3
+# arguments and the ns-3 build id
+def command_fingerprint(command, build_id):
+    return hashlib.sha1("{}\n{}".format(build_id, canonical_ns3_args(command)).encode('utf-8')).hexdigest()
+
+# Returns the files that ns-3 wrote for output_file_name_prefix (e.g.
+# <prefix>-sim-settings.txt, <prefix>-trace-mac-packets.csv). Paths are
+# relative to the ns-3 root folder, like the prefix itself.
+def list_output_files(output_file_name_prefix):
+    prefix_path = os.path.join(ns3_root_dir, output_file_name_prefix)
+    output_dir = os.path.dirname(prefix_path)
+    prefix_name = os.path.basename(prefix_path)
+    output_files = []
+    if not os.path.isdir(output_dir):
+        return output_files
+    for file_name in sorted(os.listdir(output_dir)):
+        remainder = file_name[len(prefix_name):]
+        # LoRaWAN-confirmed-600-100 must not match LoRaWAN-confirmed-600-1000-...
+        if file_name.startswith(prefix_name) and remainder[:1] in ('-', '_') and not remainder[1:2].isdigit() and not file_name.endswith(".log"):
+            output_files.append(os.path.join(os.path.dirname(output_file_name_prefix), file_name))
+    return output_files
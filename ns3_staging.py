@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+# Stage the built ns-3 program and its shared libraries on the local disk of a
+# worker, so simulations can be started without going through waf (python
+# startup + build check on the shared network file system) for every task.
+# The staged copy is kept in a directory named after the ns-3 build id and is
+# replaced as soon as ns-3 is rebuilt.
+import os
+import shutil
+import tempfile
+from ns3_command import find_ns3_build_files, get_ns3_build_id
+
+staging_dir = os.path.join(tempfile.gettempdir(), "lorawan-ns3-staged")
+staged = {} # build id -> (program, library directory) staged by this process
+
+# Returns (program, library directory) of the staged copy of the current ns-3
+# build, staging it first if necessary. Returns None if ns-3 has not been
+# built.
+def stage_ns3_program():
+    build_id = get_ns3_build_id()
+    if build_id in staged:
+        return staged[build_id]
+
+    program, libraries = find_ns3_build_files()
+    if program is None:
+        return None
+
+    build_dir = os.path.join(staging_dir, build_id)
+    staged_program = os.path.join(build_dir, os.path.basename(program))
+    staged_lib_dir = os.path.join(build_dir, "lib")
+    if not os.path.exists(staged_program):
+        # copy to a temporary directory first and rename it, so other worker
+        # processes never see a partially staged build
+        os.makedirs(staging_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".staging-", dir=staging_dir)
+        os.chmod(tmp_dir, 0o755)
+        os.makedirs(os.path.join(tmp_dir, "lib"))
+        for library in libraries:
+            shutil.copy2(library, os.path.join(tmp_dir, "lib"), follow_symlinks=False)
+        shutil.copy2(program, tmp_dir)
+        try:
+            os.rename(tmp_dir, build_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir) # staged concurrently by another process
+
+    # remove staged copies of previous builds
+    for name in os.listdir(staging_dir):
+        if name != build_id and not name.startswith(".staging-"):
+            shutil.rmtree(os.path.join(staging_dir, name), ignore_errors=True)
+
+    staged.clear()
+    staged[build_id] = (staged_program, staged_lib_dir)
+    return staged[build_id]
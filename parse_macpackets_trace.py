@@ -2,257 +2,611 @@
 # Parse ns-3 lorawan MAC packets trace CSV output files
 # This script can not be used to determine PDR of confirmed downstream
 # messages, use the parse_nsdsmsgs_trace.py script instead
-import csv
 import argparse
-import re
-import os.path
-from collections import Counter
-
-parser = argparse.ArgumentParser(description='Process ns-3 lorawan MAC packets CSV output file.')
-parser.add_argument('csvfiles', nargs='+', help='The CSV files to be parsed')
-parser.add_argument('--output-file-simulation', dest='outputfilesimulation', default="parse_macpackets_trace_per_simulation.csv", help='The output CSV file')
-parser.add_argument('--output-file-simulation-compact', dest='outputfilesimulationcompact', default="parse_macpackets_trace_per_simulation_compact.csv", help='The compact output CSV file')
-parser.add_argument('--output-file-enddevices', dest='outputfileenddevice', default="parse_macpackets_trace_per_enddevice.csv", help='The output CSV file')
-# parser.add_argument('--parseapppackets', type=bool, default=False, help='Parse app packets?')
-#feature_parser = parser.add_mutually_exclusive_group(required=False)
-#feature_parser.add_argument('--app-packets', dest='apppackets', action='store_true')
-#feature_parser.add_argument('--no-app-packets', dest='apppackets', action='store_false')
-#parser.set_defaults(feature=False)
-
-args = parser.parse_args()
-for csvfilename in args.csvfiles:
-    print("Parsing mac packets csv file {}".format(csvfilename))
-    last_timestamp = -1
-    nodes = {}
+from trace_io import find_trace_file, load_sim_settings, load_trace_misc, append_output_lines, parse_trace_files
+import trace_loader
+from run_catalog import add_catalog_arguments, get_catalog_trace_files
+from results_db import add_results_arguments, open_results, get_results_table_names, keep_unexported_outputs, store_trace_results, export_results
+from trace_loader import iter_trace_blocks, intern_column, add_cache_arguments, set_cache_settings, get_cache_settings, as_column, take_column, convert_column, concatenate_columns, get_block_lists
+from trace_partitions import can_partition, parse_partitioned, iter_chunk_blocks, get_partitions, partition_block, concatenate_blocks, merge_counts
+from trace_follow import follow_trace, print_snapshot, get_interval_values, snapshot_interval
+from array import array
+from itertools import compress
+from collections import Counter, OrderedDict
+
+# Default output files. The output of every parsed trace file is stored in the
+# results database (see results_db), the output files are exported from it
+# (or the output is appended to them, with --no-results). Their names are
+# also the names of the results tables.
+output_file_names = {'simulation': "parse_macpackets_trace_per_simulation.csv",
+                     'simulationCompact': "parse_macpackets_trace_per_simulation_compact.csv",
+                     'enddevices': "parse_macpackets_trace_per_enddevice.csv"}
+
+# Horizon (in seconds) of the streaming mode when a trace is followed without
+# --horizon (see follow_mac_trace)
+follow_horizon = 3600
+
+# Trace sources of the MAC packets trace, the index in this list is the code of
+# the trace source in the packet table
+mac_trace_sources = ['MacTx', 'MacTxOk', 'MacTxDrop', 'MacRx', 'MacRxDrop', 'MacSentPkt']
+MAC_TX, MAC_TX_OK, MAC_TX_DROP, MAC_RX, MAC_RX_DROP, MAC_SENT_PKT = range(len(mac_trace_sources))
+
+# Returns the MAC packets with the given numbers as dicts with the node ids of
+# every trace source (see new_mac_packet), from the packet table (see
+# load_mac_packet_table)
+def get_mac_packets(packet_numbers, table):
     mac_packets = {}
-    data_rate_stats = {0: (0,0), 1: (0,0), 2: (0,0), 3: (0,0), 4: (0,0), 5: (0,0)} # key=data rate index, value = (delivered,notdelivered)
-    with open(csvfilename, newline='') as csvfile:
-        linereader = csv.reader(csvfile, delimiter=',', quotechar='|')
-        next(linereader) # skip the header line in the csv file
-
-        # Process CSV file: populate mac_packets data structure
-        for row in linereader:
-            node_id = int(row[2])
-            trace_source = row[5]
-            mac_packets_key = row[6] # packet in hex
-            if mac_packets_key not in mac_packets:
-                packet_timestamp = float(row[0])
-                phy_index = int(row[4])
-                packet_length = int(row[7])
-                last_timestamp = packet_timestamp
-                mac_packets[mac_packets_key] = {'Timestamp': packet_timestamp, 'PacketLength': packet_length, 'PhyIndex': phy_index, 'MacTx': [], 'MacTxOk': [], 'MacTxDrop': [], 'MacRx': [], 'MacRxDrop': [], 'MacSentPkt': [], 'MacSentPktMisc': []}
-            mac_packets[mac_packets_key][trace_source].append(node_id)
-
-            if node_id not in nodes:
-                nodes[node_id] = {'DeviceType': int(row[1]), 'PacketsSent': 0, 'PacketsReceived': 0, 'PacketsDropped': 0, 'PacketsGenerated': 0, 'PacketsDelivered': 0, 'PacketsNotDelivered': 0}
-
-            # Store any interesting misc fields depending on trace_source:
-            if trace_source == 'MacSentPkt':
-                n_transmissions = int(row[8])
-                t = (node_id, n_transmissions) # store node_id and n_transmissions as a tuple
-                mac_packets[mac_packets_key]['MacSentPktMisc'].append(t)
-
-    # Process mac_packets data structure:
-    # * Was a packet delivered?
-    #   -> MacSentPkt trace and how many transmissions did it take?
-    # * How many times was a packet received by a gateway without an Ack ever reaching the end device?
-    #   -> Look at MacRx
-    upstream_stats = {'nrPackets': 0, 'nrSent': 0, 'nrReceived': 0, 'nrDelivered': 0, 'nrUndelivered': 0, 'nrMacSentPktTries': 0}
-    upstream_stats_sent = [0, 0, 0, 0, 0]
-    upstream_stats_received = [0] * 20
-    upstream_stats_senttries = [0, 0, 0, 0, 0]
-    downstream_stats = {'nrPackets': 0, 'nrSent': 0, 'nrReceived': 0, 'nrDelivered': 0, 'nrUndelivered': 0, 'nrMacSentPktTries': 0}
-    downstream_stats_sent = [0, 0, 0, 0, 0]
-    downstream_stats_received = [0, 0, 0, 0, 0]
-    downstream_stats_senttries = [0, 0, 0, 0, 0]
-    dataonly_downstream_stats = {'nrPackets': 0, 'nrSent': 0, 'nrReceived': 0, 'nrDelivered': 0, 'nrUndelivered': 0, 'nrMacSentPktTries': 0}
-    # us_packets_sent_vs_received = [[0],[0,0],[0,0,0],[0,0,0,0],[0,0,0,0,0]] # e.g. first index is number of times sent, second index is number of times received
-    us_packets_sent_vs_received = [[0,0,0,0,0]*4,[0,0,0,0,0]*4,[0,0,0,0,0]*4,[0,0,0,0,0]*4,[0,0,0,0,0]*4] # e.g. first index is number of times sent, second index is number of times received
-    ds_packets_sent_vs_received = [[0],[0,0],[0,0,0],[0,0,0,0],[0,0,0,0,0]]
-    number_of_us_sent_packets_that_were_not_received = 0  # when a packet has been sent 3 times but was never received, increment this counter by 3
-    number_of_ds_sent_packets_that_were_not_received = 0
-    ds_phy_indexes = []
-    nr_ds_tx_received_rw1 = 0
-    nr_ds_tx_received_rw2 = 0
-    nr_ds_tx_not_received = 0
-    for key in list(mac_packets.keys()):
-        packet = mac_packets[key]
-        nr_of_transmitters = len(set(packet['MacTx']))
-        if nr_of_transmitters != 1:
-             print("key={}: ERROR SKIPPING this MAC packet as there is more than one transmitter in MacTx for packet = {}".format(key, packet))
-             continue
-        nr_of_receivers = len(set(packet['MacRx']))
-        if nr_of_receivers < 0 or nr_of_receivers > 4:
-             print("key={}: ERROR SKIPPING this MAC packet as the number of receivers in MacRx is not equal to 0, 1, 2 or 4 for packet = {}".format(key, packet))
-             continue
-
-        tx_phy_index = packet['PhyIndex']
-        tx_node_id = packet['MacTx'][0]
-        tx_node_devicetype = nodes[tx_node_id]['DeviceType']
-
-        nr_sent = len(packet['MacTx'])
-        nr_received = len(packet['MacRx'])
-        nr_received_dropped = len(packet['MacRxDrop'])
-
-        # Either packet is in MacTxOk or in MacTxDrop
-        # Note that unconfirmed upstream messages are always immediately in MacTxOk, even though they might be undelivered. That is why we check MacRx as well below
-        # Downstream messages are also always in MacTxOk, regardless whether they are confirmed or unconfirmed
-        # For unconfirmed downstream messages, this script can be used as it also checked MacRx
-        # For confirmed downstream messages, use the parse_nsdsmsgs_trace.py script as it tracks Acknowledgements at the NS
-
+    for packet in sorted(packet_numbers):
+        mac_packets[packet] = new_mac_packet(float(table['timestamps'][packet]), int(table['lengths'][packet]), int(table['phyIndexes'][packet]))
+    events = table['events']
+    if trace_loader.numpy is not None:
+        # only the events of these packets, as lists
+        selected = trace_loader.numpy.isin(events[0], list(mac_packets))
+        events = [trace_loader.numpy.asarray(column)[selected].tolist() for column in events]
+    for packet, trace_source_code, node_id, misc in zip(*events):
+        if packet in mac_packets:
+            mac_packets[packet][mac_trace_sources[trace_source_code]].append(node_id)
+            if trace_source_code == MAC_SENT_PKT:
+                mac_packets[packet]['MacSentPktMisc'].append((node_id, misc))
+    return mac_packets
+
+def new_mac_packet(timestamp, packet_length, phy_index):
+    return {'Timestamp': timestamp, 'PacketLength': packet_length, 'PhyIndex': phy_index, 'MacTx': [], 'MacTxOk': [], 'MacTxDrop': [], 'MacRx': [], 'MacRxDrop': [], 'MacSentPkt': [], 'MacSentPktMisc': []}
+
+def new_mac_node(device_type):
+    return {'DeviceType': device_type, 'PacketsSent': 0, 'PacketsReceived': 0, 'PacketsDropped': 0, 'PacketsGenerated': 0, 'PacketsDelivered': 0, 'PacketsNotDelivered': 0}
+
+# Returns the summary of MAC packet packet (see new_mac_packet) processed by
+# process_mac_packet: the number of events per trace source, the transmitter,
+# the number of distinct transmitters and receivers, the number of tries of the
+# first MacSentPkt and whether a node of the opposite device type received it
+def summarize_mac_packet(packet, nodes):
+    summary = {trace_source: len(packet[trace_source]) for trace_source in mac_trace_sources}
+    summary.update({'Timestamp': packet['Timestamp'], 'PacketLength': packet['PacketLength'], 'PhyIndex': packet['PhyIndex'],
+                    'TxNode': packet['MacTx'][0] if packet['MacTx'] else -1, 'NrTransmitters': len(set(packet['MacTx'])), 'NrReceivers': len(set(packet['MacRx'])),
+                    'SentTries': packet['MacSentPktMisc'][0][1] if packet['MacSentPktMisc'] else 0, 'ReceivedByOtherDeviceType': False})
+    if summary['NrTransmitters'] == 1:
+        tx_node_devicetype = nodes[summary['TxNode']]['DeviceType']
+        summary['ReceivedByOtherDeviceType'] = any(nodes[node_id]['DeviceType'] != tx_node_devicetype for node_id in packet['MacRx'])
+    return summary
+
+# Returns the statistics of the processed MAC packets (see process_mac_packet)
+# of the nodes (node id -> device type) of a simulation
+def new_mac_stats(nodes):
+    return {'nodes': {node_id: new_mac_node(device_type) for node_id, device_type in nodes.items()},
+            'upstream': {'nrPackets': 0, 'nrSent': 0, 'nrReceived': 0, 'nrDelivered': 0, 'nrUndelivered': 0, 'nrMacSentPktTries': 0},
+            'upstreamSent': [0, 0, 0, 0, 0],
+            'upstreamReceived': [0] * 20,
+            'upstreamSentTries': [0, 0, 0, 0, 0],
+            'downstream': {'nrPackets': 0, 'nrSent': 0, 'nrReceived': 0, 'nrDelivered': 0, 'nrUndelivered': 0, 'nrMacSentPktTries': 0},
+            'downstreamSent': [0, 0, 0, 0, 0],
+            'downstreamReceived': [0, 0, 0, 0, 0],
+            'downstreamSentTries': [0, 0, 0, 0, 0],
+            'dataOnlyDownstream': {'nrPackets': 0, 'nrSent': 0, 'nrReceived': 0, 'nrDelivered': 0, 'nrUndelivered': 0, 'nrMacSentPktTries': 0},
+            # us_packets_sent_vs_received = [[0],[0,0],[0,0,0],[0,0,0,0],[0,0,0,0,0]] # e.g. first index is number of times sent, second index is number of times received
+            'usPacketsSentVsReceived': [[0,0,0,0,0]*4,[0,0,0,0,0]*4,[0,0,0,0,0]*4,[0,0,0,0,0]*4,[0,0,0,0,0]*4], # e.g. first index is number of times sent, second index is number of times received
+            'nrUsSentNotReceived': 0, # when a packet has been sent 3 times but was never received, increment this counter by 3
+            'nrDsSentNotReceived': 0,
+            'dsPhyIndexes': Counter(),
+            'nrDsTxReceivedRw1': 0,
+            'nrDsTxReceivedRw2': 0,
+            'nrDsTxNotReceived': 0,
+            # Messages about unexpected packets: (packet number, format string,
+            # arguments, timestamp), see print_mac_messages
+            'messages': []}
+
+# Add the statistics of other (see new_mac_stats) to stats
+def merge_mac_stats(stats, other):
+    for node_id, node in other['nodes'].items():
+        for counter, value in node.items():
+            if counter != 'DeviceType':
+                stats['nodes'][node_id][counter] += value
+    stats['messages'].extend(other['messages'])
+    merge_counts(stats, {name: value for name, value in other.items() if name not in ('nodes', 'messages')})
+
+# Process MAC packet number sequence (in order of first appearance) with key
+# name into stats (see new_mac_stats), packet is its summary (see
+# summarize_mac_packet):
+# * Was a packet delivered?
+#   -> MacSentPkt trace and how many transmissions did it take?
+# * How many times was a packet received by a gateway without an Ack ever reaching the end device?
+#   -> Look at MacRx
+def process_mac_packet(stats, sequence, name, packet):
+    nodes = stats['nodes']
+    messages = stats['messages']
+    if packet['NrTransmitters'] != 1:
+         messages.append((sequence, "key={}: ERROR SKIPPING this MAC packet as there is more than one transmitter in MacTx for packet = {}", [name], None))
+         return
+    nr_of_receivers = packet['NrReceivers']
+    if nr_of_receivers < 0 or nr_of_receivers > 4:
+         messages.append((sequence, "key={}: ERROR SKIPPING this MAC packet as the number of receivers in MacRx is not equal to 0, 1, 2 or 4 for packet = {}", [name], None))
+         return
+
+    tx_phy_index = packet['PhyIndex']
+    tx_node_id = packet['TxNode']
+    tx_node_devicetype = nodes[tx_node_id]['DeviceType']
+
+    nr_sent = packet['MacTx']
+    nr_received = packet['MacRx']
+    nr_received_dropped = packet['MacRxDrop']
+
+    # Either packet is in MacTxOk or in MacTxDrop
+    # Note that unconfirmed upstream messages are always immediately in MacTxOk, even though they might be undelivered. That is why we check MacRx as well below
+    # Downstream messages are also always in MacTxOk, regardless whether they are confirmed or unconfirmed
+    # For unconfirmed downstream messages, this script can be used as it also checked MacRx
+    # For confirmed downstream messages, use the parse_nsdsmsgs_trace.py script as it tracks Acknowledgements at the NS
+
+    delivered = False
+    nr_sent_tries = 0
+    if packet['MacTxOk'] >= 1:
+        if packet['MacSentPkt'] > 0:
+            nr_sent_tries = packet['SentTries']
+            assert nr_sent == nr_sent_tries, "nr_sent == {} and nr_sent_tries = {}, packet key = {}".format(nr_sent, nr_sent_tries, name)
+        else:
+            # print ("WARNING skipping packet because packet['MacSentPktMisc'] is empty for packet = {}".format(packet))
+            # continue
+            # instead of skipping here, we just set nr_sent_tries to the length of MacTx
+            nr_sent_tries = nr_sent
+
+        # this check is necessary for unconfirmed upstream messages and all downstream messages:
+        # check if device type of a receiver is opposite that of the sender
+        if packet['ReceivedByOtherDeviceType']:
+            delivered = True
+    elif packet['MacTxDrop'] == 1:
         delivered = False
-        nr_sent_tries = 0
-        if len(packet['MacTxOk']) >= 1:
-            if len(packet['MacSentPktMisc']) > 0:
-                nr_sent_tries = packet['MacSentPktMisc'][0][1]
-                if nr_sent != nr_sent_tries:
-                    print("nr_sent == {} and nr_sent_tries = {}, packet = {}".format(nr_sent, nr_sent_tries, packet))
-                assert nr_sent == nr_sent_tries
+    else:
+        # This should only happen at the end of trace, so the message is
+        # only printed if the packet is not near the end of the mac packet
+        # trace (see print_mac_messages)
+        if not tx_node_devicetype == 0: # does not apply to DS traffic sent by gateway
+            messages.append((sequence, "key={}: Unexpected case, skipping this packet. {}/{}. packet = {}", [name], packet['Timestamp']))
+            return
+
+    # For unconfirmed downstream transmissions check whether the transmission was received in RW1/RW2/not received
+    # For downstream transmissions, assume unconfirmed messages. Therefor Mac will always generate MacTxOk; so instead check MacRx to see if the unconfirmed transmissions was actually received
+    if tx_node_devicetype == 0:
+        ds_tx_received = nr_received == 1
+        if ds_tx_received:
+            ds_tx_received_in_rw2 = tx_phy_index == 49
+            if ds_tx_received_in_rw2:
+                stats['nrDsTxReceivedRw2'] += 1
             else:
-                # print ("WARNING skipping packet because packet['MacSentPktMisc'] is empty for packet = {}".format(packet))
-                # continue
-                # instead of skipping here, we just set nr_sent_tries to the length of MacTx
-                nr_sent_tries = len(packet['MacTx'])
-
-            # this check is necessary for unconfirmed upstream messages and all downstream messages
-            if (len(packet['MacRx']) > 0):
-                for macrx_node_id in packet['MacRx']:
-                    # check if device type of receiver is opposite that of the sender
-                    if tx_node_devicetype != nodes[macrx_node_id]['DeviceType']:
-                        delivered = True
-        elif len(packet['MacTxDrop']) == 1:
-            delivered = False
+                stats['nrDsTxReceivedRw1'] += 1
         else:
-            # This should only happen at the end of trace:
-            fraction = packet['Timestamp']/last_timestamp
-            if not tx_node_devicetype == 0: # does not apply to DS traffic sent by gateway
-                if fraction < 0.99: # only print if we are not near the end of the mac packet trace
-                    print("key={}: Unexpected case, skipping this packet. {}/{}. packet = {}".format(key, packet['Timestamp'], last_timestamp, packet))
-                continue
+            stats['nrDsTxNotReceived'] += 1
+
+    # update stats dictionaries
+    if tx_node_devicetype == 1: # upstream packet
+        upstream_stats = stats['upstream']
+        upstream_stats['nrPackets'] += 1
+        upstream_stats['nrSent'] += nr_sent
+        upstream_stats['nrReceived'] += nr_received
+        if delivered:
+            upstream_stats['nrDelivered'] += 1
+        else:
+            upstream_stats['nrUndelivered'] += 1
+        upstream_stats['nrMacSentPktTries'] += nr_sent_tries
 
-        # For unconfirmed downstream transmissions check whether the transmission was received in RW1/RW2/not received
-        # For downstream transmissions, assume unconfirmed messages. Therefor Mac will always generate MacTxOk; so instead check MacRx to see if the unconfirmed transmissions was actually received
-        if tx_node_devicetype == 0:
-            ds_tx_received = len(packet['MacRx']) == 1
-            if ds_tx_received:
-                ds_tx_received_in_rw2 = tx_phy_index == 49
-                if ds_tx_received_in_rw2:
-                    nr_ds_tx_received_rw2 += 1
-                else:
-                    nr_ds_tx_received_rw1 += 1
-            else:
-                nr_ds_tx_not_received += 1
+        stats['upstreamSent'][nr_sent] += 1
+        stats['upstreamReceived'][nr_received] += 1
+        if delivered:
+            stats['upstreamSentTries'][nr_sent_tries] += 1
+
+        stats['usPacketsSentVsReceived'][nr_sent][nr_received] += 1
+        # say a packet was sent 4 times, but only received 2 times. this means two sent packets were lost
+        if nr_sent != nr_received:
+            stats['nrUsSentNotReceived'] += nr_sent-nr_received
+    elif tx_node_devicetype == 0: # downstream packet
+        downstream_stats = stats['downstream']
+        downstream_stats['nrPackets'] += 1
+        downstream_stats['nrSent'] += nr_sent
+        downstream_stats['nrReceived'] += nr_received
+        if delivered:
+            downstream_stats['nrDelivered'] += 1
+        else:
+            downstream_stats['nrUndelivered'] += 1
+        downstream_stats['nrMacSentPktTries'] += nr_sent_tries
 
-        # update stats dictionaries
-        if tx_node_devicetype == 1: # upstream packet
-            upstream_stats['nrPackets'] += 1
-            upstream_stats['nrSent'] += nr_sent
-            upstream_stats['nrReceived'] += nr_received
-            if delivered:
-                upstream_stats['nrDelivered'] += 1
-            else:
-                upstream_stats['nrUndelivered'] += 1
-            upstream_stats['nrMacSentPktTries'] += nr_sent_tries
+        stats['downstreamSent'][nr_sent] += 1
+        stats['downstreamReceived'][nr_received] += 1
+        if delivered:
+            stats['downstreamSentTries'][nr_sent_tries] += 1
 
-            upstream_stats_sent[nr_sent] += 1
-            upstream_stats_received[nr_received] += 1
-            if delivered:
-                upstream_stats_senttries[nr_sent_tries] += 1
-
-            us_packets_sent_vs_received[nr_sent][nr_received] += 1
-            # say a packet was sent 4 times, but only received 2 times. this means two sent packets were lost
-            if nr_sent != nr_received:
-                number_of_us_sent_packets_that_were_not_received += nr_sent-nr_received
-        elif tx_node_devicetype == 0: # downstream packet
-            downstream_stats['nrPackets'] += 1
-            downstream_stats['nrSent'] += nr_sent
-            downstream_stats['nrReceived'] += nr_received
+        if nr_sent != nr_received:
+            stats['nrDsSentNotReceived'] += nr_sent-nr_received
+
+        stats['dsPhyIndexes'][tx_phy_index] += 1
+        if packet['PacketLength'] >= 21: # NOTE that in our experiments we sent 21B downstream data packets
+            dataonly_downstream_stats = stats['dataOnlyDownstream']
+            dataonly_downstream_stats['nrPackets'] += 1
+            dataonly_downstream_stats['nrSent'] += nr_sent
+            dataonly_downstream_stats['nrReceived'] += nr_received
             if delivered:
-                downstream_stats['nrDelivered'] += 1
+                dataonly_downstream_stats['nrDelivered'] += 1
             else:
-                downstream_stats['nrUndelivered'] += 1
-            downstream_stats['nrMacSentPktTries'] += nr_sent_tries
+                dataonly_downstream_stats['nrUndelivered'] += 1
+            dataonly_downstream_stats['nrMacSentPktTries'] += nr_sent_tries
+    else:
+        raise ValueError("Fatal error unknown device type {}".format(tx_node_devicetype))
+
+    # update nodes dictionary:
+    nodes[tx_node_id]['PacketsSent'] += nr_sent
+    nodes[tx_node_id]['PacketsReceived'] += nr_received
+    nodes[tx_node_id]['PacketsDropped'] += nr_received_dropped
+    nodes[tx_node_id]['PacketsGenerated'] += 1
+    if delivered:
+        nodes[tx_node_id]['PacketsDelivered'] += 1
+    else:
+        nodes[tx_node_id]['PacketsNotDelivered'] += 1
+
+# Returns the messages of stats (see new_mac_stats) with the packet they are
+# about: (packet number, format string, arguments, timestamp, packet), packets
+# maps the packet numbers of the messages to the packets (see new_mac_packet)
+def resolve_mac_messages(messages, packets):
+    return [message + (packets[message[0]],) for message in messages]
+
+# Print the messages (see resolve_mac_messages) in order of packet number.
+# Messages with a timestamp are only printed if the packet is not near the end
+# of the mac packet trace (before 99% of last_timestamp, the first timestamp of
+# the last packet).
+def print_mac_messages(messages, last_timestamp):
+    for packet_number, format_string, args, timestamp, packet in sorted(messages, key=lambda message: message[0]):
+        if timestamp is not None:
+            fraction = timestamp/last_timestamp
+            if fraction >= 0.99:
+                continue
+            args = args + [timestamp, last_timestamp]
+        print(format_string.format(*args, packet))
+
+# Returns the codes of the MAC packets trace, for trace_loader
+def new_mac_codes():
+    return {'TraceSource': {trace_source: code for code, trace_source in enumerate(mac_trace_sources)}}
+
+def check_mac_trace_sources(codes, csvfilename):
+    if len(codes['TraceSource']) != len(mac_trace_sources):
+        raise ValueError("Unknown MAC trace source in {}: {}".format(csvfilename, list(codes['TraceSource'])[len(mac_trace_sources):]))
+
+# Add the nodes of block that are not in nodes yet (node id -> device type)
+def add_mac_nodes(nodes, block):
+    block = get_block_lists(block, ['NodeId', 'DeviceType'])
+    first_events = dict(zip(reversed(block['NodeId']), reversed(range(len(block['NodeId']))))) # index of the first event in the block of every node
+    for node_id, i in first_events.items():
+        if node_id not in nodes:
+            nodes[node_id] = block['DeviceType'][i]
+
+mac_columns = ['time', 'DeviceType', 'NodeId', 'PhyIndex', 'TraceSource', 'Packet', 'PacketLength', 'Misc']
+
+# Returns the packet table of the blocks of a MAC packets trace (with the
+# Packet column interned in codes). MAC packets are numbered in order of first
+# appearance (the code of the packet in hex). The events of the trace are
+# stored in flat typed columns (packet number, trace source code, node id,
+# misc, see trace_loader), the timestamp, length, PHY index and position (when
+# the blocks have a Position column, see trace_partitions) of the first event
+# of every packet in columns indexed by packet number. nodes (node id ->
+# device type) is updated with the nodes of the blocks.
+def load_mac_packet_table(blocks, codes, nodes, csvfilename):
+    event_columns = [('Packet', 'i'), ('TraceSource', 'b'), ('NodeId', 'i'), ('Misc', 'i')]
+    packet_columns = [('timestamps', 'time', 'd'), ('lengths', 'PacketLength', 'q'), ('phyIndexes', 'PhyIndex', 'q'), ('positions', 'Position', 'q')]
+    columns = {name: [as_column(array(typecode))] for name, typecode in event_columns + [(name, typecode) for name, column, typecode in packet_columns]}
+    n_packets = 0
+    for block in blocks:
+        check_mac_trace_sources(codes, csvfilename)
+        for name, typecode in event_columns:
+            columns[name].append(convert_column(block[name], typecode))
+
+        # index of the first event in the block of every new packet
+        first_events = dict(zip(reversed(block['Packet'].tolist()), reversed(range(len(block['Packet'])))))
+        first_events = [first_events[packet] for packet in range(n_packets, len(codes['Packet']))]
+        n_packets = len(codes['Packet'])
+        for name, column, typecode in packet_columns:
+            if column in block:
+                columns[name].append(convert_column(take_column(block[column], first_events), typecode))
+        add_mac_nodes(nodes, block)
+    table = {'events': tuple(concatenate_columns(columns[name]) for name, typecode in event_columns)}
+    for name, column, typecode in packet_columns:
+        table[name] = concatenate_columns(columns[name])
+    table['names'] = list(codes['Packet'])
+    return table
+
+# Group the events of the packet table (see load_mac_packet_table) by packet,
+# with nodes the nodes of the packets (see new_mac_stats). Returns lists indexed
+# by packet number: 'counts' (the number of events per trace source, a list per
+# trace source), 'txNodes' (the node of the first MacTx, -1 when there is none),
+# 'nrTransmitters' (0, 1 or 2 for more than one), 'nrReceivers' (the number of
+# MacRx events, the number of distinct receivers when there are more than 4),
+# 'sentTries' (the Misc of the first MacSentPkt, 0 when there is none) and
+# 'receivedByOtherDeviceType'.
+def group_mac_events(table, nodes):
+    events = table['events']
+    n_packets = len(table['timestamps'])
+    counts = [array('i', [0]) * n_packets for trace_source in mac_trace_sources]
+    tx_nodes = array('i', [-1]) * n_packets
+    multiple_transmitters = bytearray(n_packets)
+    sent_tries = array('i', [0]) * n_packets
+    for packet, trace_source_code, node_id, misc in zip(*events):
+        counts[trace_source_code][packet] += 1
+        if trace_source_code == MAC_TX:
+            if tx_nodes[packet] == -1:
+                tx_nodes[packet] = node_id
+            elif tx_nodes[packet] != node_id:
+                multiple_transmitters[packet] = 1
+        elif trace_source_code == MAC_SENT_PKT and counts[MAC_SENT_PKT][packet] == 1:
+            sent_tries[packet] = misc
+    received_by_other_devicetype = bytearray(n_packets)
+    receivers = {} # distinct receivers of the packets that were received more than 4 times
+    rx_events = bytes(map(MAC_RX.__eq__, events[1]))
+    for packet, node_id in zip(compress(events[0], rx_events), compress(events[2], rx_events)):
+        if tx_nodes[packet] != -1 and nodes[tx_nodes[packet]]['DeviceType'] != nodes[node_id]['DeviceType']:
+            received_by_other_devicetype[packet] = 1
+        if counts[MAC_RX][packet] > 4:
+            receivers.setdefault(packet, set()).add(node_id)
+    del rx_events
+    return {'counts': counts, 'txNodes': tx_nodes,
+            'nrTransmitters': [1 if tx_node != -1 and not multiple else 0 if tx_node == -1 else 2 for tx_node, multiple in zip(tx_nodes, multiple_transmitters)],
+            'nrReceivers': [len(receivers[packet]) if packet in receivers else n_rx for packet, n_rx in enumerate(counts[MAC_RX])],
+            'sentTries': sent_tries, 'receivedByOtherDeviceType': received_by_other_devicetype}
+
+# group_mac_events with NumPy: the events are grouped with bincount and
+# unique over the packet numbers instead of a loop over the events
+def group_mac_events_numpy(table, nodes):
+    numpy = trace_loader.numpy
+    to_array = lambda values: array('i', values.astype(numpy.int32).tobytes()) # compact, and indexed by the packet loop as Python ints
+    packets, trace_source_codes, node_ids, miscs = [numpy.asarray(column) for column in table['events']]
+    n_packets = len(table['timestamps'])
+    counts = [numpy.bincount(packets[trace_source_codes == trace_source_code], minlength=n_packets) for trace_source_code in range(len(mac_trace_sources))]
+
+    # the node of the first MacTx of every packet and the Misc of its first
+    # MacSentPkt (unique returns the index of the first occurrence)
+    tx_events = trace_source_codes == MAC_TX
+    tx_packets = packets[tx_events]
+    tx_node_ids = node_ids[tx_events]
+    tx_nodes = numpy.full(n_packets, -1, numpy.int32)
+    first_packets, first_indexes = numpy.unique(tx_packets, return_index=True)
+    tx_nodes[first_packets] = tx_node_ids[first_indexes]
+    nr_transmitters = (tx_nodes != -1).astype(numpy.int32)
+    nr_transmitters[tx_packets[tx_node_ids != tx_nodes[tx_packets]]] = 2
+    del tx_events, tx_packets, tx_node_ids
+    sent_tries = numpy.zeros(n_packets, numpy.int32)
+    sent_events = trace_source_codes == MAC_SENT_PKT
+    first_packets, first_indexes = numpy.unique(packets[sent_events], return_index=True)
+    sent_tries[first_packets] = miscs[sent_events][first_indexes]
+    del sent_events
+
+    # receivers of the opposite device type of the transmitter, and the
+    # distinct receivers of the packets that were received more than 4 times
+    device_types = numpy.full(max(nodes, default=0) + 1, -1, numpy.int32)
+    device_types[list(nodes)] = [node['DeviceType'] for node in nodes.values()]
+    rx_events = trace_source_codes == MAC_RX
+    rx_packets = packets[rx_events]
+    rx_node_ids = node_ids[rx_events]
+    rx_tx_nodes = tx_nodes[rx_packets]
+    received_by_other_devicetype = numpy.zeros(n_packets, numpy.bool_)
+    received_by_other_devicetype[rx_packets[(rx_tx_nodes != -1) & (device_types[rx_tx_nodes] != device_types[rx_node_ids])]] = True
+    nr_receivers = counts[MAC_RX].copy()
+    many_receivers = nr_receivers[rx_packets] > 4
+    if many_receivers.any():
+        receivers = numpy.unique(rx_packets[many_receivers].astype(numpy.int64) * len(device_types) + rx_node_ids[many_receivers])
+        receiver_packets, nr_distinct_receivers = numpy.unique(receivers // len(device_types), return_counts=True)
+        nr_receivers[receiver_packets] = nr_distinct_receivers
+    return {'counts': [to_array(trace_source_counts) for trace_source_counts in counts], 'txNodes': to_array(tx_nodes), 'nrTransmitters': to_array(nr_transmitters),
+            'nrReceivers': to_array(nr_receivers), 'sentTries': to_array(sent_tries), 'receivedByOtherDeviceType': bytearray(received_by_other_devicetype.tobytes())}
+
+# Process all packets of the packet table (see load_mac_packet_table) into
+# stats (see new_mac_stats), in order of packet number
+def process_mac_packet_table(stats, table):
+    packet_names = table['names']
+    groups = (group_mac_events_numpy if trace_loader.numpy is not None else group_mac_events)(table, stats['nodes'])
+    counts = groups['counts']
+    timestamps, lengths, phy_indexes = [table[name].tolist() for name in ['timestamps', 'lengths', 'phyIndexes']]
+    for key in range(len(timestamps)):
+        process_mac_packet(stats, key, packet_names[key], {'Timestamp': timestamps[key], 'PacketLength': lengths[key], 'PhyIndex': phy_indexes[key],
+                                                           'TxNode': groups['txNodes'][key], 'NrTransmitters': groups['nrTransmitters'][key], 'NrReceivers': groups['nrReceivers'][key],
+                                                           'MacTx': counts[MAC_TX][key], 'MacTxOk': counts[MAC_TX_OK][key], 'MacTxDrop': counts[MAC_TX_DROP][key],
+                                                           'MacRx': counts[MAC_RX][key], 'MacRxDrop': counts[MAC_RX_DROP][key], 'MacSentPkt': counts[MAC_SENT_PKT][key],
+                                                           'SentTries': groups['sentTries'][key], 'ReceivedByOtherDeviceType': groups['receivedByOtherDeviceType'][key]})
+    stats['messages'] = resolve_mac_messages(stats['messages'], get_mac_packets(set(message[0] for message in stats['messages']), table))
+
+# Read chunk chunk_index of a MAC packets trace for parse_partitioned:
+# returns the nodes of the chunk (node id -> device type) and the events of
+# every partition (by packet)
+def read_mac_chunk(csvfilename, chunk, chunk_index, n_partitions):
+    codes = new_mac_codes()
+    nodes = {}
+    partitions = [[] for partition in range(n_partitions)]
+    for block in iter_chunk_blocks(csvfilename, chunk, chunk_index, mac_columns, codes, strings=['Packet']):
+        check_mac_trace_sources(codes, csvfilename)
+        add_mac_nodes(nodes, block)
+        for partition, events in zip(partitions, partition_block(block, get_partitions(block['Packet'], n_partitions), n_partitions)):
+            partition.append(events)
+    return nodes, [concatenate_blocks(partition) for partition in partitions]
+
+# Combine the nodes of all chunks (see read_mac_chunk)
+def combine_mac_chunks(chunk_nodes):
+    nodes = {}
+    for other in chunk_nodes:
+        for node_id, device_type in other.items():
+            nodes.setdefault(node_id, device_type)
+    return nodes
+
+# Process the events of a partition (see read_mac_chunk) for parse_partitioned:
+# returns the statistics of its packets (see new_mac_stats) with the position
+# of the packet as packet number of the messages, and (position, first
+# timestamp) of the last packet of the partition
+def process_mac_partition(block, nodes):
+    stats = new_mac_stats(nodes)
+    if not block:
+        return stats, (-1, -1)
+    codes = new_mac_codes()
+    codes['Packet'] = {}
+    block['Packet'] = intern_column(block['Packet'], codes['Packet'])
+    table = load_mac_packet_table([block], codes, {}, None)
+    process_mac_packet_table(stats, table)
+    positions = table['positions'].tolist()
+    stats['messages'] = [(positions[message[0]],) + message[1:] for message in stats['messages']]
+    last_packet = (positions[-1], float(table['timestamps'][-1])) if positions else (-1, -1)
+    return stats, last_packet
+
+# Returns the state of a MAC packets trace that is processed in streaming mode
+# (see add_mac_stream_block): the statistics of the processed packets (see
+# new_mac_stats), the packets in flight in order of first appearance (packet in
+# hex -> (packet number, packet, see new_mac_packet)), the packets that were
+# processed as soon as their fate was known, in order of processing (packet in
+# hex -> (transmitting node, timestamp of the event that completed it)), the
+# packets of the messages (packet number -> packet), the number of packets and
+# the timestamp of the first event of the last packet
+def new_mac_stream():
+    return {'stats': new_mac_stats({}), 'inFlight': OrderedDict(), 'completed': OrderedDict(), 'reportedPackets': {}, 'nPackets': 0, 'lastTimestamp': -1}
+
+# Returns whether the fate of MAC packet packet (see new_mac_packet) is known:
+# an upstream packet has been dropped (MacTxDrop) or sent (the MacSentPkt that
+# follows MacTxOk), a downstream packet (which is always in MacTxOk) has been
+# received by an end device. Only MacRxDrop events of gateways can follow.
+def is_mac_packet_complete(packet, nodes):
+    if not packet['MacTx']:
+        return False
+    if packet['MacTxDrop'] or packet['MacSentPkt']:
+        return True
+    downstream = nodes[packet['MacTx'][0]]['DeviceType'] == 0
+    return downstream and bool(packet['MacTxOk']) and any(nodes[node_id]['DeviceType'] == 1 for node_id in packet['MacRx'])
+
+# Process MAC packet packet (see new_mac_packet) of stream (see
+# new_mac_stream) with packet number sequence
+def process_mac_stream_packet(stream, sequence, mac_packets_key, packet):
+    stats = stream['stats']
+    n_messages = len(stats['messages'])
+    process_mac_packet(stats, sequence, mac_packets_key, summarize_mac_packet(packet, stats['nodes']))
+    if len(stats['messages']) != n_messages:
+        stream['reportedPackets'][sequence] = packet
+
+# Process the packets in flight of stream (see new_mac_stream) that were first
+# seen before limit, and forget the completed packets that were completed
+# before limit (all of them when limit is None)
+def process_mac_stream_packets(stream, limit=None):
+    in_flight = stream['inFlight']
+    while in_flight and (limit is None or next(iter(in_flight.values()))[1]['Timestamp'] < limit):
+        mac_packets_key, (sequence, packet) = in_flight.popitem(last=False)
+        process_mac_stream_packet(stream, sequence, mac_packets_key, packet)
+    completed = stream['completed']
+    while completed and (limit is None or next(iter(completed.values()))[1] < limit):
+        completed.popitem(last=False)
+
+# Add the events of block (with the Packet column as strings) to stream (see
+# new_mac_stream). A packet is processed as soon as its fate is known (see
+# is_mac_packet_complete), the MacRxDrop events that follow it within horizon
+# seconds are added to the dropped packets of its transmitter. The other
+# packets are processed once they were first seen more than horizon seconds
+# before the end of the block.
+def add_mac_stream_block(stream, block, horizon):
+    block = get_block_lists(block)
+    nodes = stream['stats']['nodes']
+    in_flight = stream['inFlight']
+    completed = stream['completed']
+    for i, (node_id, trace_source_code, mac_packets_key) in enumerate(zip(block['NodeId'], block['TraceSource'], block['Packet'])):
+        if node_id not in nodes:
+            nodes[node_id] = new_mac_node(block['DeviceType'][i])
+
+        if mac_packets_key not in in_flight:
+            if trace_source_code == MAC_RX_DROP and mac_packets_key in completed:
+                nodes[completed[mac_packets_key][0]]['PacketsDropped'] += 1
+                continue
+            completed.pop(mac_packets_key, None)
+            stream['lastTimestamp'] = block['time'][i]
+            in_flight[mac_packets_key] = (stream['nPackets'], new_mac_packet(block['time'][i], block['PacketLength'][i], block['PhyIndex'][i]))
+            stream['nPackets'] += 1
+        sequence, packet = in_flight[mac_packets_key]
+        packet[mac_trace_sources[trace_source_code]].append(node_id)
+        if trace_source_code == MAC_SENT_PKT:
+            packet['MacSentPktMisc'].append((node_id, block['Misc'][i]))
+
+        if trace_source_code != MAC_RX_DROP and is_mac_packet_complete(packet, nodes):
+            del in_flight[mac_packets_key]
+            process_mac_stream_packet(stream, sequence, mac_packets_key, packet)
+            completed[mac_packets_key] = (packet['MacTx'][0], block['time'][i])
+
+    if block['time']:
+        process_mac_stream_packets(stream, block['time'][-1] - horizon)
+
+# Process the remaining packets in flight of stream (see new_mac_stream).
+# Returns the statistics of all its packets (see new_mac_stats).
+def finish_mac_stream(stream):
+    process_mac_stream_packets(stream)
+    stats = stream['stats']
+    stats['messages'] = resolve_mac_messages(stats['messages'], stream['reportedPackets'])
+    return stats
+
+# Read the MAC packets trace file csvfilename and process its packets. Returns
+# the statistics of the packets (see new_mac_stats) and the timestamp of the
+# first event of the last packet (lastTimestamp).
+#
+# With a horizon (in seconds) the trace is parsed in streaming mode: a packet is
+# processed and forgotten as soon as its fate is known (see
+# is_mac_packet_complete), or else once the trace is more than horizon seconds
+# past its first event, so the memory use grows with the number of packets in
+# flight instead of the length of the trace. The horizon must be longer than
+# the lifetime of a packet (all its retransmissions and receptions): events of
+# a packet that arrive later are counted as a new packet without MacTx, which
+# is reported and skipped.
+#
+# With jobs > 1 the trace is split into chunks that are parsed by jobs
+# processes, the packets are partitioned by their key (see trace_partitions).
+# Compressed traces and the streaming mode are parsed by a single process.
+def read_mac_stats(csvfilename, horizon=None, jobs=1):
+    print("Parsing mac packets csv file {}".format(csvfilename))
+    last_timestamp = -1
 
-            downstream_stats_sent[nr_sent] += 1
-            downstream_stats_received[nr_received] += 1
-            if delivered:
-                downstream_stats_senttries[nr_sent_tries] += 1
-
-            if nr_sent != nr_received:
-                number_of_ds_sent_packets_that_were_not_received += nr_sent-nr_received
-
-            ds_phy_indexes.append(tx_phy_index)
-            if packet['PacketLength'] >= 21: # NOTE that in our experiments we sent 21B downstream data packets
-                dataonly_downstream_stats['nrPackets'] += 1
-                dataonly_downstream_stats['nrSent'] += nr_sent
-                dataonly_downstream_stats['nrReceived'] += nr_received
-                if delivered:
-                    dataonly_downstream_stats['nrDelivered'] += 1
-                else:
-                    dataonly_downstream_stats['nrUndelivered'] += 1
-                dataonly_downstream_stats['nrMacSentPktTries'] += nr_sent_tries
-        else:
-            print("Fatal error unknown device type")
-            exit()
-
-        # update nodes dictionary:
-        nodes[tx_node_id]['PacketsSent'] += nr_sent
-        nodes[tx_node_id]['PacketsReceived'] += nr_received
-        nodes[tx_node_id]['PacketsDropped'] += nr_received_dropped
-        nodes[tx_node_id]['PacketsGenerated'] += 1
-        if delivered:
-            nodes[tx_node_id]['PacketsDelivered'] += 1
-        else:
-            nodes[tx_node_id]['PacketsNotDelivered'] += 1
-
-    # parse trace misc csv file:
-    trace_misc_file_name = csvfilename.replace("trace-mac-packets.csv", "trace-misc.csv")
-    trace_misc = {"nrRW1Sent": -1, "nrRW2Sent": -1, "nrRW1Missed": -1,"nrRW2Missed": -1}
-    with open(trace_misc_file_name, newline='') as csvfile:
-        linereader = csv.reader(csvfile, delimiter=',', quotechar='|')
-        next(linereader) # skip the header line in the csv file
-        row = next(linereader)
-        trace_misc['nrRW1Sent'] = int(row[0])
-        trace_misc['nrRW2Sent'] = int(row[1])
-        trace_misc['nrRW1Missed'] = int(row[2])
-        trace_misc['nrRW2Missed'] = int(row[3])
-
-    # parse sim settings file:
-    sim_settings_file_name = csvfilename.replace("trace-mac-packets.csv", "sim-settings.txt")
-
-    sim_settings = {"nGateways": -1, "nEndDevices": -1, "totalTime": -1, "usConfirmedData": -1, "usDataPeriod": -1, "seed": -1, "drCalcMethod": -1, "drCalcMethodMisc": -1, "dsDataGenerate": -1, "dsDataExpMean": -1, "dsConfirmedData": -1}
- 
-    with open(sim_settings_file_name) as sim_settings_file:
-        sim_settings_file_contents = sim_settings_file.read()
-
-        p_ngateways = re.compile('nGateways = ([0-9]+)')
-        p_nenddevices = re.compile('nEndDevices = ([0-9]+)')
-        p_totaltime = re.compile('totalTime = ([0-9]+)')
-        p_confirmed_data = re.compile('usConfirmedData = ([0-1])')
-        p_data_period = re.compile('usDataPeriod = ([0-9]+)')
-        p_seed = re.compile('seed = ([0-9]+)')
-        p_drcalcmethod = re.compile('Data rate assignment method index: ([0-9]+)')
-        p_dsdatagenerate = re.compile('dsDataGenerate = ([0-1])')
-        p_dsdataexpmean = re.compile('dsDataExpMean = ([0-9]+)')
-        p_dsconfirmeddata = re.compile('dsConfirmedData = ([0-1])')
-
-        sim_settings['nGateways'] = int(p_ngateways.search (sim_settings_file_contents).groups()[0])
-        sim_settings['nEndDevices'] = int(p_nenddevices.search (sim_settings_file_contents).groups()[0])
-        sim_settings['totalTime'] =  int(p_totaltime.search (sim_settings_file_contents).groups()[0])
-        sim_settings['usConfirmedData'] = int(p_confirmed_data.search (sim_settings_file_contents).groups()[0])
-        sim_settings['usDataPeriod'] = int(p_data_period.search (sim_settings_file_contents).groups()[0])
-        sim_settings['seed'] = int(p_seed.search (sim_settings_file_contents).groups()[0])
-        sim_settings['dsDataGenerate'] = int(p_dsdatagenerate.search (sim_settings_file_contents).groups()[0])
-        sim_settings['dsDataExpMean'] = int(p_dsdataexpmean.search (sim_settings_file_contents).groups()[0])
-        sim_settings['dsConfirmedData'] = int(p_dsconfirmeddata.search (sim_settings_file_contents).groups()[0])
-
-        sim_settings['drCalcMethod'] = int(p_drcalcmethod.search (sim_settings_file_contents).groups()[0])
-        if sim_settings['drCalcMethod'] == 0:
-            p_drcalcperlimit = re.compile('PER limit = (\d+\.\d+)')
-            sim_settings['drCalcMethodMisc'] = float(p_drcalcperlimit.search (sim_settings_file_contents).groups()[0])
-        if sim_settings['drCalcMethod'] == 2:
-            p_drcalcfixeddr = re.compile('Fixed Data Rate Index = ([0-9]+)')
-            sim_settings['drCalcMethodMisc'] = int(p_drcalcfixeddr.search (sim_settings_file_contents).groups()[0])
+    if horizon is not None:
+        stream = new_mac_stream()
+        codes = new_mac_codes()
+        for block in iter_trace_blocks(csvfilename, mac_columns, codes, strings=['Packet']):
+            check_mac_trace_sources(codes, csvfilename)
+            add_mac_stream_block(stream, block, horizon)
+        stats = finish_mac_stream(stream)
+        last_timestamp = stream['lastTimestamp']
+    elif jobs > 1 and can_partition(csvfilename):
+        nodes, results = parse_partitioned(csvfilename, jobs, read_mac_chunk, combine_mac_chunks, process_mac_partition)
+        stats = new_mac_stats(nodes)
+        last_packet = (-1, -1)
+        for partition_stats, partition_last_packet in results:
+            merge_mac_stats(stats, partition_stats)
+            last_packet = max(last_packet, partition_last_packet)
+        last_timestamp = last_packet[1]
+    else:
+        device_types = {}
+        codes = new_mac_codes()
+        table = load_mac_packet_table(iter_trace_blocks(csvfilename, mac_columns, codes), codes, device_types, csvfilename)
+        if len(table['timestamps']):
+            last_timestamp = float(table['timestamps'][-1])
+        stats = new_mac_stats(device_types)
+        process_mac_packet_table(stats, table)
+        del table
+
+    stats['lastTimestamp'] = last_timestamp
+    return stats
+
+# Returns the output of a simulation: a dict mapping the name of every output
+# (see output_file_names) to a tuple (header line, output lines), from the
+# statistics of its MAC packets trace (see read_mac_stats), its sim settings
+# and its trace-misc counters
+def get_mac_outputs(stats, sim_settings, trace_misc):
+    print_mac_messages(stats['messages'], stats['lastTimestamp'])
+
+    nodes = stats['nodes']
+    upstream_stats = stats['upstream']
+    upstream_stats_sent = stats['upstreamSent']
+    upstream_stats_received = stats['upstreamReceived']
+    upstream_stats_senttries = stats['upstreamSentTries']
+    downstream_stats = stats['downstream']
+    downstream_stats_sent = stats['downstreamSent']
+    downstream_stats_received = stats['downstreamReceived']
+    downstream_stats_senttries = stats['downstreamSentTries']
+    dataonly_downstream_stats = stats['dataOnlyDownstream']
+    us_packets_sent_vs_received = stats['usPacketsSentVsReceived']
+    number_of_us_sent_packets_that_were_not_received = stats['nrUsSentNotReceived']
+    number_of_ds_sent_packets_that_were_not_received = stats['nrDsSentNotReceived']
+    ds_phy_indexes = stats['dsPhyIndexes']
+    nr_ds_tx_received_rw1 = stats['nrDsTxReceivedRw1']
+    nr_ds_tx_received_rw2 = stats['nrDsTxReceivedRw2']
+    nr_ds_tx_not_received = stats['nrDsTxNotReceived']
 
     # Generate output:
     print("\nUpstream stats: {}".format(upstream_stats))
@@ -331,124 +685,196 @@ for csvfilename in args.csvfiles:
     print("DS nrRW1Missed/nrRW2Missed: {}/{}".format(trace_misc['nrRW1Missed'], trace_misc['nrRW2Missed']))
     print("DS nrRW1Missed-nrRW2Missed = {}".format(trace_misc['nrRW1Missed'] - trace_misc['nrRW2Missed']))
 
-    # # Generate output per simulation
-    print ("\nAppending output per simulation to {}".format(args.outputfilesimulation))
-    write_header = False
-    if not os.path.exists(args.outputfilesimulation):
-        write_header = True
-    with open(args.outputfilesimulation, 'a') as output_file: # append to output file
-        outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,"\
-                       "<usConfirmedData>,<usDataPeriod>,<usDelivered>,<usPackets>,<PDR>,<usSent>,<usReceived>,"\
-                       "<usSent0>,<usSent1>,<usSent2>,<usSent3>,<usSent4>,"\
-                       "<usReceived0>,<usReceived1>,<usReceived2>,<usReceived3>,<usReceived4>,"\
-                       "<usSentTries0>,<usSentTries1>,<usSentTries2>,<usSentTries3>,<usSentTries4>,"
-        for sent_it in range(1, 4 + 1):
-            for recv_it in range(0, 4*4 + 1):
-                outputFormat+="<usS{}R{}>,".format(sent_it, recv_it)
-
-        outputFormat+= "<dsSent0>,<dsSent1>,<dsSent2>,<dsSent3>,<dsSent4>,"\
-                       "<dsReceived0>,<dsReceived1>,<dsReceived2>,<dsReceived3>,<dsReceived4>,"\
-                       "<dsSentTries0>,<dsSentTries1>,<dsSentTries2>,<dsSentTries3>,<dsSentTries4>,"\
-                       "<dsRW1Sent>,<dsRW2Sent>,<dsRW1Received>,<dsRW2Received>,<dsNotReceived>,"\
-                       "<dsRW1Missed>,<dsRW2Missed>\n"
-        if write_header:
-            output_file.write(outputFormat)
-
-        output_line_dr_pdrs = ""
-        for data_rate_index in data_rate_stats:
-            dr_delivered = data_rate_stats[data_rate_index][0]
-            dr_undelivered = data_rate_stats[data_rate_index][1]
-            dr_tx = dr_delivered + dr_undelivered
-            dr_pdr = dr_delivered/dr_tx if dr_tx > 0 else 0
-            output_line_dr_pdrs = output_line_dr_pdrs + "{},{},{:1.4f},".format(dr_delivered, dr_tx, dr_pdr)
-        output_line_dr_pdrs = output_line_dr_pdrs[:-1] # remove trailing comma
-
-        # sim settings + us stats
-        output_line = "{},{},{},{},{},{},"\
-                      "{},{},{},{},{:1.4f},{},{},"\
-                      "{},{},{},{},{},"\
-                      "{},{},{},{},{},"\
-                      "{},{},{},{},{},".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'], sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'],
-                                               sim_settings['usConfirmedData'], sim_settings['usDataPeriod'], upstream_stats['nrDelivered'], upstream_stats['nrPackets'], upstream_stats['nrDelivered']/upstream_stats['nrPackets'], upstream_stats['nrSent'], upstream_stats['nrReceived'],
-                                               upstream_stats_sent[0],upstream_stats_sent[1],upstream_stats_sent[2],upstream_stats_sent[3],upstream_stats_sent[4],
-                                               upstream_stats_received[0],upstream_stats_received[1],upstream_stats_received[2],upstream_stats_received[3],upstream_stats_received[4],
-                                               upstream_stats_senttries[0],upstream_stats_senttries[1],upstream_stats_senttries[2],upstream_stats_senttries[3],upstream_stats_senttries[4])
-
-        # nr of times sent vs nr of times received
-        for nr_sent_it in range(1, 4+1):
-            format_string = "{},"
-            format_string += "{},{},{},{},"*4
-            format_args = [] # [us_packets_sent_vs_received[nr_sent_it][0]]
-            for nr_received_it in range(0, 4*4 + 1):
-                 format_args.append(us_packets_sent_vs_received[nr_sent_it][nr_received_it])
-
-            s = format_string.format(*format_args)
-            output_line += s
-
-        # downstream stats
-        output_line += "{},{},{},{},{},"\
-                       "{},{},{},{},{},"\
-                       "{},{},{},{},{},"\
-                       "{},{},{},{},{},"\
-                       "{},{}\n".format(downstream_stats_sent[0],downstream_stats_sent[1],downstream_stats_sent[2],downstream_stats_sent[3],downstream_stats_sent[4],
-                                                 downstream_stats_received[0],downstream_stats_received[1],downstream_stats_received[2],downstream_stats_received[3],downstream_stats_received[4],
-                                                 downstream_stats_senttries[0],downstream_stats_senttries[1],downstream_stats_senttries[2],downstream_stats_senttries[3],downstream_stats_senttries[4],
-                                                 nr_ds_tx_sent_rw1, nr_ds_tx_sent_rw2, nr_ds_tx_received_rw1, nr_ds_tx_received_rw2, nr_ds_tx_not_received,
-                                                 trace_misc['nrRW1Missed'], trace_misc['nrRW2Missed'])
-
-        output_file.write(output_line)
-
-
-    # Generate compact output file:
-    print ("\nAppending compact output per simulation to {}".format(args.outputfilesimulationcompact))
-    write_header = False
-    if not os.path.exists(args.outputfilesimulationcompact):
-        write_header = True
-    with open(args.outputfilesimulationcompact, 'a') as output_file: # append to output file
-        outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,"\
-                       "<usConfirmedData>,<usDataPeriod>,<dsDataGenerate>,<dsConfirmedData>,<dsDataExpMean>,"\
-                       "<usDelivered>,<usPackets>,<PDR>,<usSent>,<usReceived>,"\
-                       "<dsDeliveredAll>,<dsPacketsAll>,<dsPDRAll>,<dsSentAll>,<dsReceivedAll>,"\
-                       "<dsDeliveredData>,<dsPacketsData>,<nsdsGeneratedData>,<dsPDRData>,<dsSentData>,<dsReceivedData>,"\
-                       "<dsRW1SentMac>,<dsRW2SentMac>,<dsRW1Received>,<dsRW2Received>,<dsNotReceived>,"\
-                       "<dsRW1SentMisc>,<dsRW2SentMisc>,<dsRW1MissedMisc>,<dsRW2MissedMisc>\n"
-
-        if write_header:
-            output_file.write(outputFormat)
-
-        # sim settings + us stats + ds stats
-        output_line = "{},{},{},{},{},{},"\
-                      "{},{},{},{},{},"\
-                      "{},{},{:1.4f},{},{},"\
-                      "{},{},{:1.4f},{},{},"\
-                      "{},{},{},{},{},{},"\
-                      "{},{},{},{},{},"\
-                      "{},{},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'], sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'],
-                                               sim_settings['usConfirmedData'], sim_settings['usDataPeriod'], sim_settings['dsDataGenerate'],  sim_settings['dsConfirmedData'],  sim_settings['dsDataExpMean'], 
-                                               upstream_stats['nrDelivered'], upstream_stats['nrPackets'], upstream_stats['nrDelivered']/upstream_stats['nrPackets'], upstream_stats['nrSent'], upstream_stats['nrReceived'],
-                                               downstream_stats['nrDelivered'], downstream_stats['nrPackets'], (downstream_stats['nrDelivered']/downstream_stats['nrPackets']) if downstream_stats['nrPackets'] > 0 else 0, downstream_stats['nrSent'], downstream_stats['nrReceived'],
-                                               dataonly_downstream_stats['nrDelivered'], dataonly_downstream_stats['nrPackets'], "?", "?", dataonly_downstream_stats['nrSent'], dataonly_downstream_stats['nrReceived'],
-                                               nr_ds_tx_sent_rw1, nr_ds_tx_sent_rw2, nr_ds_tx_received_rw1, nr_ds_tx_received_rw2, nr_ds_tx_not_received,
-                                               trace_misc['nrRW1Sent'], trace_misc['nrRW2Sent'], trace_misc['nrRW1Missed'], trace_misc['nrRW2Missed'])
-        output_file.write(output_line)
-
-    # Generate output per node
-    print ("Appending output per end device to {}".format(args.outputfileenddevice))
-    write_header = False
-    if not os.path.exists(args.outputfileenddevice):
-        write_header = True
-    with open(args.outputfileenddevice, 'a') as output_file: # append to output file
-        outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usDataConfirmed>,<usDataPeriod>,<nodeId>,<packetsDelivered>,<packetsGenerated>,<PDR>,<packetsSent>,<packetsReceived>,\n"
-        if write_header:
-            output_file.write(outputFormat)
-
-        for node_id in sorted(nodes):
-            if nodes[node_id]['PacketsGenerated'] > 0:
-                output_line = "{},{},{},{},{},{},{},{},{},{},{},{:1.4f},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
-                                                                          sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'], sim_settings['usConfirmedData'], sim_settings['usDataPeriod'],
-                                                                          node_id, nodes[node_id]['PacketsDelivered'], nodes[node_id]['PacketsGenerated'], nodes[node_id]['PacketsDelivered']/nodes[node_id]['PacketsGenerated'], nodes[node_id]['PacketsSent'], nodes[node_id]['PacketsReceived'])
-                output_file.write(output_line)
-            else:
-                # print ("{},{},{},{}".format(k, 0, 0, 1))
-                pass
-    print ("------------------------------------------------------------------")
+    outputs = {}
+
+    # Output per simulation:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,"\
+                   "<usConfirmedData>,<usDataPeriod>,<usDelivered>,<usPackets>,<PDR>,<usSent>,<usReceived>,"\
+                   "<usSent0>,<usSent1>,<usSent2>,<usSent3>,<usSent4>,"\
+                   "<usReceived0>,<usReceived1>,<usReceived2>,<usReceived3>,<usReceived4>,"\
+                   "<usSentTries0>,<usSentTries1>,<usSentTries2>,<usSentTries3>,<usSentTries4>,"
+    for sent_it in range(1, 4 + 1):
+        for recv_it in range(0, 4*4 + 1):
+            outputFormat+="<usS{}R{}>,".format(sent_it, recv_it)
+
+    outputFormat+= "<dsSent0>,<dsSent1>,<dsSent2>,<dsSent3>,<dsSent4>,"\
+                   "<dsReceived0>,<dsReceived1>,<dsReceived2>,<dsReceived3>,<dsReceived4>,"\
+                   "<dsSentTries0>,<dsSentTries1>,<dsSentTries2>,<dsSentTries3>,<dsSentTries4>,"\
+                   "<dsRW1Sent>,<dsRW2Sent>,<dsRW1Received>,<dsRW2Received>,<dsNotReceived>,"\
+                   "<dsRW1Missed>,<dsRW2Missed>\n"
+
+    # sim settings + us stats
+    output_line = "{},{},{},{},{},{},"\
+                  "{},{},{},{},{:1.4f},{},{},"\
+                  "{},{},{},{},{},"\
+                  "{},{},{},{},{},"\
+                  "{},{},{},{},{},".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'], sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'],
+                                           sim_settings['usConfirmedData'], sim_settings['usDataPeriod'], upstream_stats['nrDelivered'], upstream_stats['nrPackets'], upstream_stats['nrDelivered']/upstream_stats['nrPackets'], upstream_stats['nrSent'], upstream_stats['nrReceived'],
+                                           upstream_stats_sent[0],upstream_stats_sent[1],upstream_stats_sent[2],upstream_stats_sent[3],upstream_stats_sent[4],
+                                           upstream_stats_received[0],upstream_stats_received[1],upstream_stats_received[2],upstream_stats_received[3],upstream_stats_received[4],
+                                           upstream_stats_senttries[0],upstream_stats_senttries[1],upstream_stats_senttries[2],upstream_stats_senttries[3],upstream_stats_senttries[4])
+
+    # nr of times sent vs nr of times received
+    for nr_sent_it in range(1, 4+1):
+        format_string = "{},"
+        format_string += "{},{},{},{},"*4
+        format_args = [] # [us_packets_sent_vs_received[nr_sent_it][0]]
+        for nr_received_it in range(0, 4*4 + 1):
+             format_args.append(us_packets_sent_vs_received[nr_sent_it][nr_received_it])
+
+        s = format_string.format(*format_args)
+        output_line += s
+
+    # downstream stats
+    output_line += "{},{},{},{},{},"\
+                   "{},{},{},{},{},"\
+                   "{},{},{},{},{},"\
+                   "{},{},{},{},{},"\
+                   "{},{}\n".format(downstream_stats_sent[0],downstream_stats_sent[1],downstream_stats_sent[2],downstream_stats_sent[3],downstream_stats_sent[4],
+                                             downstream_stats_received[0],downstream_stats_received[1],downstream_stats_received[2],downstream_stats_received[3],downstream_stats_received[4],
+                                             downstream_stats_senttries[0],downstream_stats_senttries[1],downstream_stats_senttries[2],downstream_stats_senttries[3],downstream_stats_senttries[4],
+                                             nr_ds_tx_sent_rw1, nr_ds_tx_sent_rw2, nr_ds_tx_received_rw1, nr_ds_tx_received_rw2, nr_ds_tx_not_received,
+                                             trace_misc['nrRW1Missed'], trace_misc['nrRW2Missed'])
+    outputs['simulation'] = (outputFormat, [output_line])
+
+    # Compact output per simulation:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,"\
+                   "<usConfirmedData>,<usDataPeriod>,<dsDataGenerate>,<dsConfirmedData>,<dsDataExpMean>,"\
+                   "<usDelivered>,<usPackets>,<PDR>,<usSent>,<usReceived>,"\
+                   "<dsDeliveredAll>,<dsPacketsAll>,<dsPDRAll>,<dsSentAll>,<dsReceivedAll>,"\
+                   "<dsDeliveredData>,<dsPacketsData>,<nsdsGeneratedData>,<dsPDRData>,<dsSentData>,<dsReceivedData>,"\
+                   "<dsRW1SentMac>,<dsRW2SentMac>,<dsRW1Received>,<dsRW2Received>,<dsNotReceived>,"\
+                   "<dsRW1SentMisc>,<dsRW2SentMisc>,<dsRW1MissedMisc>,<dsRW2MissedMisc>\n"
+
+    # sim settings + us stats + ds stats
+    output_line = "{},{},{},{},{},{},"\
+                  "{},{},{},{},{},"\
+                  "{},{},{:1.4f},{},{},"\
+                  "{},{},{:1.4f},{},{},"\
+                  "{},{},{},{},{},{},"\
+                  "{},{},{},{},{},"\
+                  "{},{},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'], sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'],
+                                           sim_settings['usConfirmedData'], sim_settings['usDataPeriod'], sim_settings['dsDataGenerate'],  sim_settings['dsConfirmedData'],  sim_settings['dsDataExpMean'], 
+                                           upstream_stats['nrDelivered'], upstream_stats['nrPackets'], upstream_stats['nrDelivered']/upstream_stats['nrPackets'], upstream_stats['nrSent'], upstream_stats['nrReceived'],
+                                           downstream_stats['nrDelivered'], downstream_stats['nrPackets'], (downstream_stats['nrDelivered']/downstream_stats['nrPackets']) if downstream_stats['nrPackets'] > 0 else 0, downstream_stats['nrSent'], downstream_stats['nrReceived'],
+                                           dataonly_downstream_stats['nrDelivered'], dataonly_downstream_stats['nrPackets'], "?", "?", dataonly_downstream_stats['nrSent'], dataonly_downstream_stats['nrReceived'],
+                                           nr_ds_tx_sent_rw1, nr_ds_tx_sent_rw2, nr_ds_tx_received_rw1, nr_ds_tx_received_rw2, nr_ds_tx_not_received,
+                                           trace_misc['nrRW1Sent'], trace_misc['nrRW2Sent'], trace_misc['nrRW1Missed'], trace_misc['nrRW2Missed'])
+    outputs['simulationCompact'] = (outputFormat, [output_line])
+
+    # Output per node:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usDataConfirmed>,<usDataPeriod>,<nodeId>,<packetsDelivered>,<packetsGenerated>,<PDR>,<packetsSent>,<packetsReceived>,\n"
+    output_lines = []
+    for node_id in sorted(nodes):
+        if nodes[node_id]['PacketsGenerated'] > 0:
+            output_line = "{},{},{},{},{},{},{},{},{},{},{},{:1.4f},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
+                                                                      sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'], sim_settings['usConfirmedData'], sim_settings['usDataPeriod'],
+                                                                      node_id, nodes[node_id]['PacketsDelivered'], nodes[node_id]['PacketsGenerated'], nodes[node_id]['PacketsDelivered']/nodes[node_id]['PacketsGenerated'], nodes[node_id]['PacketsSent'], nodes[node_id]['PacketsReceived'])
+            output_lines.append(output_line)
+        else:
+            # print ("{},{},{},{}".format(k, 0, 0, 1))
+            pass
+    outputs['enddevices'] = (outputFormat, output_lines)
+    return outputs
+
+# Parse the MAC packets trace file csvfilename (and the trace-misc and
+# sim-settings files of the same simulation). Returns the output of the
+# simulation (see get_mac_outputs). horizon and jobs: see read_mac_stats.
+def parse_trace_file(csvfilename, horizon=None, jobs=1):
+    stats = read_mac_stats(csvfilename, horizon, jobs)
+    # parse trace misc csv file and sim settings file:
+    trace_misc = load_trace_misc(find_trace_file(csvfilename, "trace-mac-packets.csv", "trace-misc.csv"))
+    sim_settings = load_sim_settings(find_trace_file(csvfilename, "trace-mac-packets.csv", "sim-settings.txt"))
+    return get_mac_outputs(stats, sim_settings, trace_misc)
+
+# Returns the snapshot of a followed MAC packets trace (see print_snapshot of
+# trace_follow) from its stream (see new_mac_stream): the PDR of the processed
+# upstream and downstream packets and the number of MAC transmissions per
+# packet, of all packets and of the packets processed since the previous
+# snapshot (with values previous)
+def get_mac_snapshot(stream, previous):
+    stats = stream['stats']
+    values = {'traceTime': stream['lastTimestamp'], 'packetsInFlight': len(stream['inFlight']), 'messages': len(stats['messages'])}
+    for direction, name in [('us', 'upstream'), ('ds', 'downstream')]:
+        values.update({direction + 'Packets': stats[name]['nrPackets'], direction + 'Delivered': stats[name]['nrDelivered'], direction + 'Sent': stats[name]['nrSent']})
+    interval = get_interval_values(values, previous)
+    text = "t={:.0f}s".format(values['traceTime'])
+    for direction in ['us', 'ds']:
+        for label, counts in [(direction.upper(), values), ("last {:.0f}s".format(interval['traceTime']), interval)]:
+            packets = counts[direction + 'Packets']
+            text += " {}: PDR {:.4f} ({}/{}), {:.3f} tx/packet".format(label, counts[direction + 'Delivered']/packets if packets > 0 else 0, counts[direction + 'Delivered'], packets,
+                                                                        counts[direction + 'Sent']/packets if packets > 0 else 0)
+    text += ", {} packets in flight, {} unexpected packets".format(values['packetsInFlight'], values['messages'])
+    return text, values
+
+# Follow the MAC packets trace file csvfilename while a simulation writes it
+# (see trace_follow): the packets are processed in streaming mode (see
+# read_mac_stats) as lines are appended, and a snapshot of the statistics (see
+# get_mac_snapshot) is printed every snapshot_interval seconds and written to
+# snapshot_file. When the trace is no longer followed, the packets in flight
+# are processed and a last snapshot is printed. Returns the statistics (see
+# new_mac_stats).
+def follow_mac_trace(csvfilename, horizon=follow_horizon, snapshot_file=None, idle_timeout=None):
+    stream = new_mac_stream()
+    codes = new_mac_codes()
+    def add_block(block):
+        check_mac_trace_sources(codes, csvfilename)
+        add_mac_stream_block(stream, block, horizon)
+    get_snapshot = lambda previous: get_mac_snapshot(stream, previous)
+    previous = follow_trace(csvfilename, mac_columns, codes, ['Packet'], add_block, get_snapshot, snapshot_file, idle_timeout)
+    stats = finish_mac_stream(stream)
+    print_mac_messages(stats['messages'], stream['lastTimestamp'])
+    print_snapshot(get_snapshot, previous, snapshot_file)
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process ns-3 lorawan MAC packets CSV output file.')
+    parser.add_argument('csvfiles', nargs='*', help='The CSV files to be parsed')
+    parser.add_argument('--output-file-simulation', dest='outputfilesimulation', default=output_file_names['simulation'], help='The output CSV file')
+    parser.add_argument('--output-file-simulation-compact', dest='outputfilesimulationcompact', default=output_file_names['simulationCompact'], help='The compact output CSV file')
+    parser.add_argument('--output-file-enddevices', dest='outputfileenddevice', default=output_file_names['enddevices'], help='The output CSV file')
+    parser.add_argument('--horizon', type=float, default=None, help='Parse the trace in streaming mode: process a packet once the trace is HORIZON seconds past its first event (must be longer than the lifetime of a packet)')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of files parsed in parallel (the output lines are appended in sorted order of the file names)')
+    parser.add_argument('--chunk-jobs', dest='chunkjobs', type=int, default=1, help='Number of processes that parse chunks of every file (for large, uncompressed traces)')
+    add_cache_arguments(parser)
+    parser.add_argument('--follow', action='store_true', help='Follow the trace while the simulation writes it and print a snapshot of the PDR and transmissions per packet every {:.0f} seconds, in streaming mode (--horizon, default {}), without writing output'.format(snapshot_interval, follow_horizon))
+    parser.add_argument('--snapshot-file', dest='snapshotfile', default=None, help='With --follow, also write the latest snapshot to this JSON file')
+    parser.add_argument('--idle-timeout', dest='idletimeout', type=float, default=None, help='With --follow, stop following when no lines were appended for this many seconds (default: until the trace is removed or Ctrl-C)')
+    add_catalog_arguments(parser)
+    add_results_arguments(parser)
+    # parser.add_argument('--parseapppackets', type=bool, default=False, help='Parse app packets?')
+    #feature_parser = parser.add_mutually_exclusive_group(required=False)
+    #feature_parser.add_argument('--app-packets', dest='apppackets', action='store_true')
+    #feature_parser.add_argument('--no-app-packets', dest='apppackets', action='store_false')
+    #parser.set_defaults(feature=False)
+
+    args = parser.parse_args()
+    set_cache_settings((args.cache, args.cachedir))
+    if args.where:
+        args.csvfiles += get_catalog_trace_files(args, "trace-mac-packets.csv")
+    if args.follow:
+        if len(args.csvfiles) != 1:
+            parser.error("--follow takes one trace file")
+        follow_mac_trace(args.csvfiles[0], args.horizon if args.horizon is not None else follow_horizon, args.snapshotfile, args.idletimeout)
+        parser.exit()
+    results = open_results(args.results) if args.results else None
+    output_files = {'simulation': args.outputfilesimulation, 'simulationCompact': args.outputfilesimulationcompact, 'enddevices': args.outputfileenddevice}
+    table_names = get_results_table_names(output_file_names)
+    if results is not None:
+        keep_unexported_outputs(results, table_names, output_files)
+    for csvfilename, outputs in parse_trace_files(parse_trace_file, args.csvfiles, args.jobs, (args.horizon, args.chunkjobs), initializer=set_cache_settings, initargs=(get_cache_settings(),)):
+        if results is not None:
+            print ("\nStoring output in {}".format(args.results))
+            store_trace_results(results, table_names, csvfilename, "trace-mac-packets.csv", outputs)
+        else:
+            print ("\nAppending output per simulation to {}".format(args.outputfilesimulation))
+            append_output_lines(args.outputfilesimulation, *outputs['simulation'])
+            print ("\nAppending compact output per simulation to {}".format(args.outputfilesimulationcompact))
+            append_output_lines(args.outputfilesimulationcompact, *outputs['simulationCompact'])
+            print ("Appending output per end device to {}".format(args.outputfileenddevice))
+            append_output_lines(args.outputfileenddevice, *outputs['enddevices'])
+        print ("------------------------------------------------------------------")
+    if results is not None:
+        for output_name, file_name in sorted(output_files.items()):
+            print ("Exporting {} to {}".format(table_names[output_name], file_name))
+            export_results(results, table_names[output_name], file_name)
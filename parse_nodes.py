@@ -1,29 +1,41 @@
 #!/usr/bin/python3
 # Parse ns-3 lorawan nodes CSV output files
-import csv
 import argparse
+from run_catalog import add_catalog_arguments, get_catalog_trace_files
+from trace_loader import load_trace, add_cache_arguments, set_cache_settings, get_block_lists
 
-parser = argparse.ArgumentParser(description='Process ns-3 lorawan nodes CSV output file.')
-parser.add_argument('csvfiles', nargs='*', help='The CSV files to be parsed')
-parser.add_argument('--output', default="parse-packet-trace.csv", help='The output CSV file')
+# Returns the nodes in nodes file csvfilename: a dict node id -> device type,
+# distance (to the closest gateway) and data rate index
+def load_nodes(csvfilename):
+    trace = get_block_lists(load_trace(csvfilename, ['NodeId', 'DeviceType', 'Distance', 'DataRateIndex']))
+    return {node_id: {'DeviceType': device_type, 'Distance': distance, 'DataRateIndex': data_rate_index}
+            for node_id, device_type, distance, data_rate_index in zip(trace['NodeId'], trace['DeviceType'], trace['Distance'], trace['DataRateIndex'])}
 
-args = parser.parse_args()
-for csvfilename in args.csvfiles:
-    print("Parsing nodes file {}".format(csvfilename))
+# Print the number of end devices per data rate index of nodes (see load_nodes)
+def print_nodes(nodes):
     enddevices_per_datarateindex = {}
-    with open(csvfilename, newline='') as csvfile:
-        linereader = csv.reader(csvfile, delimiter=',', quotechar='|')
-        # next(linereader) # skip the header line in the csv file
-        for row in linereader:
-            device_type = int(row[1])
-            if device_type == 0:
-                continue # skip gateway
-            elif device_type == 1:
-                distance = row[4]
-                data_rate_index = int(row[5])
-                enddevices_per_datarateindex[data_rate_index] = enddevices_per_datarateindex.get(data_rate_index, 0) + 1
+    for node in nodes.values():
+        if node['DeviceType'] == 0:
+            continue # skip gateway
+        elif node['DeviceType'] == 1:
+            enddevices_per_datarateindex[node['DataRateIndex']] = enddevices_per_datarateindex.get(node['DataRateIndex'], 0) + 1
 
     for k in sorted(enddevices_per_datarateindex):
         count = enddevices_per_datarateindex[k]
         print("DR={}\tSF={}\t {} end devices".format(k, 12-k, count))
-    print ("------------------------------------------------------------------")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process ns-3 lorawan nodes CSV output file.')
+    parser.add_argument('csvfiles', nargs='*', help='The CSV files to be parsed')
+    parser.add_argument('--output', default="parse-packet-trace.csv", help='The output CSV file')
+    add_cache_arguments(parser)
+    add_catalog_arguments(parser)
+
+    args = parser.parse_args()
+    set_cache_settings((args.cache, args.cachedir))
+    if args.where:
+        args.csvfiles += get_catalog_trace_files(args, "nodes.csv")
+    for csvfilename in args.csvfiles:
+        print("Parsing nodes file {}".format(csvfilename))
+        print_nodes(load_nodes(csvfilename))
+        print ("------------------------------------------------------------------")
@@ -1,48 +1,42 @@
 #!/usr/bin/python3
 # Parse ns-3 lorawan NS DS packets trace CSV output files
-import csv
 import argparse
-import re
-import os.path
+from trace_io import find_trace_file, load_sim_settings, load_trace_misc, append_output_lines, parse_trace_files
+from run_catalog import add_catalog_arguments, get_catalog_trace_files
+from results_db import add_results_arguments, open_results, get_results_table_names, keep_unexported_outputs, store_trace_results, export_results
+from trace_loader import iter_trace_blocks, add_cache_arguments, set_cache_settings, get_cache_settings, get_block_lists
 from collections import Counter
 
-parser = argparse.ArgumentParser(description='Process ns-3 lorawan NS DS packets CSV output file.')
-parser.add_argument('csvfiles', nargs='+', help='The CSV files to be parsed')
-parser.add_argument('--output-file-simulation', dest='outputfile', default="parse_nsdsmsgs_trace.csv", help='The output CSV file')
-# parser.add_argument('--parseapppackets', type=bool, default=False, help='Parse app packets?')
-#feature_parser = parser.add_mutually_exclusive_group(required=False)
-#feature_parser.add_argument('--app-packets', dest='apppackets', action='store_true')
-#feature_parser.add_argument('--no-app-packets', dest='apppackets', action='store_false')
-#parser.set_defaults(feature=False)
-
-args = parser.parse_args()
-for csvfilename in args.csvfiles:
+# Default output files. The output of every parsed trace file is stored in the
+# results database (see results_db), the output files are exported from it
+# (or the output is appended to them, with --no-results). Their names are
+# also the names of the results tables.
+output_file_names = {'simulation': "parse_nsdsmsgs_trace.csv"}
+
+# Read the NS DS packets trace file csvfilename and process its DS messages.
+# Returns their statistics: the number of generated, sent (in RW1 and RW2, in
+# total and unique), acked and dropped DS messages, the acked DS messages that
+# were never sent and the number of acked DS messages per number of remaining
+# transmissions.
+def read_nsds_stats(csvfilename):
     print("Parsing NS DS packets csv file {}".format(csvfilename))
     last_timestamp = -1
     nodes = {}
     data_rate_stats = {0: (0,0), 1: (0,0), 2: (0,0), 3: (0,0), 4: (0,0), 5: (0,0)} # key=data rate index, value = (delivered,notdelivered)
     nsds_messages = {}
-    with open(csvfilename, newline='') as csvfile:
-        linereader = csv.reader(csvfile, delimiter=',', quotechar='|')
-        next(linereader) # skip the header line in the csv file
-
+    codes = {}
+    columns = ['time', 'TraceSource', 'NodeId', 'MsgType', 'TxRemaining', 'Packet', 'PacketLength', 'ReceiveWindow']
+    for block in iter_trace_blocks(csvfilename, columns, codes):
+        trace_sources = list(codes['TraceSource'])
         # Process CSV file: populate nsds_messages data structure
-        for row in linereader:
-            packet_length = int(row[6])
+        for packet_timestamp, trace_source_code, node_id, msg_type, tx_remaining, packet_hex, packet_length, receive_window in zip(*get_block_lists(block, columns).values()):
             if packet_length == 0:
                 # Skipping DS message with empty payload (probably Ack)
-                msg_type = int(row[3])
                 assert msg_type == 3 # acks should be sent as unconfirmed data down messages
                 continue
 
-            packet_hex = row[5]
-            msg_key = packet_hex # assume packet_hex is unique for every generated DS msg
-            packet_timestamp = float(row[0])
-            trace_source = row[1]
-            node_id = int(row[2])
-            msg_type = int(row[3])
-            tx_remaining = int(row[4])
-            packet_hex = row[5]
+            msg_key = packet_hex # assume packet_hex (its code) is unique for every generated DS msg
+            trace_source = trace_sources[trace_source_code]
             if msg_key not in nsds_messages:
                 nsds_messages[msg_key] = {'DSMsgGenerated': [], 'DSMsgTx': [], 'DSMsgAckd': [], 'DSMsgDrop': []} #'MacTx': [], 'MacTxOk': [], 'MacTxDrop': [], 'MacRx': [], 'MacRxDrop': [], 'MacSentPkt': [], 'MacSentPktMisc': []}
                 last_timestamp = packet_timestamp
@@ -53,7 +47,6 @@ for csvfilename in args.csvfiles:
 
             t = (packet_timestamp, node_id, tx_remaining)
             if trace_source == 'DSMsgTx':
-                receive_window = int(row[7])
                 t += (receive_window,)
 
             nsds_messages[msg_key][trace_source].append(t)
@@ -123,17 +116,23 @@ for csvfilename in args.csvfiles:
         nr_dsmsgackd += len(nsds_messages[k]['DSMsgAckd'])
         nr_dsmsgdrop += len(nsds_messages[k]['DSMsgDrop'])
 
-    # parse trace misc csv file so they can added to the output file:
-    trace_misc_file_name = csvfilename.replace("trace-ns-dsmsgs.csv", "trace-misc.csv")
-    trace_misc = {"nrRW1Sent": -1, "nrRW2Sent": -1, "nrRW1Missed": -1,"nrRW2Missed": -1}
-    with open(trace_misc_file_name, newline='') as csvfile:
-        linereader = csv.reader(csvfile, delimiter=',', quotechar='|')
-        next(linereader) # skip the header line in the csv file
-        row = next(linereader)
-        trace_misc['nrRW1Sent'] = int(row[0])
-        trace_misc['nrRW2Sent'] = int(row[1])
-        trace_misc['nrRW1Missed'] = int(row[2])
-        trace_misc['nrRW2Missed'] = int(row[3])
+    return {'nrGenerated': nr_dsmsggenerated, 'nrSentRw1': nr_sent_rw1, 'nrSentRw2': nr_sent_rw2, 'nrSent': nr_dsmsgtx, 'nrSentUnique': nr_dsmsgtx_unique,
+            'nrAckd': nr_dsmsgackd, 'nrDropped': nr_dsmsgdrop, 'nrAckdWithoutTx': nr_dsmsgackdwithouttx, 'nrAckdTxRemaining': nr_ackd_tx_remaining}
+
+# Returns the output of a simulation: a dict mapping the name of every output
+# (see output_file_names) to a tuple (header line, output lines), from the
+# statistics of its NS DS packets trace (see read_nsds_stats), its sim settings
+# and its trace-misc counters
+def get_nsds_outputs(stats, sim_settings, trace_misc):
+    nr_dsmsggenerated = stats['nrGenerated']
+    nr_sent_rw1 = stats['nrSentRw1']
+    nr_sent_rw2 = stats['nrSentRw2']
+    nr_dsmsgtx = stats['nrSent']
+    nr_dsmsgtx_unique = stats['nrSentUnique']
+    nr_dsmsgackd = stats['nrAckd']
+    nr_dsmsgdrop = stats['nrDropped']
+    nr_dsmsgackdwithouttx = stats['nrAckdWithoutTx']
+    nr_ackd_tx_remaining = stats['nrAckdTxRemaining']
 
     # Generate output:
     print("Total number of generated packets by NS: {}".format(nr_dsmsggenerated))
@@ -154,68 +153,68 @@ for csvfilename in args.csvfiles:
     print("{:<25}{:>10}{:>10}{:>10}{:>10}".format("Remaining TX", 0, 1, 2, 3))
     print("{:<25}{:>10}{:>10}{:>10}{:>10}".format("Number of ackd packets", nr_ackd_tx_remaining[0], nr_ackd_tx_remaining[1], nr_ackd_tx_remaining[2], nr_ackd_tx_remaining[3]))
 
-    # parse sim settings file so they can be added to the output file:
-    sim_settings_file_name = csvfilename.replace("trace-ns-dsmsgs.csv", "sim-settings.txt")
-    sim_settings = {"nGateways": -1, "nEndDevices": -1, "totalTime": -1, "usConfirmedData": -1, "usDataPeriod": -1, "seed": -1, "drCalcMethod": -1, "drCalcMethodMisc": -1, "dsDataGenerate": -1, "dsDataExpMean": -1, "dsConfirmedData": -1}
-
-    with open(sim_settings_file_name) as sim_settings_file:
-        sim_settings_file_contents = sim_settings_file.read()
-
-        p_ngateways = re.compile('nGateways = ([0-9]+)')
-        p_nenddevices = re.compile('nEndDevices = ([0-9]+)')
-        p_totaltime = re.compile('totalTime = ([0-9]+)')
-        p_confirmed_data = re.compile('usConfirmedData = ([0-1])')
-        p_data_period = re.compile('usDataPeriod = ([0-9]+)')
-        p_seed = re.compile('seed = ([0-9]+)')
-        p_drcalcmethod = re.compile('Data rate assignment method index: ([0-9]+)')
-        p_dsdatagenerate = re.compile('dsDataGenerate = ([0-1])')
-        p_dsdataexpmean = re.compile('dsDataExpMean = ([0-9]+)')
-        p_dsconfirmeddata = re.compile('dsConfirmedData = ([0-1])')
-
-        sim_settings['nGateways'] = int(p_ngateways.search (sim_settings_file_contents).groups()[0])
-        sim_settings['nEndDevices'] = int(p_nenddevices.search (sim_settings_file_contents).groups()[0])
-        sim_settings['totalTime'] =  int(p_totaltime.search (sim_settings_file_contents).groups()[0])
-        sim_settings['usConfirmedData'] = int(p_confirmed_data.search (sim_settings_file_contents).groups()[0])
-        sim_settings['usDataPeriod'] = int(p_data_period.search (sim_settings_file_contents).groups()[0])
-        sim_settings['seed'] = int(p_seed.search (sim_settings_file_contents).groups()[0])
-        sim_settings['dsDataGenerate'] = int(p_dsdatagenerate.search (sim_settings_file_contents).groups()[0])
-        sim_settings['dsDataExpMean'] = int(p_dsdataexpmean.search (sim_settings_file_contents).groups()[0])
-        sim_settings['dsConfirmedData'] = int(p_dsconfirmeddata.search (sim_settings_file_contents).groups()[0])
-
-        sim_settings['drCalcMethod'] = int(p_drcalcmethod.search (sim_settings_file_contents).groups()[0])
-        if sim_settings['drCalcMethod'] == 0:
-            p_drcalcperlimit = re.compile('PER limit = (\d+\.\d+)')
-            sim_settings['drCalcMethodMisc'] = float(p_drcalcperlimit.search (sim_settings_file_contents).groups()[0])
-        if sim_settings['drCalcMethod'] == 2:
-            p_drcalcfixeddr = re.compile('Fixed Data Rate Index = ([0-9]+)')
-            sim_settings['drCalcMethodMisc'] = int(p_drcalcfixeddr.search (sim_settings_file_contents).groups()[0])
-
-    # Generate output file:
-    print ("\nAppending output to {}".format(args.outputfile))
-    write_header = False
-    if not os.path.exists(args.outputfile):
-        write_header = True
-    with open(args.outputfile, 'a') as output_file: # append to output file
-        outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,"\
-                       "<usConfirmedData>,<usDataPeriod>,<dsDataGenerate>,<dsConfirmedData>,<dsDataExpMean>,"\
-                       "<dsGenerated>,<dsSentRW1>,<dsSentRW2>,<dsSent>,<dsSentUnique>,<dsAckd>,<dsDrop>,<dsPDR>,<dsPDRUniqueAckd>,<dsPDRUniqueDrop>,"\
-                       "<dsSentRW1Misc>,<dsSentRW2Misc>,<dsMissedRW1Misc>,<dsMissedRW2Misc>,"\
-                       "<dsRemainingTx0>,<dsRemainingTx1>,<dsRemainingTx2>,<dsRemainingTx3>\n"
-
-        if write_header:
-            output_file.write(outputFormat)
-
-        # sim settings + us stats + ds stats
-        output_line = "{},{},{},{},{},{},"\
-                      "{},{},{},{},{},"\
-                      "{},{},{},{},{},{},{},{:1.4f},{:1.4f},{:1.4f},"\
-                      "{},{},{},{},"\
-                      "{},{},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'], sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'],
-                                               sim_settings['usConfirmedData'], sim_settings['usDataPeriod'], sim_settings['dsDataGenerate'],  sim_settings['dsConfirmedData'],  sim_settings['dsDataExpMean'], 
-                                               nr_dsmsggenerated, nr_sent_rw1, nr_sent_rw2, nr_dsmsgtx, nr_dsmsgtx_unique, nr_dsmsgackd, nr_dsmsgdrop, nr_dsmsgackd/nr_dsmsggenerated, nr_dsmsgackd/nr_dsmsgtx_unique, (nr_dsmsgtx_unique-nr_dsmsgdrop)/nr_dsmsgtx_unique,
-                                               trace_misc['nrRW1Sent'], trace_misc['nrRW2Sent'], trace_misc['nrRW1Missed'],  trace_misc['nrRW2Missed'],
-                                               nr_ackd_tx_remaining[0], nr_ackd_tx_remaining[1], nr_ackd_tx_remaining[2], nr_ackd_tx_remaining[3])
-        print(output_line)
-        output_file.write(output_line)
-
-    print ("------------------------------------------------------------------")
+    # Output per simulation:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,"\
+                   "<usConfirmedData>,<usDataPeriod>,<dsDataGenerate>,<dsConfirmedData>,<dsDataExpMean>,"\
+                   "<dsGenerated>,<dsSentRW1>,<dsSentRW2>,<dsSent>,<dsSentUnique>,<dsAckd>,<dsDrop>,<dsPDR>,<dsPDRUniqueAckd>,<dsPDRUniqueDrop>,"\
+                   "<dsSentRW1Misc>,<dsSentRW2Misc>,<dsMissedRW1Misc>,<dsMissedRW2Misc>,"\
+                   "<dsRemainingTx0>,<dsRemainingTx1>,<dsRemainingTx2>,<dsRemainingTx3>\n"
+
+    # sim settings + us stats + ds stats
+    output_line = "{},{},{},{},{},{},"\
+                  "{},{},{},{},{},"\
+                  "{},{},{},{},{},{},{},{:1.4f},{:1.4f},{:1.4f},"\
+                  "{},{},{},{},"\
+                  "{},{},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'], sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'],
+                                           sim_settings['usConfirmedData'], sim_settings['usDataPeriod'], sim_settings['dsDataGenerate'],  sim_settings['dsConfirmedData'],  sim_settings['dsDataExpMean'], 
+                                           nr_dsmsggenerated, nr_sent_rw1, nr_sent_rw2, nr_dsmsgtx, nr_dsmsgtx_unique, nr_dsmsgackd, nr_dsmsgdrop, nr_dsmsgackd/nr_dsmsggenerated, nr_dsmsgackd/nr_dsmsgtx_unique, (nr_dsmsgtx_unique-nr_dsmsgdrop)/nr_dsmsgtx_unique,
+                                           trace_misc['nrRW1Sent'], trace_misc['nrRW2Sent'], trace_misc['nrRW1Missed'],  trace_misc['nrRW2Missed'],
+                                           nr_ackd_tx_remaining[0], nr_ackd_tx_remaining[1], nr_ackd_tx_remaining[2], nr_ackd_tx_remaining[3])
+    return {'simulation': (outputFormat, [output_line])}
+
+# Parse the NS DS packets trace file csvfilename (and the trace-misc and
+# sim-settings files of the same simulation). Returns the output of the
+# simulation (see get_nsds_outputs).
+def parse_trace_file(csvfilename):
+    stats = read_nsds_stats(csvfilename)
+    # parse trace misc csv file and sim settings file so they can added to the output file:
+    trace_misc = load_trace_misc(find_trace_file(csvfilename, "trace-ns-dsmsgs.csv", "trace-misc.csv"))
+    sim_settings = load_sim_settings(find_trace_file(csvfilename, "trace-ns-dsmsgs.csv", "sim-settings.txt"))
+    return get_nsds_outputs(stats, sim_settings, trace_misc)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process ns-3 lorawan NS DS packets CSV output file.')
+    parser.add_argument('csvfiles', nargs='*', help='The CSV files to be parsed')
+    parser.add_argument('--output-file-simulation', dest='outputfile', default=output_file_names['simulation'], help='The output CSV file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of files parsed in parallel (the output lines are appended in sorted order of the file names)')
+    add_cache_arguments(parser)
+    add_catalog_arguments(parser)
+    add_results_arguments(parser)
+    # parser.add_argument('--parseapppackets', type=bool, default=False, help='Parse app packets?')
+    #feature_parser = parser.add_mutually_exclusive_group(required=False)
+    #feature_parser.add_argument('--app-packets', dest='apppackets', action='store_true')
+    #feature_parser.add_argument('--no-app-packets', dest='apppackets', action='store_false')
+    #parser.set_defaults(feature=False)
+
+    args = parser.parse_args()
+    set_cache_settings((args.cache, args.cachedir))
+    if args.where:
+        args.csvfiles += get_catalog_trace_files(args, "trace-ns-dsmsgs.csv")
+    results = open_results(args.results) if args.results else None
+    output_files = {'simulation': args.outputfile}
+    table_names = get_results_table_names(output_file_names)
+    if results is not None:
+        keep_unexported_outputs(results, table_names, output_files)
+    for csvfilename, outputs in parse_trace_files(parse_trace_file, args.csvfiles, args.jobs, initializer=set_cache_settings, initargs=(get_cache_settings(),)):
+        if results is not None:
+            print ("\nStoring output in {}".format(args.results))
+            store_trace_results(results, table_names, csvfilename, "trace-ns-dsmsgs.csv", outputs)
+        else:
+            print ("\nAppending output to {}".format(args.outputfile))
+            print(outputs['simulation'][1][0])
+            append_output_lines(args.outputfile, *outputs['simulation'])
+        print ("------------------------------------------------------------------")
+    if results is not None:
+        for output_name, file_name in sorted(output_files.items()):
+            print ("Exporting {} to {}".format(table_names[output_name], file_name))
+            export_results(results, table_names[output_name], file_name)
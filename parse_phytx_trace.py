@@ -1,78 +1,102 @@
 #!/usr/bin/python3
 # Parse ns-3 lorawan PHY transmissions trace CSV output files
-import csv
 import argparse
-import re
-import os.path
-
-parser = argparse.ArgumentParser(description='Process ns-3 lorawan PHY transmissions CSV output file.')
-parser.add_argument('csvfiles', nargs='*', help='The CSV files to be parsed')
-parser.add_argument('--output-simulation', dest='outputsimulation', default="parse_phytx_trace_per_simulation.csv", help='The output CSV file')
-parser.add_argument('--output-enddevice', dest='outputenddevice', default="parse_phytx_trace_per_enddevice.csv", help='The output CSV file')
-# parser.add_argument('--parseapppackets', type=bool, default=False, help='Parse app packets?')
-feature_parser = parser.add_mutually_exclusive_group(required=False)
-feature_parser.add_argument('--app-packets', dest='apppackets', action='store_true')
-feature_parser.add_argument('--no-app-packets', dest='apppackets', action='store_false')
-parser.set_defaults(feature=False)
-
-args = parser.parse_args()
-for csvfilename in args.csvfiles:
-    print("Parsing phy tx csv file {}".format(csvfilename))
-    nodes = {}
-    app_packets = {}
-    phy_transmissions = {}
-    data_rate_stats = {0: (0,0), 1: (0,0), 2: (0,0), 3: (0,0), 4: (0,0), 5: (0,0)} # key=data rate index, value = (delivered,notdelivered)
-    with open(csvfilename, newline='') as csvfile:
-        linereader = csv.reader(csvfile, delimiter=',', quotechar='|')
-        next(linereader) # skip the header line in the csv file
-
-        # Process CSV file: populate phy_transmissions data structure
-        for row in linereader:
-            node_id = int(row[2])
-            trace_source = row[5]
-            # parse app layer packets:
-            if args.apppackets:
-                app_packets_key = row[7] # packet in hex
-                if app_packets_key not in app_packets:
-                    app_packets[app_packets_key] = {'PhyTxBegin': [], 'PhyRxBegin': [], 'PhyTxEnd': [], 'PhyRxEnd': [], 'PhyRxDrop': [], 'PhyTxDrop': []}
-                app_packets[app_packets_key][trace_source].append(node_id)
-
-            if node_id not in nodes:
-                nodes[node_id] = {'DeviceType': int(row[1]), 'TransmissionsSent': 0, 'TransmissionsDelivered': 0, 'TransmissionsNotDelivered': 0, 'DropRxReason': []}
-
-            # parse phy layer transmissions
-            phy_key = row[6] # PhyTraceIdTag
-            if phy_key not in phy_transmissions:
-                phy_transmissions[phy_key] = {'PhyTxBegin': [], 'PhyTxBeginMisc': [], 'PhyRxBegin': [], 'PhyTxEnd': [], 'PhyRxEnd': [], 'PhyRxDrop': [], 'PhyRxDropMisc': [], 'PhyTxDrop': [], 'Delivered': False}
-
-            phy_transmissions[phy_key][trace_source].append(node_id) # store this node under trace_source
-
-            # Store any interesting misc fields depending on trace_source:
-            if trace_source == 'PhyTxBegin':
-                channel_index = int(row[9])
-                data_rate_index = int(row[10])
-                t = (node_id, channel_index, data_rate_index) # store node_id and channel_index and data_rate_index as a tuple
-                phy_transmissions[phy_key]['PhyTxBeginMisc'].append(t)
-            elif trace_source == 'PhyRxDrop':
-                drop_reason = int(row[9])
-                t = (node_id, drop_reason) # store node_id and drop_reason as a tuple
-                phy_transmissions[phy_key]['PhyRxDropMisc'].append(t)
-
-    # Process phy_transmissions data structure:
-    # Was the transmission delivered and if so, was it received by a device of
-    # the opposite device type (i.e. end device TX received by GW or visa versa)
-    # When a transmission was not delivered, what was the reason?
+from trace_io import find_trace_file, load_sim_settings, append_output_lines, parse_trace_files
+import trace_loader
+from run_catalog import add_catalog_arguments, get_catalog_trace_files
+from results_db import add_results_arguments, open_results, get_results_table_names, keep_unexported_outputs, store_trace_results, export_results
+from trace_loader import iter_trace_blocks, add_cache_arguments, set_cache_settings, get_cache_settings, get_block_lists
+from trace_partitions import can_partition, parse_partitioned, iter_chunk_blocks, get_partitions, partition_block, concatenate_blocks, merge_counts
+from trace_follow import follow_trace, print_snapshot, get_interval_values, snapshot_interval
+from array import array
+from collections import Counter, OrderedDict
+
+# Default output files. The output of every parsed trace file is stored in the
+# results database (see results_db), the output files are exported from it
+# (or the output is appended to them, with --no-results). Their names are
+# also the names of the results tables.
+output_file_names = {'simulation': "parse_phytx_trace_per_simulation.csv",
+                     'enddevices': "parse_phytx_trace_per_enddevice.csv",
+                     'drops': "parse_phytx_trace_drops_per_enddevice.csv"}
+
+# Trace sources of the PHY transmissions trace, the index in this list is their
+# code (see trace_loader)
+phy_trace_sources = ['PhyTxBegin', 'PhyRxBegin', 'PhyTxEnd', 'PhyRxEnd', 'PhyRxDrop', 'PhyTxDrop']
+
+phy_columns = ['DeviceType', 'NodeId', 'TraceSource', 'PhyTraceIdTag', 'Misc1', 'Misc2']
+
+# Columns of the events processed by process_phy_events_numpy with their
+# NumPy type, the events of a whole trace are kept in these types
+phy_event_types = {'NodeId': 'i4', 'TraceSource': 'i1', 'PhyTraceIdTag': 'u8', 'Misc1': 'i4', 'Misc2': 'i4'}
+
+# Seconds after its first event a transmission is processed when a trace is
+# followed (see follow_phy_trace), longer than the airtime of a transmission
+follow_horizon = 60
+
+def new_phy_codes():
+    return {'TraceSource': {trace_source: code for code, trace_source in enumerate(phy_trace_sources)}}
+
+def check_phy_trace_sources(codes, csvfilename):
+    if len(codes['TraceSource']) != len(phy_trace_sources):
+        raise ValueError("Unknown PHY trace source in {}: {}".format(csvfilename, list(codes['TraceSource'])[len(phy_trace_sources):]))
+
+def new_phy_node(device_type):
+    return {'DeviceType': device_type, 'TransmissionsSent': 0, 'TransmissionsDelivered': 0, 'TransmissionsNotDelivered': 0}
+
+# Add the events of block to phy_transmissions (PhyTraceIdTag -> transmission),
+# the position of every new transmission (see trace_partitions, its number in
+# order of first appearance when block has no Position column) is appended to
+# positions.
+def add_phy_events(phy_transmissions, positions, block):
+    block = get_block_lists(block)
+    block_positions = block.get('Position')
+    for i, (node_id, trace_source_code, phy_key) in enumerate(zip(block['NodeId'], block['TraceSource'], block['PhyTraceIdTag'])):
+        trace_source = phy_trace_sources[trace_source_code]
+        # parse phy layer transmissions, phy_key is the PhyTraceIdTag
+        if phy_key not in phy_transmissions:
+            phy_transmissions[phy_key] = {'PhyTxBegin': [], 'PhyTxBeginMisc': [], 'PhyRxBegin': [], 'PhyTxEnd': [], 'PhyRxEnd': [], 'PhyRxDrop': [], 'PhyRxDropMisc': [], 'PhyTxDrop': [], 'Delivered': False}
+            positions.append(block_positions[i] if block_positions is not None else len(positions))
+
+        phy_transmissions[phy_key][trace_source].append(node_id) # store this node under trace_source
+
+        # Store any interesting misc fields depending on trace_source:
+        if trace_source == 'PhyTxBegin':
+            channel_index = block['Misc1'][i]
+            data_rate_index = block['Misc2'][i]
+            t = (node_id, channel_index, data_rate_index) # store node_id and channel_index and data_rate_index as a tuple
+            phy_transmissions[phy_key]['PhyTxBeginMisc'].append(t)
+        elif trace_source == 'PhyRxDrop':
+            drop_reason = block['Misc1'][i]
+            t = (node_id, drop_reason) # store node_id and drop_reason as a tuple
+            phy_transmissions[phy_key]['PhyRxDropMisc'].append(t)
+
+# Process phy_transmissions (see add_phy_events) of the nodes (node id ->
+# device type). Returns the statistics:
+# * nodes: node id -> transmissions sent, delivered and not delivered
+# * nDelivered, nUndelivered and nTx: number of (un)delivered transmissions
+# * dataRateStats: delivered transmissions per data rate index
+# * dropCounts: Counter of the drop events of undelivered transmissions at a
+#   receiver of the expected device type, by (transmitting node id, data rate
+#   index, drop reason)
+# * messages: (position, text) about unexpected transmissions
+# Was the transmission delivered and if so, was it received by a device of
+# the opposite device type (i.e. end device TX received by GW or visa versa)
+# When a transmission was not delivered, what was the reason?
+def process_phy_transmissions(phy_transmissions, positions, nodes):
+    nodes = {node_id: new_phy_node(device_type) for node_id, device_type in nodes.items()}
+    data_rate_stats = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0} # key=data rate index, value = delivered
+    drop_counts = Counter()
+    messages = []
     number_of_delivered_transmissions = 0
     number_of_undelivered_transmissions = 0
-    sim_drop_reasons = [] # simple list of drop reasons, e.g. [0, 0, 0, 1]
-    sim_drop_reasons_datarateindex = {} # dict of lists , e.g. {0: [0, 1], 1: [0,1]} dict keys are drop reasons, values are lists of data rate indexes of the phy transmission that was dropped for drop reason=key
-    for key in list(phy_transmissions.keys()):
+    for position, key in zip(positions, list(phy_transmissions.keys())):
         tx = phy_transmissions[key]
         if len (tx['PhyTxBegin']) != 1:
-            print("key={}: ERROR SKIPPING this transmissions as there is not exactly one node in PhyTxBegin list for tx = {}".format(key, tx))
+            messages.append((position, "key={}: ERROR SKIPPING this transmissions as there is not exactly one node in PhyTxBegin list for tx = {}".format(key, tx)))
             continue
 
         tx_node_id = tx['PhyTxBegin'][0] # a phy tx can only be started sending by one node
+        data_rate_index = int(tx['PhyTxBeginMisc'][0][2]) # always index 0 here as there is only one node that starts sending a transmission
         nodes[tx_node_id]['TransmissionsSent'] += 1
         if len(tx['PhyTxEnd']) == 1 and tx['PhyTxEnd'][0] == tx_node_id:
             # check receivers
@@ -85,24 +109,25 @@ for csvfilename in args.csvfiles:
             found_expected_rx_device = False # a node that started receiving the tx has the correct device type
             receiver_in_phyrxend = False # a node that started receiving the tx and that is the correct device type also finished receiving the transmission
             receiver_not_in_phyrxdrop = False # a node that started receiving the tx, that is the correct device type and finished receiving the transmission also did not drop the packet
+            rx_end_nodes = set(tx['PhyRxEnd'])
+            rx_drop_nodes = set(tx['PhyRxDrop'])
             for rx_node in tx['PhyRxBegin']:
                 node_received = True
                 # check if receiver is of opposite device type than transmitter
                 if nodes[rx_node]['DeviceType'] == expected_rx_devicetype:
                     found_expected_rx_device = True
                     # Check whether this receiver reached PhyRxEnd for this transmission
-                    if rx_node in tx['PhyRxEnd']:
+                    if rx_node in rx_end_nodes:
                         receiver_in_phyrxend = True
                         # Check whether this receiver did not drop the packet after ending reception
-                        if rx_node not in tx['PhyRxDrop']:
+                        if rx_node not in rx_drop_nodes:
                             # PHY Transmission delivered!
                             receiver_not_in_phyrxdrop = True
                             number_of_delivered_transmissions += 1
                             phy_transmissions[key]['Delivered'] = True
                             nodes[tx_node_id]['TransmissionsDelivered'] += 1
-                            # Update global delivered/undelivered stats:
-                            data_rate_index = int(tx['PhyTxBeginMisc'][0][2]) # always index 0 here as there is only one node that starts sending a transmission
-                            data_rate_stats[data_rate_index] = (data_rate_stats[data_rate_index][0] + 1, data_rate_stats[data_rate_index][1])
+                            # Update global delivered stats:
+                            data_rate_stats[data_rate_index] += 1
                             break
 
             transmission_not_delivered = not node_received or not found_expected_rx_device or not receiver_in_phyrxend or not receiver_not_in_phyrxdrop
@@ -110,23 +135,11 @@ for csvfilename in args.csvfiles:
                 number_of_undelivered_transmissions += 1
                 nodes[tx_node_id]['TransmissionsNotDelivered'] += 1
 
-                # store DropRxReason:
-                for drop_tuple in tx['PhyRxDropMisc']:
-                    drop_node_id = drop_tuple [0]
+                # store DropRxReason per transmitting node and data rate index:
+                for drop_node_id, drop_reason in tx['PhyRxDropMisc']:
                     # check if we are actually interested in the drop event (i.e. was the end device transmission dropped by a gateway phy?)
                     if nodes[drop_node_id]['DeviceType'] == expected_rx_devicetype:
-                        # Update global delivered/undelivered stats:
-                        data_rate_stats[data_rate_index] = (data_rate_stats[data_rate_index][0], data_rate_stats[data_rate_index][1] + 1)
-                        drop_reason = int(drop_tuple [1])
-                        # store drop reason per node:
-                        nodes[tx_node_id]['DropRxReason'].append(drop_reason)
-                        # store drop reason over all nodes:
-                        sim_drop_reasons.append(drop_reason)
-                        # store data rate index for drop_reason
-                        data_rate_index = int(tx['PhyTxBeginMisc'][0][2]) # always index 0 here as there is only one node that starts sending a transmission
-                        if drop_reason not in sim_drop_reasons_datarateindex:
-                            sim_drop_reasons_datarateindex[drop_reason] = list()
-                        sim_drop_reasons_datarateindex[drop_reason].append(data_rate_index)
+                        drop_counts[tx_node_id, data_rate_index, int(drop_reason)] += 1
 
                 # print reason:
                 if not node_received:
@@ -138,24 +151,230 @@ for csvfilename in args.csvfiles:
                         pass
                     else:
                         if not receiver_in_phyrxend:
-                            print ("key = {}: Transmission not delivered because the receiver did not enter the PhyRxEnd state, tx = {}".format(key, tx))
+                            messages.append((position, "key = {}: Transmission not delivered because the receiver did not enter the PhyRxEnd state, tx = {}".format(key, tx)))
                         else:
                             if not receiver_not_in_phyrxdrop:
                                 #print ("key = {}: Transmission not delivered because the receiver dropped the packet after reception, tx = {}".format(key, tx))
                                 pass
         else:
             if tx_node_id in tx['PhyTxDrop']:
-                print("key = {}: case where transmission is aborted is not implemented. tx = {}".format(tx)) # TODO: count number of aborted transmissions
-                exit(1)
+                raise ValueError("key = {}: case where transmission is aborted is not implemented. tx = {}".format(key, tx)) # TODO: count number of aborted transmissions
             else:
                 # print ("key = {}: WARNING transmission not delivered because sending node not found in PhyTxEnd nor in PhyTxDrop. Skipping this Transmission tx = {}".format(key, tx))
                 del phy_transmissions[key]
 
+    return {'nodes': nodes, 'nDelivered': number_of_delivered_transmissions, 'nUndelivered': number_of_undelivered_transmissions, 'nTx': len(phy_transmissions),
+            'dataRateStats': data_rate_stats, 'dropCounts': drop_counts, 'messages': messages}
+
+# Returns whether every value of the NumPy array values is in array others,
+# like numpy.isin but with a binary search in the sorted others (faster for
+# the large arrays of process_phy_events_numpy)
+def is_in_numpy(values, others):
+    numpy = trace_loader.numpy
+    if len(others) == 0:
+        return numpy.zeros(len(values), numpy.bool_)
+    others = numpy.sort(others)
+    return others[numpy.minimum(numpy.searchsorted(others, values), len(others) - 1)] == values
+
+# process_phy_transmissions with NumPy, of the events of block (the columns of
+# phy_event_types, as arrays) instead of phy_transmissions (see add_phy_events).
+# The transmissions are grouped by PhyTraceIdTag with unique, and the
+# receivers are matched by (transmission, node) pairs. Transmissions that are
+# skipped, not ended by their transmitter, reported in a message or that have
+# an unknown data rate index are processed by process_phy_transmissions.
+def process_phy_events_numpy(block, nodes):
+    numpy = trace_loader.numpy
+    node_ids, trace_source_codes, misc1, misc2 = [numpy.asarray(block[name]) for name in ['NodeId', 'TraceSource', 'Misc1', 'Misc2']]
+    phy_keys, first_events, transmissions = numpy.unique(numpy.asarray(block['PhyTraceIdTag']), return_index=True, return_inverse=True)
+    n_transmissions = len(phy_keys)
+    n_ids = max(nodes, default=0) + 1
+    device_types = numpy.full(n_ids, -1, numpy.int64)
+    device_types[list(nodes)] = list(nodes.values())
+    trace_source_events = {trace_source: trace_source_codes == code for code, trace_source in enumerate(phy_trace_sources)}
+
+    # the transmitter and data rate index of the transmissions with one
+    # PhyTxBegin, ended by one PhyTxEnd of the transmitter
+    begin_events = trace_source_events['PhyTxBegin']
+    tx_nodes = numpy.full(n_transmissions, -1, numpy.int64)
+    tx_nodes[transmissions[begin_events]] = node_ids[begin_events]
+    data_rate_indexes = numpy.full(n_transmissions, -1, numpy.int64)
+    data_rate_indexes[transmissions[begin_events]] = misc2[begin_events]
+    end_events = trace_source_events['PhyTxEnd']
+    end_nodes = numpy.full(n_transmissions, -1, numpy.int64)
+    end_nodes[transmissions[end_events]] = node_ids[end_events]
+    regular = (numpy.bincount(transmissions[begin_events], minlength=n_transmissions) == 1) & \
+              (numpy.bincount(transmissions[end_events], minlength=n_transmissions) == 1) & (end_nodes == tx_nodes) & \
+              (data_rate_indexes >= 0) & (data_rate_indexes < 6)
+    expected_rx_devicetypes = numpy.where(device_types[tx_nodes] == 0, 1, 0) # a gateway transmits to end devices
+
+    # receivers of the expected device type, whether they reached PhyRxEnd and
+    # did not drop the transmission
+    rx_events = trace_source_events['PhyRxBegin'] & (device_types[node_ids] == expected_rx_devicetypes[transmissions])
+    rx_transmissions = transmissions[rx_events]
+    rx_pairs = rx_transmissions * n_ids + node_ids[rx_events]
+    in_rx_end = is_in_numpy(rx_pairs, transmissions[trace_source_events['PhyRxEnd']] * n_ids + node_ids[trace_source_events['PhyRxEnd']])
+    in_rx_drop = is_in_numpy(rx_pairs, transmissions[trace_source_events['PhyRxDrop']] * n_ids + node_ids[trace_source_events['PhyRxDrop']])
+    found_expected_rx_device = numpy.zeros(n_transmissions, numpy.bool_)
+    found_expected_rx_device[rx_transmissions] = True
+    receiver_in_phyrxend = numpy.zeros(n_transmissions, numpy.bool_)
+    receiver_in_phyrxend[rx_transmissions[in_rx_end]] = True
+    delivered = numpy.zeros(n_transmissions, numpy.bool_)
+    delivered[rx_transmissions[in_rx_end & ~in_rx_drop]] = True
+    regular &= ~found_expected_rx_device | receiver_in_phyrxend
+    del rx_events, rx_transmissions, rx_pairs, in_rx_end, in_rx_drop
+
+    # the other transmissions, in order of first appearance
+    other_events = ~regular[transmissions]
+    other_block = {name: numpy.asarray(block[name])[other_events].tolist() for name in ['NodeId', 'TraceSource', 'PhyTraceIdTag', 'Misc1', 'Misc2']}
+    if 'Position' in block:
+        other_block['Position'] = numpy.asarray(block['Position'])[other_events].tolist()
+    else: # the number of the transmission in order of first appearance, as add_phy_events
+        other_block['Position'] = numpy.argsort(numpy.argsort(first_events))[transmissions[other_events]].tolist()
+    phy_transmissions = {}
+    positions = array('q')
+    add_phy_events(phy_transmissions, positions, other_block)
+    del other_events, other_block
+    stats = process_phy_transmissions(phy_transmissions, positions, nodes)
+
+    # drop events of undelivered transmissions at a receiver of the expected
+    # device type
+    undelivered = regular & ~delivered
+    drop_events = trace_source_events['PhyRxDrop'] & undelivered[transmissions] & (device_types[node_ids] == expected_rx_devicetypes[transmissions])
+    drop_transmissions = transmissions[drop_events]
+    drop_keys, drop_counts = numpy.unique(numpy.stack([tx_nodes[drop_transmissions], data_rate_indexes[drop_transmissions], misc1[drop_events]]), axis=1, return_counts=True)
+    merge_counts(stats['dropCounts'], Counter(dict(zip(zip(*drop_keys.tolist()), drop_counts.tolist()))))
+
+    delivered &= regular
+    for name, transmission_counts in [('TransmissionsSent', numpy.bincount(tx_nodes[regular], minlength=n_ids)),
+                                      ('TransmissionsDelivered', numpy.bincount(tx_nodes[delivered], minlength=n_ids)),
+                                      ('TransmissionsNotDelivered', numpy.bincount(tx_nodes[undelivered], minlength=n_ids))]:
+        for node_id, count in zip(nodes, transmission_counts[list(nodes)].tolist()):
+            stats['nodes'][node_id][name] += count
+    stats['nDelivered'] += int(delivered.sum())
+    stats['nUndelivered'] += int(undelivered.sum())
+    stats['nTx'] += int(regular.sum())
+    merge_counts(stats['dataRateStats'], dict(enumerate(numpy.bincount(data_rate_indexes[delivered], minlength=6).tolist())))
+    return stats
+
+# Add the statistics of other (see process_phy_transmissions) to stats
+def merge_phy_stats(stats, other):
+    for node_id, node in other['nodes'].items():
+        stats_node = stats['nodes'].setdefault(node_id, new_phy_node(node['DeviceType']))
+        for counter in ['TransmissionsSent', 'TransmissionsDelivered', 'TransmissionsNotDelivered']:
+            stats_node[counter] += node[counter]
+    for name in ['nDelivered', 'nUndelivered', 'nTx']:
+        stats[name] += other[name]
+    merge_counts(stats['dataRateStats'], other['dataRateStats'])
+    merge_counts(stats['dropCounts'], other['dropCounts'])
+    stats['messages'].extend(other['messages'])
+
+# Read chunk chunk_index of a PHY transmissions trace for parse_partitioned:
+# returns the nodes of the chunk (node id -> device type) and the events of
+# every partition (by PhyTraceIdTag)
+def read_phy_chunk(csvfilename, chunk, chunk_index, n_partitions):
+    codes = new_phy_codes()
+    nodes = {}
+    partitions = [[] for partition in range(n_partitions)]
+    for block in iter_chunk_blocks(csvfilename, chunk, chunk_index, phy_columns, codes):
+        check_phy_trace_sources(codes, csvfilename)
+        add_phy_nodes(nodes, block)
+        for partition, events in zip(partitions, partition_block(block, get_partitions(block['PhyTraceIdTag'], n_partitions), n_partitions)):
+            partition.append(events)
+    return nodes, [concatenate_blocks(partition) for partition in partitions]
+
+# Combine the nodes of all chunks (see read_phy_chunk)
+def combine_phy_chunks(chunk_nodes):
+    nodes = {}
+    for other in chunk_nodes:
+        for node_id, device_type in other.items():
+            nodes.setdefault(node_id, device_type)
+    return nodes
+
+# Process the events of a partition (see read_phy_chunk) for parse_partitioned
+def process_phy_partition(block, nodes):
+    phy_transmissions = {}
+    positions = array('q')
+    if block and trace_loader.numpy is not None:
+        return process_phy_events_numpy(block, nodes)
+    if block:
+        add_phy_events(phy_transmissions, positions, block)
+    return process_phy_transmissions(phy_transmissions, positions, nodes)
+
+# Add the nodes of block that are not in nodes yet (node id -> device type)
+def add_phy_nodes(nodes, block):
+    block = get_block_lists(block, ['NodeId', 'DeviceType'])
+    first_events = dict(zip(reversed(block['NodeId']), reversed(range(len(block['NodeId']))))) # index of the first event in the block of every node
+    for node_id, i in first_events.items():
+        if node_id not in nodes:
+            nodes[node_id] = block['DeviceType'][i]
+
+# Read the PHY transmissions trace file csvfilename and process its
+# transmissions. Returns their statistics (see process_phy_transmissions).
+# With jobs > 1 the trace is split into chunks that are parsed by jobs
+# processes, the transmissions are partitioned by PhyTraceIdTag (see
+# trace_partitions). Compressed traces and app packets are parsed by a single
+# process.
+def read_phy_stats(csvfilename, parse_app_packets=False, jobs=1):
+    print("Parsing phy tx csv file {}".format(csvfilename))
+    if jobs > 1 and not parse_app_packets and can_partition(csvfilename):
+        nodes, results = parse_partitioned(csvfilename, jobs, read_phy_chunk, combine_phy_chunks, process_phy_partition)
+        stats = process_phy_transmissions({}, [], nodes)
+        for partition_stats in results:
+            merge_phy_stats(stats, partition_stats)
+    else:
+        nodes = {}
+        app_packets = {}
+        phy_transmissions = {}
+        positions = array('q')
+        events = {name: [] for name in phy_event_types} if trace_loader.numpy is not None else None # columns of the events, per block
+        codes = new_phy_codes()
+        columns = phy_columns + (['Packet'] if parse_app_packets else [])
+        for block in iter_trace_blocks(csvfilename, columns, codes):
+            check_phy_trace_sources(codes, csvfilename)
+            add_phy_nodes(nodes, block)
+            # parse app layer packets:
+            if parse_app_packets:
+                for node_id, trace_source_code, app_packets_key in zip(*get_block_lists(block, ['NodeId', 'TraceSource', 'Packet']).values()): # code of the packet in hex
+                    if app_packets_key not in app_packets:
+                        app_packets[app_packets_key] = {'PhyTxBegin': [], 'PhyRxBegin': [], 'PhyTxEnd': [], 'PhyRxEnd': [], 'PhyRxDrop': [], 'PhyTxDrop': []}
+                    app_packets[app_packets_key][phy_trace_sources[trace_source_code]].append(node_id)
+            # Process CSV file: populate phy_transmissions data structure
+            if events is not None:
+                for name, column in events.items():
+                    column.append(block[name].astype(phy_event_types[name]))
+            else:
+                add_phy_events(phy_transmissions, positions, block)
+        if events is not None and events['NodeId']:
+            stats = process_phy_events_numpy({name: trace_loader.numpy.concatenate(column) for name, column in events.items()}, nodes)
+        else:
+            stats = process_phy_transmissions(phy_transmissions, positions, nodes)
+        del phy_transmissions, events
+    return stats
+
+# Returns the output of a simulation: a dict mapping the name of every output
+# (see output_file_names) to a tuple (header line, output lines), from the
+# statistics of its PHY transmissions trace (see read_phy_stats) and its sim
+# settings
+def get_phy_outputs(stats, sim_settings):
+    for position, message in sorted(stats['messages'], key=lambda message: message[0]):
+        print(message)
+    nodes = stats['nodes']
+    drop_counts = stats['dropCounts']
+    # Totals of the drop counts over all nodes, per data rate index and per
+    # drop reason (and data rate index):
+    undelivered = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0} # key=data rate index, value = drop events
+    sim_drop_reasons = Counter() # key=drop reason, value = drop events
+    sim_drop_reasons_datarateindex = {} # key=drop reason, value = Counter of the data rate indexes of the dropped phy transmissions
+    for (tx_node_id, data_rate_index, drop_reason), count in drop_counts.items():
+        undelivered[data_rate_index] += count
+        sim_drop_reasons[drop_reason] += count
+        sim_drop_reasons_datarateindex.setdefault(drop_reason, Counter())[data_rate_index] += count
+    data_rate_stats = {data_rate_index: (stats['dataRateStats'][data_rate_index], undelivered[data_rate_index]) for data_rate_index in stats['dataRateStats']} # key=data rate index, value = (delivered,notdelivered)
 
     # Generate output:
-    n_delivered = number_of_delivered_transmissions
-    n_undelivered = number_of_undelivered_transmissions
-    n_tx = len(phy_transmissions)
+    n_delivered = stats['nDelivered']
+    n_undelivered = stats['nUndelivered']
+    n_tx = stats['nTx']
     pdr = n_delivered/n_tx
     print ("\nSimulation PHY delivery ratio: {}/{} = {}% ({} undelivered).".format(n_delivered, n_tx, 100*pdr, n_undelivered))
 
@@ -175,82 +394,190 @@ for csvfilename in args.csvfiles:
         drop_reason_output = "{}({})".format(drop_reason_text[drop_reason], drop_reason)
         s = "{:<25}".format(drop_reason_output)
         for data_rate_index in range(6):
-            count = sim_drop_reasons_datarateindex[drop_reason].count(data_rate_index)
+            count = sim_drop_reasons_datarateindex[drop_reason][data_rate_index]
             s = s + "{:>10}".format(count)
-        s = s + "{:>10}".format(sim_drop_reasons.count(drop_reason))
+        s = s + "{:>10}".format(sim_drop_reasons[drop_reason])
         print(s)
 
-    # parse sim settings file:
-    sim_settings_file_name = csvfilename.replace("trace-phy-tx.csv", "sim-settings.txt")
-
-    sim_settings = {"nGateways": -1, "nEndDevices": -1, "totalTime": -1, "usDataPeriod": -1, "seed": -1, "drCalcMethod": -1, "drCalcMethodMisc": -1  }
-    with open(sim_settings_file_name) as sim_settings_file:
-        sim_settings_file_contents = sim_settings_file.read()
-
-        p_ngateways = re.compile('nGateways = ([0-9]+)')
-        p_nenddevices = re.compile('nEndDevices = ([0-9]+)')
-        p_totaltime = re.compile('totalTime = ([0-9]+)')
-        p_data_period = re.compile('usDataPeriod = ([0-9]+)')
-        p_seed = re.compile('seed = ([0-9]+)')
-        p_drcalcmethod = re.compile('Data rate assignment method index: ([0-9]+)')
-
-        sim_settings['nGateways'] = int(p_ngateways.search (sim_settings_file_contents).groups()[0])
-        sim_settings['nEndDevices'] = int(p_nenddevices.search (sim_settings_file_contents).groups()[0])
-        sim_settings['totalTime'] =  int(p_totaltime.search (sim_settings_file_contents).groups()[0])
-        sim_settings['usDataPeriod'] = int(p_data_period.search (sim_settings_file_contents).groups()[0])
-        sim_settings['seed'] = int(p_seed.search (sim_settings_file_contents).groups()[0])
-
-        sim_settings['drCalcMethod'] = int(p_drcalcmethod.search (sim_settings_file_contents).groups()[0])
-        if sim_settings['drCalcMethod'] == 0:
-            p_drcalcperlimit = re.compile('PER limit = (\d+\.\d+)')
-            sim_settings['drCalcMethodMisc'] = float(p_drcalcperlimit.search (sim_settings_file_contents).groups()[0])
-        if sim_settings['drCalcMethod'] == 2:
-            p_drcalcfixeddr = re.compile('Fixed Data Rate Index = ([0-9]+)')
-            sim_settings['drCalcMethodMisc'] = int(p_drcalcfixeddr.search (sim_settings_file_contents).groups()[0])
-
-    # Generate output per simulation
-    print ("\nAppending output per simulation to {}".format(args.outputsimulation))
-    write_header = False
-    if not os.path.exists(args.outputsimulation):
-        write_header = True
-    with open(args.outputsimulation, 'a') as output_file: # append to output file
-        outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usDataPeriod>,<delivered>,<sent>,<PDR>,"\
-                       "<deliveredDR0>,<sentDR0>,<PDRDR0>,<deliveredDR1>,<sentDR1>,<PDRDR1>,<deliveredDR2>,<sentDR2>,<PDRDR2>,"\
-                       "<deliveredDR3>,<sentDR3>,<PDRDR3>,<deliveredDR4>,<sentDR4>,<PDRDR4>,<deliveredDR5>,<sentDR5>,<PDRDR5>\n"
-        if write_header:
-            output_file.write(outputFormat)
-
-        output_line_dr_pdrs = ""
-        for data_rate_index in data_rate_stats:
-            dr_delivered = data_rate_stats[data_rate_index][0]
-            dr_undelivered = data_rate_stats[data_rate_index][1]
-            dr_tx = dr_delivered + dr_undelivered
-            dr_pdr = dr_delivered/dr_tx if dr_tx > 0 else 0
-            output_line_dr_pdrs = output_line_dr_pdrs + "{},{},{:1.4f},".format(dr_delivered, dr_tx, dr_pdr)
-        output_line_dr_pdrs = output_line_dr_pdrs[:-1] # remove trailing comma
-
-        output_line = "{},{},{},{},{},{},{},{},{},{:1.4f},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
+    outputs = {}
+
+    # Output per simulation:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usDataPeriod>,<delivered>,<sent>,<PDR>,"\
+                   "<deliveredDR0>,<sentDR0>,<PDRDR0>,<deliveredDR1>,<sentDR1>,<PDRDR1>,<deliveredDR2>,<sentDR2>,<PDRDR2>,"\
+                   "<deliveredDR3>,<sentDR3>,<PDRDR3>,<deliveredDR4>,<sentDR4>,<PDRDR4>,<deliveredDR5>,<sentDR5>,<PDRDR5>\n"
+
+    output_line_dr_pdrs = ""
+    for data_rate_index in data_rate_stats:
+        dr_delivered = data_rate_stats[data_rate_index][0]
+        dr_undelivered = data_rate_stats[data_rate_index][1]
+        dr_tx = dr_delivered + dr_undelivered
+        dr_pdr = dr_delivered/dr_tx if dr_tx > 0 else 0
+        output_line_dr_pdrs = output_line_dr_pdrs + "{},{},{:1.4f},".format(dr_delivered, dr_tx, dr_pdr)
+    output_line_dr_pdrs = output_line_dr_pdrs[:-1] # remove trailing comma
+
+    output_line = "{},{},{},{},{},{},{},{},{},{:1.4f},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
+                                                              sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'], sim_settings['usDataPeriod'],
+                                                              n_delivered, n_tx, pdr, output_line_dr_pdrs)
+    outputs['simulation'] = (outputFormat, [output_line])
+
+    # Output per node:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usDataPeriod>,<nodeId>,<tranmissionsDeliveredForNode>,<tranmissionsSentForNode>,<PDRForNode>\n"
+    output_lines = []
+    for node_id in sorted(nodes):
+        if nodes[node_id]['TransmissionsSent'] > 0:
+            output_line = "{},{},{},{},{},{},{},{},{},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
+                                                                      sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'], sim_settings['usDataPeriod'],
+                                                                      node_id, nodes[node_id]['TransmissionsDelivered'], nodes[node_id]['TransmissionsSent'], nodes[node_id]['TransmissionsDelivered']/nodes[node_id]['TransmissionsSent'])
+            output_lines.append(output_line)
+        else:
+            # print ("{},{},{},{}".format(k, 0, 0, 1))
+            pass
+    outputs['enddevices'] = (outputFormat, output_lines)
+
+    # Drop events per node, data rate index and drop reason:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usDataPeriod>,<nodeId>,<dataRateIndex>,<dropReason>,<drops>\n"
+    output_lines = []
+    for (node_id, data_rate_index, drop_reason), count in sorted(drop_counts.items()):
+        output_line = "{},{},{},{},{},{},{},{},{},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
                                                                   sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'], sim_settings['usDataPeriod'],
-                                                                  n_delivered, n_tx, pdr, output_line_dr_pdrs)
-        output_file.write(output_line)
-
-    # Generate output per node
-    print ("Appending output per end device to {}".format(args.outputenddevice))
-    write_header = False
-    if not os.path.exists(args.outputenddevice):
-        write_header = True
-    with open(args.outputenddevice, 'a') as output_file: # append to output file
-        outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usDataPeriod>,<nodeId>,<tranmissionsDeliveredForNode>,<tranmissionsSentForNode>,<PDRForNode>\n"
-        if write_header:
-            output_file.write(outputFormat)
-
-        for node_id in sorted(nodes):
-            if nodes[node_id]['TransmissionsSent'] > 0:
-                output_line = "{},{},{},{},{},{},{},{},{},{},{}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
-                                                                          sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'], sim_settings['usDataPeriod'],
-                                                                          node_id, nodes[node_id]['TransmissionsDelivered'], nodes[node_id]['TransmissionsSent'], nodes[node_id]['TransmissionsDelivered']/nodes[node_id]['TransmissionsSent'])
-                output_file.write(output_line)
-            else:
-                # print ("{},{},{},{}".format(k, 0, 0, 1))
-                pass
-    print ("------------------------------------------------------------------")
+                                                                  node_id, data_rate_index, drop_reason, count)
+        output_lines.append(output_line)
+    outputs['drops'] = (outputFormat, output_lines)
+    return outputs
+
+# Parse the PHY transmissions trace file csvfilename (and the sim-settings file
+# of the same simulation). Returns the output of the simulation (see
+# get_phy_outputs). parse_app_packets and jobs: see read_phy_stats.
+def parse_trace_file(csvfilename, parse_app_packets=False, jobs=1):
+    stats = read_phy_stats(csvfilename, parse_app_packets, jobs)
+    # parse sim settings file:
+    sim_settings = load_sim_settings(find_trace_file(csvfilename, "trace-phy-tx.csv", "sim-settings.txt"))
+    return get_phy_outputs(stats, sim_settings)
+
+# Returns the state of a followed PHY transmissions trace (see
+# add_phy_stream_block): the statistics of the processed transmissions (see
+# process_phy_transmissions), the nodes (node id -> device type), the
+# transmissions in flight (see add_phy_events), (position, timestamp) of their
+# first event in order of first appearance and the timestamp of the last event
+def new_phy_stream():
+    return {'stats': process_phy_transmissions({}, [], {}), 'nodes': {}, 'transmissions': {}, 'inFlight': OrderedDict(), 'lastTimestamp': -1}
+
+# Process the transmissions in flight of stream (see new_phy_stream) that were
+# first seen before limit (all of them when limit is None)
+def process_phy_stream_transmissions(stream, limit=None):
+    in_flight = stream['inFlight']
+    phy_transmissions = {}
+    positions = array('q')
+    while in_flight and (limit is None or next(iter(in_flight.values()))[1] < limit):
+        phy_key, (position, timestamp) = in_flight.popitem(last=False)
+        phy_transmissions[phy_key] = stream['transmissions'].pop(phy_key)
+        positions.append(position)
+    if phy_transmissions:
+        merge_phy_stats(stream['stats'], process_phy_transmissions(phy_transmissions, positions, stream['nodes']))
+
+# Add the events of block (with the time and Position columns, see
+# trace_follow) to stream (see new_phy_stream) and process the transmissions
+# first seen more than horizon seconds before the end of the block
+def add_phy_stream_block(stream, block, horizon):
+    block = get_block_lists(block)
+    add_phy_nodes(stream['nodes'], block)
+    positions = array('q')
+    add_phy_events(stream['transmissions'], positions, block)
+    first_position = block['Position'][0] if block['Position'] else 0
+    for position in positions:
+        i = position - first_position
+        stream['inFlight'][block['PhyTraceIdTag'][i]] = (position, block['time'][i])
+    if block['time']:
+        stream['lastTimestamp'] = block['time'][-1]
+        process_phy_stream_transmissions(stream, block['time'][-1] - horizon)
+
+# Returns the snapshot of a followed PHY transmissions trace (see print_snapshot
+# of trace_follow) from its stream (see new_phy_stream): the delivery ratio of
+# the processed transmissions and their drop events, of all transmissions and
+# of the transmissions processed since the previous snapshot (with values
+# previous)
+def get_phy_snapshot(stream, previous):
+    stats = stream['stats']
+    values = {'traceTime': stream['lastTimestamp'], 'transmissionsInFlight': len(stream['inFlight']), 'messages': len(stats['messages']),
+              'tx': stats['nTx'], 'delivered': stats['nDelivered'], 'undelivered': stats['nUndelivered'], 'drops': sum(stats['dropCounts'].values())}
+    interval = get_interval_values(values, previous)
+    text = "t={:.0f}s".format(values['traceTime'])
+    for label, counts in [("PHY", values), ("last {:.0f}s".format(interval['traceTime']), interval)]:
+        text += " {}: PDR {:.4f} ({}/{}), {:.3f} drops/undelivered".format(label, counts['delivered']/counts['tx'] if counts['tx'] > 0 else 0, counts['delivered'], counts['tx'],
+                                                                        counts['drops']/counts['undelivered'] if counts['undelivered'] > 0 else 0)
+    text += ", {} transmissions in flight, {} unexpected transmissions".format(values['transmissionsInFlight'], values['messages'])
+    return text, values
+
+# Follow the PHY transmissions trace file csvfilename while a simulation
+# writes it (see trace_follow): a transmission is processed horizon seconds
+# after its first event, and a snapshot of the statistics (see
+# get_phy_snapshot) is printed every snapshot_interval seconds and written to
+# snapshot_file. When the trace is no longer followed, the transmissions in
+# flight are processed and a last snapshot is printed. Returns the statistics
+# (see process_phy_transmissions).
+def follow_phy_trace(csvfilename, horizon=follow_horizon, snapshot_file=None, idle_timeout=None):
+    stream = new_phy_stream()
+    codes = new_phy_codes()
+    def add_block(block):
+        check_phy_trace_sources(codes, csvfilename)
+        add_phy_stream_block(stream, block, horizon)
+    get_snapshot = lambda previous: get_phy_snapshot(stream, previous)
+    previous = follow_trace(csvfilename, phy_columns + ['time'], codes, (), add_block, get_snapshot, snapshot_file, idle_timeout)
+    process_phy_stream_transmissions(stream)
+    stats = stream['stats']
+    for position, message in sorted(stats['messages'], key=lambda message: message[0]):
+        print(message)
+    print_snapshot(get_snapshot, previous, snapshot_file)
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process ns-3 lorawan PHY transmissions CSV output file.')
+    parser.add_argument('csvfiles', nargs='*', help='The CSV files to be parsed')
+    parser.add_argument('--output-simulation', dest='outputsimulation', default=output_file_names['simulation'], help='The output CSV file')
+    parser.add_argument('--output-enddevice', dest='outputenddevice', default=output_file_names['enddevices'], help='The output CSV file')
+    parser.add_argument('--output-drops', dest='outputdrops', default=output_file_names['drops'], help='The output CSV file with the drops per end device, data rate index and drop reason')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of files parsed in parallel (the output lines are appended in sorted order of the file names)')
+    parser.add_argument('--chunk-jobs', dest='chunkjobs', type=int, default=1, help='Number of processes that parse chunks of every file (for large, uncompressed traces)')
+    add_cache_arguments(parser)
+    parser.add_argument('--follow', action='store_true', help='Follow the trace while the simulation writes it and print a snapshot of the PDR and drops every {:.0f} seconds, without writing output'.format(snapshot_interval))
+    parser.add_argument('--horizon', type=float, default=follow_horizon, help='With --follow, process a transmission HORIZON seconds after its first event (default: {})'.format(follow_horizon))
+    parser.add_argument('--snapshot-file', dest='snapshotfile', default=None, help='With --follow, also write the latest snapshot to this JSON file')
+    parser.add_argument('--idle-timeout', dest='idletimeout', type=float, default=None, help='With --follow, stop following when no lines were appended for this many seconds (default: until the trace is removed or Ctrl-C)')
+    add_catalog_arguments(parser)
+    add_results_arguments(parser)
+    # parser.add_argument('--parseapppackets', type=bool, default=False, help='Parse app packets?')
+    feature_parser = parser.add_mutually_exclusive_group(required=False)
+    feature_parser.add_argument('--app-packets', dest='apppackets', action='store_true')
+    feature_parser.add_argument('--no-app-packets', dest='apppackets', action='store_false')
+    parser.set_defaults(feature=False)
+
+    args = parser.parse_args()
+    set_cache_settings((args.cache, args.cachedir))
+    if args.where:
+        args.csvfiles += get_catalog_trace_files(args, "trace-phy-tx.csv")
+    if args.follow:
+        if len(args.csvfiles) != 1:
+            parser.error("--follow takes one trace file")
+        follow_phy_trace(args.csvfiles[0], args.horizon, args.snapshotfile, args.idletimeout)
+        parser.exit()
+    results = open_results(args.results) if args.results else None
+    output_files = {'simulation': args.outputsimulation, 'enddevices': args.outputenddevice, 'drops': args.outputdrops}
+    table_names = get_results_table_names(output_file_names)
+    if results is not None:
+        keep_unexported_outputs(results, table_names, output_files)
+    for csvfilename, outputs in parse_trace_files(parse_trace_file, args.csvfiles, args.jobs, (args.apppackets, args.chunkjobs), initializer=set_cache_settings, initargs=(get_cache_settings(),)):
+        if results is not None:
+            print ("\nStoring output in {}".format(args.results))
+            store_trace_results(results, table_names, csvfilename, "trace-phy-tx.csv", outputs)
+        else:
+            print ("\nAppending output per simulation to {}".format(args.outputsimulation))
+            append_output_lines(args.outputsimulation, *outputs['simulation'])
+            print ("Appending output per end device to {}".format(args.outputenddevice))
+            append_output_lines(args.outputenddevice, *outputs['enddevices'])
+            print ("Appending drops per end device to {}".format(args.outputdrops))
+            append_output_lines(args.outputdrops, *outputs['drops'])
+        print ("------------------------------------------------------------------")
+    if results is not None:
+        for output_name, file_name in sorted(output_files.items()):
+            print ("Exporting {} to {}".format(table_names[output_name], file_name))
+            export_results(results, table_names[output_name], file_name)
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+# Parse all output files of ns-3 lorawan simulations at once. The PHY
+# transmissions, MAC packets and NS DS packets traces and the nodes file of a
+# simulation are each read once, its sim-settings and trace-misc files are read
+# once and shared by the outputs. Writes the outputs of parse_macpackets_trace.py,
+# parse_phytx_trace.py and parse_nsdsmsgs_trace.py (the same as when these
+# scripts parse the traces) and cross-layer outputs that combine the traces,
+# e.g. the PHY transmissions per MAC packet.
+import argparse
+import os
+from trace_io import find_trace_file, load_sim_settings, load_trace_misc, trace_misc_defaults, append_output_lines, parse_trace_files
+from trace_loader import add_cache_arguments, set_cache_settings, get_cache_settings
+from run_catalog import add_catalog_arguments, get_catalog_trace_files
+from results_db import add_results_arguments, open_results, get_results_table_names, get_simulation_prefix, keep_unexported_outputs, store_results, export_results
+from parse_nodes import load_nodes, print_nodes
+from parse_macpackets_trace import read_mac_stats, get_mac_outputs
+from parse_phytx_trace import read_phy_stats, get_phy_outputs
+from parse_nsdsmsgs_trace import read_nsds_stats, get_nsds_outputs
+import parse_macpackets_trace
+import parse_phytx_trace
+import parse_nsdsmsgs_trace
+from collections import Counter
+
+# Default output files of the cross-layer outputs (see output_file_names of
+# the other parse scripts)
+output_file_names = {'simulation': "parse_simulation_cross_layer_per_simulation.csv",
+                     'enddevices': "parse_simulation_cross_layer_per_enddevice.csv"}
+
+# Default output files of the outputs of parse_simulation, by parse script
+# (module name), the cross-layer outputs are the outputs of parse_simulation
+parse_output_file_names = {module.__name__: module.output_file_names for module in [parse_macpackets_trace, parse_phytx_trace, parse_nsdsmsgs_trace]}
+parse_output_file_names['parse_simulation'] = output_file_names
+
+# Returns the cross-layer outputs of a simulation: a dict mapping the name of
+# every output (see output_file_names) to a tuple (header line, output lines),
+# from the statistics of its MAC packets trace (see read_mac_stats) and PHY
+# transmissions trace (see read_phy_stats), its nodes (see load_nodes, empty
+# when the simulation has no nodes file) and its sim settings.
+# The PHY drops are the drop events at receivers of the expected device type of
+# the undelivered transmissions of the end devices (see
+# process_phy_transmissions).
+# The ratios are ratios of totals (per simulation or per end device), the PHY
+# transmissions are not joined to the MAC packets they carry: the
+# transmissions per packet are the mean number of transmissions per generated
+# packet, and the drops to undelivered ratio is the number of PHY drops divided
+# by the number of undelivered packets, the drops include those of
+# transmissions of packets that were delivered in the end (e.g. of an earlier
+# try).
+def get_cross_layer_outputs(mac_stats, phy_stats, nodes, sim_settings):
+    device_types = {node_id: node['DeviceType'] for node_id, node in mac_stats['nodes'].items()}
+    device_types.update((node_id, node['DeviceType']) for node_id, node in phy_stats['nodes'].items())
+    device_types.update((node_id, node['DeviceType']) for node_id, node in nodes.items())
+    drops = Counter() # key=transmitting node id, value = drop events
+    drop_reasons = Counter() # key=drop reason, value = drop events of end device transmissions
+    for (tx_node_id, data_rate_index, drop_reason), count in phy_stats['dropCounts'].items():
+        drops[tx_node_id] += count
+        if device_types.get(tx_node_id) == 1:
+            drop_reasons[drop_reason] += count
+
+    upstream_stats = mac_stats['upstream']
+    phy_us_sent = sum(node['TransmissionsSent'] for node in phy_stats['nodes'].values() if node['DeviceType'] == 1)
+    phy_us_delivered = sum(node['TransmissionsDelivered'] for node in phy_stats['nodes'].values() if node['DeviceType'] == 1)
+    phy_us_drops = sum(drop_reasons.values())
+    print("\nUS PHY transmissions per MAC packet: {}/{} = {:.4f}".format(phy_us_sent, upstream_stats['nrPackets'], phy_us_sent/upstream_stats['nrPackets'] if upstream_stats['nrPackets'] > 0 else 0))
+    print("US PHY drops / undelivered MAC packets: {}/{} = {:.4f}".format(phy_us_drops, upstream_stats['nrUndelivered'], phy_us_drops/upstream_stats['nrUndelivered'] if upstream_stats['nrUndelivered'] > 0 else 0))
+
+    outputs = {}
+
+    # Output per simulation:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usConfirmedData>,<usDataPeriod>,"\
+                   "<usPackets>,<usDelivered>,<usUndelivered>,<usSent>,<phyUsSent>,<phyUsDelivered>,<phyUsDrops>,"\
+                   "<phyUsDrops0>,<phyUsDrops1>,<phyUsDrops2>,<phyUsDrops3>,<phyUsDrops4>,<phyUsDrops5>,"\
+                   "<phyUsSentPerPacket>,<phyUsDropsToUndeliveredRatio>\n"
+    output_line = "{},{},{},{},{},{},{},{},"\
+                  "{},{},{},{},{},{},{},"\
+                  "{},{},{},{},{},{},"\
+                  "{:1.4f},{:1.4f}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'], sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'],
+                                             sim_settings['usConfirmedData'], sim_settings['usDataPeriod'],
+                                             upstream_stats['nrPackets'], upstream_stats['nrDelivered'], upstream_stats['nrUndelivered'], upstream_stats['nrSent'], phy_us_sent, phy_us_delivered, phy_us_drops,
+                                             drop_reasons[0], drop_reasons[1], drop_reasons[2], drop_reasons[3], drop_reasons[4], drop_reasons[5],
+                                             phy_us_sent/upstream_stats['nrPackets'] if upstream_stats['nrPackets'] > 0 else 0,
+                                             phy_us_drops/upstream_stats['nrUndelivered'] if upstream_stats['nrUndelivered'] > 0 else 0)
+    outputs['simulation'] = (outputFormat, [output_line])
+
+    # Output per end device:
+    outputFormat = "<nGateways>,<nEndDevices>,<totalTime>,<drCalcMethod>,<drCalcMethodMisc>,<seed>,<usConfirmedData>,<usDataPeriod>,<nodeId>,<distance>,<dataRateIndex>,"\
+                   "<packetsGenerated>,<packetsDelivered>,<packetsNotDelivered>,<phySent>,<phyDelivered>,<phyDrops>,<phySentPerPacket>,<phyDropsToUndeliveredRatio>\n"
+    output_lines = []
+    for node_id in sorted(device_types):
+        mac_node = mac_stats['nodes'].get(node_id)
+        phy_node = phy_stats['nodes'].get(node_id)
+        if device_types[node_id] != 1 or (mac_node is None or mac_node['PacketsGenerated'] == 0) and (phy_node is None or phy_node['TransmissionsSent'] == 0):
+            continue
+        node = nodes.get(node_id, {'Distance': -1, 'DataRateIndex': -1})
+        packets_generated = mac_node['PacketsGenerated'] if mac_node else 0
+        packets_not_delivered = mac_node['PacketsNotDelivered'] if mac_node else 0
+        phy_sent = phy_node['TransmissionsSent'] if phy_node else 0
+        output_line = "{},{},{},{},{},{},{},{},{},{},{},"\
+                      "{},{},{},{},{},{},{:1.4f},{:1.4f}\n".format(sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['totalTime'],
+                                                                    sim_settings['drCalcMethod'], sim_settings['drCalcMethodMisc'], sim_settings['seed'], sim_settings['usConfirmedData'], sim_settings['usDataPeriod'],
+                                                                    node_id, node['Distance'], node['DataRateIndex'],
+                                                                    packets_generated, mac_node['PacketsDelivered'] if mac_node else 0, packets_not_delivered,
+                                                                    phy_sent, phy_node['TransmissionsDelivered'] if phy_node else 0, drops[node_id],
+                                                                    phy_sent/packets_generated if packets_generated > 0 else 0,
+                                                                    drops[node_id]/packets_not_delivered if packets_not_delivered > 0 else 0)
+        output_lines.append(output_line)
+    outputs['enddevices'] = (outputFormat, output_lines)
+    return outputs
+
+# Parse the output files of the simulation with sim-settings file
+# settings_file_name: its MAC packets, PHY transmissions and NS DS packets
+# traces and nodes file, the ones the simulation has. Returns the sim settings
+# of the simulation and a dict mapping the name of every parse script (module)
+# to its output (see parse_trace_file of the parse scripts), the cross-layer
+# outputs (see get_cross_layer_outputs) are the output of parse_simulation,
+# when the simulation has both a MAC packets and a PHY transmissions trace.
+# horizon: see read_mac_stats, jobs: the number of processes that parse chunks
+# of the MAC packets and PHY transmissions traces (see read_mac_stats and
+# read_phy_stats).
+def parse_simulation(settings_file_name, horizon=None, jobs=1):
+    print("Parsing simulation {}".format(settings_file_name))
+    sim_settings = load_sim_settings(settings_file_name)
+    file_names = {suffix: find_trace_file(settings_file_name, "sim-settings.txt", suffix)
+                  for suffix in ["trace-misc.csv", "nodes.csv", "trace-mac-packets.csv", "trace-phy-tx.csv", "trace-ns-dsmsgs.csv"]}
+    trace_misc = load_trace_misc(file_names["trace-misc.csv"]) if os.path.exists(file_names["trace-misc.csv"]) else dict(trace_misc_defaults)
+    nodes = {}
+    if os.path.exists(file_names["nodes.csv"]):
+        print("Parsing nodes file {}".format(file_names["nodes.csv"]))
+        nodes = load_nodes(file_names["nodes.csv"])
+        print_nodes(nodes)
+
+    parsed_outputs = {}
+    mac_stats = None
+    phy_stats = None
+    if os.path.exists(file_names["trace-mac-packets.csv"]):
+        mac_stats = read_mac_stats(file_names["trace-mac-packets.csv"], horizon, jobs)
+        parsed_outputs[parse_macpackets_trace.__name__] = get_mac_outputs(mac_stats, sim_settings, trace_misc)
+    if os.path.exists(file_names["trace-phy-tx.csv"]):
+        phy_stats = read_phy_stats(file_names["trace-phy-tx.csv"], False, jobs)
+        parsed_outputs[parse_phytx_trace.__name__] = get_phy_outputs(phy_stats, sim_settings)
+    if os.path.exists(file_names["trace-ns-dsmsgs.csv"]):
+        parsed_outputs[parse_nsdsmsgs_trace.__name__] = get_nsds_outputs(read_nsds_stats(file_names["trace-ns-dsmsgs.csv"]), sim_settings, trace_misc)
+    if mac_stats is not None and phy_stats is not None:
+        parsed_outputs['parse_simulation'] = get_cross_layer_outputs(mac_stats, phy_stats, nodes, sim_settings)
+    return sim_settings, parsed_outputs
+
+# Returns the outputs of parse_simulation by results table (see
+# get_results_table_names): table name -> (header line, output lines)
+def get_results_outputs(parsed_outputs):
+    results_outputs = {}
+    for module_name, outputs in parsed_outputs.items():
+        table_names = get_results_table_names(parse_output_file_names[module_name])
+        for output_name, output in outputs.items():
+            results_outputs[table_names[output_name]] = output
+    return results_outputs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process all ns-3 lorawan output files of simulations at once.')
+    parser.add_argument('settingsfiles', nargs='*', help='The sim-settings files of the simulations to be parsed (the other output files of a simulation are next to it)')
+    parser.add_argument('--horizon', type=float, default=None, help='Parse the MAC packets traces in streaming mode (see parse_macpackets_trace.py)')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of simulations parsed in parallel (the output lines are appended in sorted order of the file names)')
+    parser.add_argument('--chunk-jobs', dest='chunkjobs', type=int, default=1, help='Number of processes that parse chunks of every MAC packets and PHY transmissions trace (for large, uncompressed traces)')
+    add_cache_arguments(parser)
+    add_catalog_arguments(parser)
+    add_results_arguments(parser)
+
+    args = parser.parse_args()
+    set_cache_settings((args.cache, args.cachedir))
+    if args.where:
+        args.settingsfiles += get_catalog_trace_files(args, "sim-settings.txt")
+    results = open_results(args.results) if args.results else None
+    # The output files are the default output files of the parse scripts,
+    # by results table:
+    output_files = {table_name: table_name + ".csv" for module_output_file_names in parse_output_file_names.values() for table_name in get_results_table_names(module_output_file_names).values()}
+    table_names = {table_name: table_name for table_name in output_files}
+    if results is not None:
+        keep_unexported_outputs(results, table_names, output_files)
+    for settings_file_name, (sim_settings, parsed_outputs) in parse_trace_files(parse_simulation, args.settingsfiles, args.jobs, (args.horizon, args.chunkjobs), initializer=set_cache_settings, initargs=(get_cache_settings(),)):
+        results_outputs = get_results_outputs(parsed_outputs)
+        if results is not None:
+            print ("\nStoring output in {}".format(args.results))
+            store_results(results, table_names, get_simulation_prefix(settings_file_name, "sim-settings.txt"), sim_settings, results_outputs)
+        else:
+            for table_name, output in sorted(results_outputs.items()):
+                print ("Appending output to {}".format(output_files[table_name]))
+                append_output_lines(output_files[table_name], *output)
+        print ("------------------------------------------------------------------")
+    if results is not None:
+        for table_name, file_name in sorted(output_files.items()):
+            print ("Exporting {} to {}".format(table_name, file_name))
+            export_results(results, table_name, file_name)
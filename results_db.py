@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# Results database: an SQLite database with the output of the parse scripts.
+# Every output (e.g. the output per simulation or per end device of
+# parse_phytx_trace.py) is a table named after its default CSV output file
+# (see output_file_names of the parse scripts), with a column per CSV column.
+# The rows of a simulation are replaced when its traces are parsed again, so
+# parsing a trace twice does not duplicate its rows. Simulations are
+# identified by the prefix of their output files and all their settings
+# (including the seed, see get_simulation_identity). The CSV output files of
+# the parse scripts are exported from the database, e.g.
+#   python3 results_db.py --export parse_phytx_trace_per_enddevice parse_phytx_trace_per_enddevice.csv
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+from trace_io import find_trace_file, load_sim_settings, parse_setting_value, strip_compression_extension
+
+results_file_name = "parse_results.sqlite" # in the current directory, like the CSV output files
+
+def open_results(file_name=None):
+    connection = sqlite3.connect(file_name or results_file_name, timeout=600) # parse scripts running in parallel wait for each other
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS simulations (id INTEGER PRIMARY KEY, prefix TEXT, identity TEXT, settings TEXT, UNIQUE (prefix, identity))")
+    if 'prefix' not in [row[1] for row in connection.execute("PRAGMA table_info(simulations)")]:
+        raise ValueError("The simulations of results database {} have no output file prefix, use another results database (--results)".format(file_name or results_file_name))
+    connection.execute("CREATE TABLE IF NOT EXISTS resultTables (name TEXT PRIMARY KEY, header TEXT, columns TEXT)")
+    # Size and modification time of every CSV file the database exported,
+    # to detect output appended to a CSV file after its export:
+    connection.execute("CREATE TABLE IF NOT EXISTS exports (fileName TEXT PRIMARY KEY, tableName TEXT, size INTEGER, mtimeNs INTEGER)")
+    connection.commit()
+    return connection
+
+# Returns the identity of the simulation with sim_settings (see
+# load_sim_settings): all its settings, in order of name
+def get_simulation_identity(sim_settings):
+    return json.dumps(sim_settings, sort_keys=True)
+
+# Returns the prefix of the output files of a simulation (an absolute path)
+# from the name of its output file file_name, that ends with suffix (e.g.
+# "trace-mac-packets.csv" or "sim-settings.txt")
+def get_simulation_prefix(file_name, suffix):
+    return os.path.abspath(strip_compression_extension(file_name)[:-len(suffix)].rstrip('-_'))
+
+# Returns the results table of every output (output name -> table name) of a
+# parse script with output_file_names (output name -> default CSV file name)
+def get_results_table_names(output_file_names):
+    return {output_name: os.path.splitext(file_name)[0] for output_name, file_name in output_file_names.items()}
+
+# Returns the column names of header (an output format line, e.g.
+# "<nGateways>,<nEndDevices>,...\n"), a repeated name gets the number of its
+# occurrence appended
+def get_header_columns(header):
+    names = [name.strip().strip('<>') for name in header.strip().split(',')]
+    names = [name for name in names if name] # e.g. after a trailing comma
+    return [name if name not in names[:i] else "{}{}".format(name, names[:i].count(name) + 1) for i, name in enumerate(names)]
+
+def quote_name(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+# Creates the table of a results output with header (see get_header_columns)
+# when it does not exist yet. Returns the columns of the table.
+def create_results_table(connection, table_name, header):
+    row = connection.execute("SELECT header, columns FROM resultTables WHERE name = ?", (table_name,)).fetchone()
+    if row is not None:
+        if row[0] != header:
+            raise ValueError("The columns of results table {} have changed, use another results database (--results)".format(table_name))
+        return json.loads(row[1])
+    columns = get_header_columns(header)
+    # csvLine is the line of the CSV file, exported as is. The columns hold
+    # the values as numbers for queries.
+    connection.execute("CREATE TABLE {} (simulationId INTEGER REFERENCES simulations(id), rowIndex INTEGER, csvLine TEXT{})".format(
+                       quote_name(table_name), "".join(", {}".format(quote_name(column)) for column in columns)))
+    connection.execute("CREATE INDEX {} ON {} (simulationId, rowIndex)".format(quote_name(table_name + "Simulation"), quote_name(table_name)))
+    connection.execute("INSERT INTO resultTables (name, header, columns) VALUES (?, ?, ?)", (table_name, header, json.dumps(columns)))
+    return columns
+
+# Returns the values of a column of results (strings, None for missing
+# fields) as numbers when they are numbers, converted column by column
+def convert_results_column(column):
+    for convert in (int, float):
+        try:
+            return list(map(convert, column))
+        except (TypeError, ValueError):
+            pass
+    return [parse_setting_value(value) if value is not None else None for value in column]
+
+# Store outputs (a dict output name -> (header, lines), see parse_trace_file
+# of the parse scripts) of the simulation with output file prefix prefix (see
+# get_simulation_prefix) and sim_settings in the results tables table_names
+# (see get_results_table_names), in a single transaction. The previous rows of
+# the simulation are replaced.
+def store_results(connection, table_names, prefix, sim_settings, outputs):
+    with connection:
+        connection.execute("BEGIN IMMEDIATE")
+        identity = get_simulation_identity(sim_settings)
+        row = connection.execute("SELECT id FROM simulations WHERE prefix = ? AND identity = ?", (prefix, identity)).fetchone()
+        if row is None:
+            for other_prefix, in connection.execute("SELECT prefix FROM simulations WHERE identity = ?", (identity,)):
+                print("Warning: simulation {} has the same settings as simulation {}, both are stored".format(prefix, other_prefix))
+            row = (connection.execute("INSERT INTO simulations (prefix, identity, settings) VALUES (?, ?, ?)", (prefix, identity, json.dumps(sim_settings))).lastrowid,)
+        simulation_id = row[0]
+        for output_name, (header, lines) in sorted(outputs.items()):
+            table_name = table_names[output_name]
+            columns = create_results_table(connection, table_name, header)
+            connection.execute("DELETE FROM {} WHERE simulationId = ?".format(quote_name(table_name)), (simulation_id,))
+            fields = [line.rstrip('\n').split(',') for line in lines]
+            values = [convert_results_column(column) for column in itertools.zip_longest(*fields)][:len(columns)]
+            values += [[None] * len(lines)] * (len(columns) - len(values))
+            rows = zip(itertools.repeat(simulation_id), itertools.count(), lines, *values)
+            connection.executemany("INSERT INTO {} VALUES ({})".format(quote_name(table_name), ", ".join("?" * (3 + len(columns)))), rows)
+
+# Store the outputs of trace file csvfilename (whose name ends with
+# trace_suffix, see store_results)
+def store_trace_results(connection, table_names, csvfilename, trace_suffix, outputs):
+    store_results(connection, table_names, get_simulation_prefix(csvfilename, trace_suffix),
+                  load_sim_settings(find_trace_file(csvfilename, trace_suffix, "sim-settings.txt")), outputs)
+
+# Write the rows of results table table_name to CSV file file_name (replaced
+# in one step), in the order the simulations were first stored. The size and
+# modification time of the exported file are recorded (see
+# keep_unexported_outputs).
+def export_results(connection, table_name, file_name):
+    row = connection.execute("SELECT header FROM resultTables WHERE name = ?", (table_name,)).fetchone()
+    if row is None:
+        return
+    tmp_file_name = "{}.{}".format(file_name, os.getpid())
+    with open(tmp_file_name, 'w') as csv_file:
+        csv_file.write(row[0])
+        for line, in connection.execute("SELECT csvLine FROM {} ORDER BY simulationId, rowIndex".format(quote_name(table_name))):
+            csv_file.write(line)
+    os.replace(tmp_file_name, file_name)
+    stat = os.stat(file_name)
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO exports (fileName, tableName, size, mtimeNs) VALUES (?, ?, ?, ?)",
+                           (os.path.abspath(file_name), table_name, stat.st_size, stat.st_mtime_ns))
+
+# Returns file_name with the extension .orig, or .orig.<n> when that file
+# exists already
+def get_orig_file_name(file_name):
+    orig_file_name = file_name + ".orig"
+    n = 1
+    while os.path.exists(orig_file_name):
+        orig_file_name = "{}.orig.{}".format(file_name, n)
+        n += 1
+    return orig_file_name
+
+# Move the CSV output files (output name -> file name) that were not exported
+# from the results database (e.g. appended to by an older version of the parse
+# script or with --no-results), or that changed since their export, out of
+# the way, to <file name>.orig, so they are not overwritten by the export.
+# table_names: see get_results_table_names.
+def keep_unexported_outputs(connection, table_names, output_files):
+    for output_name, file_name in sorted(output_files.items()):
+        if not os.path.exists(file_name):
+            continue
+        stat = os.stat(file_name)
+        row = connection.execute("SELECT tableName, size, mtimeNs FROM exports WHERE fileName = ?", (os.path.abspath(file_name),)).fetchone()
+        if row != (table_names[output_name], stat.st_size, stat.st_mtime_ns):
+            orig_file_name = get_orig_file_name(file_name)
+            print("Moving {} to {}, {}".format(file_name, orig_file_name, "the output is now exported from the results database" if row is None else "it changed since it was exported from the results database"))
+            os.replace(file_name, orig_file_name)
+
+# Add the --results and --no-results arguments to the parser of a parse script
+def add_results_arguments(parser):
+    parser.add_argument('--results', default=results_file_name, help='The results database the output is stored in, the CSV output files are exported from it (default: {})'.format(results_file_name))
+    parser.add_argument('--no-results', dest='results', action='store_const', const=None, help='Append the output to the CSV output files instead')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the output of the parse scripts from the results database.')
+    parser.add_argument('--database', default=None, help='The results database (default: {})'.format(results_file_name))
+    parser.add_argument('--export', nargs=2, action='append', default=[], metavar=('TABLE', 'FILE'), help='Export results table TABLE (e.g. parse_phytx_trace_per_enddevice) to CSV file FILE')
+    args = parser.parse_args()
+
+    connection = open_results(args.database)
+    if not args.export:
+        for table_name, in connection.execute("SELECT name FROM resultTables ORDER BY name"):
+            print("{}: {} rows".format(table_name, connection.execute("SELECT COUNT(*) FROM {}".format(quote_name(table_name))).fetchone()[0]))
+    for table_name, file_name in args.export:
+        export_results(connection, table_name, file_name)
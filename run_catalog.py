@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# Run catalog: an SQLite database with the settings (sim-settings file), the
+# misc counters (trace-misc file) and the output files of every simulation in
+# an output tree, so runs can be selected by their settings without globbing
+# and reading the output files, e.g.
+#   python3 run_catalog.py --scan output
+#   python3 run_catalog.py --where nGateways=4 usConfirmedData=1 --files trace-mac-packets.csv
+# The parse scripts select the traces they parse from the catalog with
+# --catalog and --where.
+import argparse
+import json
+import os
+import sqlite3
+from ns3_command import cwd
+from trace_io import strip_compression_extension, load_sim_settings, load_trace_misc, parse_setting_value
+
+run_catalog_file_name = os.path.join(cwd, "output", "run-catalog.sqlite")
+sim_settings_suffix = "sim-settings.txt"
+
+def open_run_catalog(file_name=None):
+    file_name = file_name or run_catalog_file_name
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    connection = sqlite3.connect(file_name)
+    connection.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, prefix TEXT UNIQUE, settingsSize INTEGER, settingsMtimeNs INTEGER, "
+                       "settings TEXT, misc TEXT)")
+    # Every setting and misc counter of a run, values are stored as numbers
+    # when they are numbers, so they can be compared numerically:
+    connection.execute("CREATE TABLE IF NOT EXISTS runSettings (runId INTEGER REFERENCES runs(id) ON DELETE CASCADE, name TEXT, value)")
+    connection.execute("CREATE TABLE IF NOT EXISTS runFiles (runId INTEGER REFERENCES runs(id) ON DELETE CASCADE, suffix TEXT, fileName TEXT, bytes INTEGER)")
+    connection.execute("CREATE INDEX IF NOT EXISTS runSettingsNameValue ON runSettings (name, value)")
+    connection.execute("CREATE INDEX IF NOT EXISTS runFilesRun ON runFiles (runId)")
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.commit()
+    return connection
+
+# Returns the runs in the output tree below root_dir: a dict mapping the prefix
+# of every run (the path of its sim-settings file without "sim-settings.txt")
+# to the dict suffix -> file name of its output files (e.g.
+# "trace-mac-packets.csv.gz"). Hidden directories (e.g. the trace cache) are
+# skipped.
+def find_output_tree_runs(root_dir):
+    runs = {}
+    for dir_name, dir_names, file_names in os.walk(root_dir):
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith('.'))
+        prefixes = [file_name[:-len(sim_settings_suffix)] for file_name in file_names if strip_compression_extension(file_name).endswith(sim_settings_suffix)]
+        for prefix in prefixes:
+            runs[os.path.join(dir_name, prefix)] = {file_name[len(prefix):]: os.path.join(dir_name, file_name)
+                                                    for file_name in file_names if file_name.startswith(prefix) and not file_name.endswith(".log")}
+    return runs
+
+# Scan the output tree below root_dir and update the catalog: the settings and
+# misc counters of new runs and of runs whose sim-settings file changed are
+# (re)read, the output files of all runs are updated and runs below root_dir
+# that no longer exist are removed. Returns the number of runs that were read.
+def scan_output_tree(connection, root_dir):
+    root_dir = os.path.abspath(root_dir)
+    tree_runs = find_output_tree_runs(root_dir)
+    catalog_runs = {prefix: (run_id, size, mtime_ns) for run_id, prefix, size, mtime_ns in
+                    connection.execute("SELECT id, prefix, settingsSize, settingsMtimeNs FROM runs WHERE prefix LIKE ? ESCAPE '\\'",
+                                       (root_dir.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + os.sep + '%',))}
+    n_read = 0
+    with connection:
+        for prefix in set(catalog_runs) - set(tree_runs):
+            connection.execute("DELETE FROM runs WHERE id = ?", (catalog_runs[prefix][0],))
+        for prefix, files in sorted(tree_runs.items()):
+            settings_file_name = next(file_name for suffix, file_name in files.items() if strip_compression_extension(suffix) == sim_settings_suffix)
+            st = os.stat(settings_file_name)
+            run_id = catalog_runs[prefix][0] if prefix in catalog_runs else None
+            if run_id is None or catalog_runs[prefix][1:] != (st.st_size, st.st_mtime_ns):
+                sim_settings = load_sim_settings(settings_file_name)
+                misc_file_name = next((file_name for suffix, file_name in files.items() if strip_compression_extension(suffix) == "trace-misc.csv"), None)
+                trace_misc = load_trace_misc(misc_file_name) if misc_file_name else {}
+                if run_id is None:
+                    run_id = connection.execute("INSERT INTO runs (prefix) VALUES (?)", (prefix,)).lastrowid
+                connection.execute("UPDATE runs SET settingsSize = ?, settingsMtimeNs = ?, settings = ?, misc = ? WHERE id = ?",
+                                   (st.st_size, st.st_mtime_ns, json.dumps(sim_settings), json.dumps(trace_misc), run_id))
+                connection.execute("DELETE FROM runSettings WHERE runId = ?", (run_id,))
+                connection.executemany("INSERT INTO runSettings (runId, name, value) VALUES (?, ?, ?)",
+                                       [(run_id, name, value) for name, value in sorted(sim_settings.items()) + sorted(trace_misc.items())])
+                n_read += 1
+            connection.execute("DELETE FROM runFiles WHERE runId = ?", (run_id,))
+            connection.executemany("INSERT INTO runFiles (runId, suffix, fileName, bytes) VALUES (?, ?, ?, ?)",
+                                   [(run_id, suffix, file_name, os.path.getsize(file_name)) for suffix, file_name in sorted(files.items())])
+    return n_read
+
+# Returns the conditions "name=value" (e.g. from --where) as a dict name ->
+# value (a number when it is one)
+def parse_conditions(conditions):
+    parsed_conditions = {}
+    for condition in conditions:
+        name, separator, value = condition.partition('=')
+        if not separator:
+            raise ValueError("Invalid condition {}, expected NAME=VALUE".format(condition))
+        parsed_conditions[name] = parse_setting_value(value)
+    return parsed_conditions
+
+# Returns the runs in the catalog with the settings or misc counters in
+# conditions (a dict name -> value), as dicts with the prefix, settings, misc
+# counters and output files (suffix -> file name) of the run, in order of
+# prefix
+def find_runs(connection, conditions=None):
+    query = "SELECT id, prefix, settings, misc FROM runs"
+    parameters = []
+    if conditions:
+        query += " WHERE " + " AND ".join("id IN (SELECT runId FROM runSettings WHERE name = ? AND value = ?)" for name in conditions)
+        for name, value in conditions.items():
+            parameters.extend([name, value])
+    runs = []
+    for run_id, prefix, settings, misc in connection.execute(query + " ORDER BY prefix", parameters):
+        files = dict(connection.execute("SELECT suffix, fileName FROM runFiles WHERE runId = ?", (run_id,)))
+        runs.append({'prefix': prefix, 'settings': json.loads(settings), 'misc': json.loads(misc), 'files': files})
+    return runs
+
+# Returns the files with suffix trace_suffix (e.g. "trace-mac-packets.csv",
+# compressed or not) of the runs in the catalog with the settings in
+# conditions (see find_runs)
+def find_run_files(connection, trace_suffix, conditions=None):
+    return [file_name for run in find_runs(connection, conditions) for suffix, file_name in sorted(run['files'].items())
+            if strip_compression_extension(suffix) == trace_suffix]
+
+# Returns the trace files with suffix trace_suffix selected by the --catalog
+# and --where arguments of a parse script (see add_catalog_arguments)
+def get_catalog_trace_files(args, trace_suffix):
+    connection = open_run_catalog(args.catalog)
+    try:
+        return find_run_files(connection, trace_suffix, parse_conditions(args.where))
+    finally:
+        connection.close()
+
+# Add the --catalog and --where arguments to the parser of a parse script
+def add_catalog_arguments(parser):
+    parser.add_argument('--catalog', default=None, help='The run catalog (default: output/run-catalog.sqlite, see run_catalog.py)')
+    parser.add_argument('--where', nargs='+', default=None, metavar='NAME=VALUE', help='Also parse the traces of the runs in the run catalog with these settings')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Catalog the ns-3 lorawan simulations in an output tree and select them by their settings.')
+    parser.add_argument('--database', default=None, help='The run catalog (default: output/run-catalog.sqlite)')
+    parser.add_argument('--scan', nargs='+', default=[], metavar='DIR', help='Scan these output trees and update the catalog')
+    parser.add_argument('--where', nargs='*', default=[], metavar='NAME=VALUE', help='Only list the runs with these settings or misc counters')
+    parser.add_argument('--files', default=None, metavar='SUFFIX', help='List the output files with this suffix (e.g. trace-mac-packets.csv) of the runs instead of the runs')
+    args = parser.parse_args()
+
+    connection = open_run_catalog(args.database)
+    for root_dir in args.scan:
+        n_read = scan_output_tree(connection, root_dir)
+        print("Scanned {}: {} runs read".format(root_dir, n_read))
+    if args.files:
+        for file_name in find_run_files(connection, args.files, parse_conditions(args.where)):
+            print(file_name)
+    elif args.where or not args.scan:
+        for run in find_runs(connection, parse_conditions(args.where)):
+            print("{} {}".format(run['prefix'], " ".join("{}={}".format(name, value) for name, value in sorted(run['settings'].items()))))
@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+# Run metrics store: an SQLite database with the resource usage of every
+# simulation that was run (wall time, CPU time, peak RSS, output bytes per file
+# and the host it ran on), as reported by run_simulation. Written by the
+# dispatcher, see run_metrics_report.py for the scaling report.
+import json
+import os
+import sqlite3
+from ns3_command import cwd, parse_ns3_args
+
+run_metrics_file_name = os.path.join(cwd, "output", "run-metrics.sqlite")
+
+def open_run_metrics(file_name=None):
+    file_name = file_name or run_metrics_file_name
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    connection = sqlite3.connect(file_name)
+    connection.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, sweep TEXT, command TEXT, settings TEXT, host TEXT, "
+                       "startTime REAL, returncode INTEGER, wallTime REAL, cpuTime REAL, maxRss INTEGER, outputBytes INTEGER)")
+    connection.execute("CREATE TABLE IF NOT EXISTS runOutputFiles (runId INTEGER REFERENCES runs(id), suffix TEXT, bytes INTEGER)")
+    connection.execute("CREATE INDEX IF NOT EXISTS runsSweep ON runs (sweep)")
+    connection.commit()
+    return connection
+
+# Store the metrics of a run of command (the summary returned by
+# run_simulation) in the run metrics database
+def record_run_metrics(connection, command, summary, sweep=None):
+    settings = dict(parse_ns3_args(command))
+    output_bytes = summary.get('outputBytes', {})
+    with connection:
+        cursor = connection.execute("INSERT INTO runs (sweep, command, settings, host, startTime, returncode, wallTime, cpuTime, maxRss, outputBytes) "
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (sweep, command, json.dumps(settings), summary.get('host'), summary.get('startTime'), summary['returncode'],
+                                     summary['wallTime'], summary.get('cpuTime'), summary.get('maxRss'), sum(output_bytes.values())))
+        connection.executemany("INSERT INTO runOutputFiles (runId, suffix, bytes) VALUES (?, ?, ?)",
+                               [(cursor.lastrowid, suffix, size) for suffix, size in sorted(output_bytes.items())])
+
+# Returns the runs in the database (of sweep, when given) as dicts, with the
+# ns-3 arguments of the run in 'settings'
+def load_run_metrics(connection, sweep=None, successful_only=True):
+    query = "SELECT sweep, command, settings, host, startTime, returncode, wallTime, cpuTime, maxRss, outputBytes FROM runs"
+    conditions = []
+    parameters = []
+    if sweep is not None:
+        conditions.append("sweep = ?")
+        parameters.append(sweep)
+    if successful_only:
+        conditions.append("returncode = 0")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    runs = []
+    for row in connection.execute(query + " ORDER BY id", parameters):
+        run = dict(zip(['sweep', 'command', 'settings', 'host', 'startTime', 'returncode', 'wallTime', 'cpuTime', 'maxRss', 'outputBytes'], row))
+        run['settings'] = json.loads(run['settings'])
+        runs.append(run)
+    return runs
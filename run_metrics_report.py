@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# Print how the resource usage of the simulations scales with their settings,
+# per sweep, from the run metrics database (see run_metrics.py), e.g.
+#   python3 run_metrics_report.py --by nEndDevices
+#   python3 run_metrics_report.py --sweep drcalc --by nEndDevices usDataPeriod
+import argparse
+import math
+from run_metrics import open_run_metrics, load_run_metrics
+
+# Returns value as a number when possible, so groups are sorted numerically
+def setting_value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+# Returns the exponent b of the power law y = a*x^b fitted (least squares in
+# log-log space) to the points (x, y), None when there are too few points
+def fit_exponent(points):
+    points = [(math.log(x), math.log(y)) for x, y in points if isinstance(x, float) and x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, y in points) / len(points)
+    mean_y = sum(y for x, y in points) / len(points)
+    sxx = sum((x - mean_x)**2 for x, y in points)
+    if sxx == 0:
+        return None
+    return sum((x - mean_x)*(y - mean_y) for x, y in points) / sxx
+
+def print_report(runs, by):
+    groups = {}
+    for run in runs:
+        key = tuple(setting_value(run['settings'].get(name)) for name in by)
+        groups.setdefault(key, []).append(run)
+
+    format_string = "".join("{:>15}" for name in by) + "{:>8}{:>12}{:>12}{:>12}{:>12}"
+    print(format_string.format(*(by + ["Runs", "Wall (s)", "CPU (s)", "RSS (MB)", "Output (MB)"])))
+    curves = {'wallTime': [], 'maxRss': [], 'outputBytes': []}
+    for key in sorted(groups, key=lambda k: [(isinstance(v, str), v) for v in k]):
+        group = groups[key]
+        wall_time = sum(run['wallTime'] for run in group) / len(group)
+        cpu_time = sum(run['cpuTime'] or 0 for run in group) / len(group)
+        max_rss = max(run['maxRss'] or 0 for run in group)
+        output_bytes = sum(run['outputBytes'] or 0 for run in group) / len(group)
+        print(format_string.format(*(["{:g}".format(v) if isinstance(v, float) else str(v) for v in key] +
+                                     [len(group), "{:.1f}".format(wall_time), "{:.1f}".format(cpu_time), "{:.1f}".format(max_rss/1e6), "{:.1f}".format(output_bytes/1e6)])))
+        curves['wallTime'].append((key[0], wall_time))
+        curves['maxRss'].append((key[0], max_rss))
+        curves['outputBytes'].append((key[0], output_bytes))
+
+    # Scaling exponents, e.g. wall time ~ nEndDevices^1.3 (only meaningful when
+    # the other settings are the same for all runs):
+    if len(by) == 1:
+        for name, label in [('wallTime', "Wall time"), ('maxRss', "Peak RSS"), ('outputBytes', "Output bytes")]:
+            exponent = fit_exponent(curves[name])
+            if exponent is not None:
+                print("{} ~ {}^{:.2f}".format(label, by[0], exponent))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report the resource usage of the ns-3 lorawan simulations per sweep.')
+    parser.add_argument('--database', default=None, help='The run metrics database (default: output/run-metrics.sqlite)')
+    parser.add_argument('--sweep', default=None, help='Only report the runs of this sweep')
+    parser.add_argument('--by', nargs='+', default=['nEndDevices'], help='The simulation settings to group the runs by (default: nEndDevices)')
+    parser.add_argument('--all', dest='all', action='store_true', help='Include failed runs')
+    args = parser.parse_args()
+
+    connection = open_run_metrics(args.database)
+    runs = load_run_metrics(connection, args.sweep, successful_only=not args.all)
+    sweeps = sorted(set(run['sweep'] or "" for run in runs))
+    for sweep in sweeps:
+        sweep_runs = [run for run in runs if (run['sweep'] or "") == sweep]
+        print("\nSweep {} ({} runs):".format(sweep or "(none)", len(sweep_runs)))
+        print_report(sweep_runs, args.by)
@@ -3,17 +3,220 @@
 import subprocess
 import shlex
 import os
+import time
+import threading
+import shutil
+import tempfile
+import uuid
+import traceback
+import socket
 from celery import Celery
+from celery.signals import worker_init
+from ns3_command import get_ns3_arg, set_ns3_arg, ns3_root_dir, get_waf_program, parse_ns3_args, ns3_program_name, list_output_files
+from trace_io import available_compression_methods, compress_file, strip_compression_extension, load_sim_settings
+from ns3_staging import stage_ns3_program
+import trace_loader
+import parse_macpackets_trace
+import parse_phytx_trace
+import parse_nsdsmsgs_trace
 
 broker_uri = "pyamqp://guest@localhost//"
-app = Celery('run-simulations-celery', backend='rpc://', broker=broker_uri)
+# Results sent to the rpc:// backend can only be received by the dispatcher that
+# submitted the task. Use a persistent result backend (e.g.
+# "redis://node0:6379/0" or "db+sqlite:///results.sqlite") to be able to resume
+# a dispatcher (--resume) and reattach to the tasks it submitted.
+result_backend_uri = "rpc://"
+app = Celery('run-simulations-celery', backend=result_backend_uri, broker=broker_uri)
+# Workers only reserve the task they are running, so tasks are started in the
+# order they were dispatched (the dispatcher sends the longest tasks first):
+app.conf.worker_prefetch_multiplier = 1
 
-cwd = os.path.dirname(os.path.realpath(__file__))
-ns3_root_dir = cwd + "/.."
+use_staged_program = True # run a local copy of the ns-3 program instead of ./waf --run, see ns3_staging.py
+trace_compression = available_compression_methods()[0] # compression method of the CSV trace files of finished simulations (gzip, xz or zstd), None to keep them uncompressed
+scratch_dir = tempfile.gettempdir() # simulations write their output to a directory on this (local) disk, the completed output is moved to the shared output directory afterwards. None to write to the shared output directory directly
+max_log_size = 16*1024*1024 # max number of bytes stored per log file, the remaining output is counted but discarded
+# Parse scripts that are run on the worker when a simulation is run with
+# parse=True, per trace file suffix:
+trace_parsers = {"trace-mac-packets.csv": parse_macpackets_trace,
+                 "trace-phy-tx.csv": parse_phytx_trace,
+                 "trace-ns-dsmsgs.csv": parse_nsdsmsgs_trace}
 
-@app.task
-def run_simulation_task(command):
+# Copy everything read from pipe to log_file_name, keeping at most
+# max_log_size bytes. The total number of bytes read is stored in byte_count[0]
+def stream_to_log(pipe, log_file_name, byte_count):
+    with open(log_file_name, 'wb') as log_file:
+        for chunk in iter(lambda: pipe.read1(65536), b''):
+            if byte_count[0] < max_log_size:
+                log_file.write(chunk[:max_log_size - byte_count[0]])
+            byte_count[0] += len(chunk)
+        if byte_count[0] > max_log_size:
+            log_file.write("\n[log truncated, {} of {} bytes written]\n".format(max_log_size, byte_count[0]).encode('utf-8'))
+    pipe.close()
+
+@worker_init.connect
+def stage_ns3_program_on_worker_init(**kwargs):
+    if use_staged_program:
+        stage_ns3_program()
+
+# Returns the argv and environment to run command with. A waf command for
+# ns3_program_name is replaced by a direct invocation of the staged program with
+# the same ns-3 arguments.
+def get_simulation_argv(command):
+    if use_staged_program and get_waf_program(command) == ns3_program_name:
+        staged_program = stage_ns3_program() # also restages when ns-3 was rebuilt
+        if staged_program is not None:
+            program, lib_dir = staged_program
+            argv = [program] + ["--{}={}".format(name, value) for name, value in parse_ns3_args(command)]
+            env = dict(os.environ)
+            env['LD_LIBRARY_PATH'] = lib_dir + (":" + env['LD_LIBRARY_PATH'] if env.get('LD_LIBRARY_PATH') else "")
+            return argv, env
+    return shlex.split(command), None
+
+# Parse the trace files of the simulation with output file name prefix
+# output_file_name_prefix with the parse scripts in trace_parsers (or only the
+# ones named in parser_names). Returns a dict mapping the name of every parse
+# script (module) that was run to its output (see parse_trace_file of the parse
+# scripts). With cache=False the parsed columns are not cached (see
+# trace_loader), e.g. for traces that are compressed or removed right after.
+def parse_simulation_output(output_file_name_prefix, parser_names=None, cache=True):
+    parsed_outputs = {}
+    trace_cache = trace_loader.trace_cache
+    trace_loader.trace_cache = trace_cache and cache
+    try:
+        for output_file in list_output_files(output_file_name_prefix):
+            for trace_suffix, trace_parser in trace_parsers.items():
+                if parser_names is not None and trace_parser.__name__ not in parser_names:
+                    continue
+                if strip_compression_extension(output_file).endswith(trace_suffix):
+                    parsed_outputs[trace_parser.__name__] = trace_parser.parse_trace_file(os.path.join(ns3_root_dir, output_file))
+    finally:
+        trace_loader.trace_cache = trace_cache
+    return parsed_outputs
+
+# Move the output files of a simulation from the scratch directory to the
+# shared output directory output_file_name_prefix (a path). The files are first
+# copied to a hidden directory next to their destination, so copying over the
+# network can not leave a partial file in the output directory, and then
+# renamed into place one by one, with the sim-settings file last. The output
+# files of an earlier run with the same prefix are set aside while renaming.
+# When a rename fails, the files already moved are removed and the files they
+# replaced are restored, so the output directory is left as it was. Returns the
+# moved files.
+def move_output_files(scratch_file_name_prefix, output_file_name_prefix):
+    output_dir = os.path.dirname(output_file_name_prefix)
+    incoming_dir = os.path.join(output_dir, ".incoming-{}".format(uuid.uuid4().hex))
+    replaced_dir = os.path.join(incoming_dir, "replaced")
+    os.makedirs(replaced_dir)
+    scratch_files = list_output_files(scratch_file_name_prefix)
+    scratch_files.sort(key=lambda f: "sim-settings" in f) # the sim-settings file is moved last
+    moved_files = []
+    replaced_files = []
+    try:
+        for scratch_file in scratch_files:
+            shutil.copy2(scratch_file, incoming_dir)
+        try:
+            for scratch_file in scratch_files:
+                file_name = os.path.basename(output_file_name_prefix) + os.path.basename(scratch_file)[len(os.path.basename(scratch_file_name_prefix)):]
+                if os.path.exists(os.path.join(output_dir, file_name)):
+                    os.rename(os.path.join(output_dir, file_name), os.path.join(replaced_dir, file_name))
+                    replaced_files.append(file_name)
+                os.rename(os.path.join(incoming_dir, os.path.basename(scratch_file)), os.path.join(output_dir, file_name))
+                moved_files.append(os.path.join(output_dir, file_name))
+        except OSError:
+            for moved_file in reversed(moved_files):
+                os.remove(moved_file)
+            for file_name in replaced_files:
+                os.rename(os.path.join(replaced_dir, file_name), os.path.join(output_dir, file_name))
+            raise
+    finally:
+        shutil.rmtree(incoming_dir, ignore_errors=True)
+    return moved_files
+
+# Run the simulation command on this machine and return a summary of the run.
+# With parse set, the traces of the simulation are parsed right after the
+# simulation, while they are still on local disk and in the page cache, and the
+# output of the parse scripts and the settings of the simulation are added to
+# the summary (parsedOutputs and simSettings).
+def run_simulation(command, parse=False):
     print (command)
-    p = subprocess.Popen(shlex.split(command) , stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ns3_root_dir)
-    stdout,error = p.communicate()
-    return {"result":stdout.decode('utf-8'), "error":error.decode('utf-8')}
+    # stdout/stderr are streamed to log files next to the simulation output
+    # instead of being buffered in memory and sent through the result backend:
+    output_file_name_prefix = get_ns3_arg(command, 'outputFileNamePrefix', "simulations/output/simulation-{}".format(int(time.time()*1000)))
+    output_file_name_prefix = os.path.normpath(os.path.join(ns3_root_dir, output_file_name_prefix))
+    os.makedirs(os.path.dirname(output_file_name_prefix), exist_ok=True)
+    stdout_log = output_file_name_prefix + "-stdout.log"
+    stderr_log = output_file_name_prefix + "-stderr.log"
+
+    # The simulation writes its output to a local scratch directory, so the
+    # shared file system is not hit by many small writes and never contains
+    # the partial output of a crashed simulation:
+    simulation_scratch_dir = None
+    simulation_file_name_prefix = output_file_name_prefix
+    if scratch_dir and get_ns3_arg(command, 'outputFileNamePrefix'):
+        simulation_scratch_dir = tempfile.mkdtemp(prefix="lorawan-scratch-", dir=scratch_dir)
+        simulation_file_name_prefix = os.path.join(simulation_scratch_dir, os.path.basename(output_file_name_prefix))
+        command = set_ns3_arg(command, 'outputFileNamePrefix', simulation_file_name_prefix)
+
+    try:
+        argv, env = get_simulation_argv(command)
+        start_time = time.time()
+        p = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ns3_root_dir, env=env)
+        stdout_bytes = [0]
+        stderr_bytes = [0]
+        threads = [threading.Thread(target=stream_to_log, args=(p.stdout, stdout_log, stdout_bytes)),
+                   threading.Thread(target=stream_to_log, args=(p.stderr, stderr_log, stderr_bytes))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # wait4 instead of wait, to get the resource usage of the simulation:
+        pid, status, rusage = os.wait4(p.pid, 0)
+        returncode = p.returncode = os.waitstatus_to_exitcode(status)
+        wall_time = time.time() - start_time
+        output_bytes = {}
+        if get_ns3_arg(command, 'outputFileNamePrefix'):
+            for output_file in list_output_files(simulation_file_name_prefix):
+                output_bytes[os.path.basename(output_file)[len(os.path.basename(simulation_file_name_prefix)):]] = os.path.getsize(os.path.join(ns3_root_dir, output_file))
+
+        parsed_outputs = None
+        sim_settings = None
+        parse_error = None
+        if returncode == 0 and parse and get_ns3_arg(command, 'outputFileNamePrefix'):
+            try:
+                parsed_outputs = parse_simulation_output(simulation_file_name_prefix, cache=False) # the traces are compressed and moved next
+                sim_settings = next(load_sim_settings(os.path.join(ns3_root_dir, output_file)) for output_file in list_output_files(simulation_file_name_prefix)
+                                    if strip_compression_extension(output_file).endswith("sim-settings.txt"))
+            except Exception:
+                parse_error = traceback.format_exc()
+                print(parse_error)
+
+        # Compress the traces of a completed simulation, the parse scripts read
+        # compressed traces transparently:
+        compressed_files = []
+        if returncode == 0 and trace_compression and get_ns3_arg(command, 'outputFileNamePrefix'):
+            for output_file in list_output_files(simulation_file_name_prefix):
+                if output_file.endswith(".csv"):
+                    compressed_files.append(compress_file(os.path.join(ns3_root_dir, output_file), trace_compression))
+
+        output_files = []
+        if returncode == 0 and simulation_scratch_dir:
+            output_files = move_output_files(simulation_file_name_prefix, output_file_name_prefix)
+    finally:
+        if simulation_scratch_dir:
+            shutil.rmtree(simulation_scratch_dir, ignore_errors=True)
+
+    # Resource usage of the simulation: CPU time in seconds, peak RSS in bytes
+    # (ru_maxrss is in kilobytes on Linux) and the (uncompressed) size of every
+    # output file, by file name suffix (e.g. "-trace-mac-packets.csv"):
+    return {"returncode": returncode, "wallTime": wall_time, "startTime": start_time,
+            "cpuTime": rusage.ru_utime + rusage.ru_stime, "maxRss": rusage.ru_maxrss*1024,
+            "outputBytes": output_bytes, "host": socket.gethostname(),
+            "stdoutBytes": stdout_bytes[0], "stderrBytes": stderr_bytes[0],
+            "stdoutLog": stdout_log, "stderrLog": stderr_log,
+            "compressedFiles": [os.path.basename(f) for f in compressed_files], "outputFiles": output_files,
+            "parsedOutputs": parsed_outputs, "simSettings": sim_settings, "parseError": parse_error,
+            "outputFileNamePrefix": output_file_name_prefix}
+
+@app.task
+def run_simulation_task(command, parse=False):
+    return run_simulation(command, parse)
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# Parameter sweep engine: generates the ns-3 command lines of a sweep
+# specification file (see the sweeps folder).
+#
+# A sweep specification is a JSON object with the following keys:
+# * name: name of the sweep
+# * settings: default value of every simulation setting
+# * sweep: list of dimensions of the sweep, the first dimension is the
+#   outermost loop. A dimension is an object mapping setting names to lists of
+#   values. When a dimension has more than one setting, their lists are zipped,
+#   e.g. [{"nGateways": [1, 2, 4]}, {"usDataPeriod": [600, 6000], "totalTime": [60000, 600000]}]
+# * derived: settings computed from the other settings for every point, in
+#   order, e.g. {"nEndDevices": "100*k", "randomSeed": "randomSeedBase + (k-1)*nRuns"}
+# * outputFileNamePrefix: format string of the output file name prefix, e.g.
+#   "simulations/output/confirmed/LoRaWAN-confirmed-{usDataPeriod}-{nEndDevices}"
+# * args: the ns-3 arguments on the command line, in order
+# * blocks (optional): list of sub-sweeps. Every block is a specification
+#   itself, missing keys are taken from the top level specification and its
+#   settings are added to the top level settings.
+#
+# Points are generated lazily, so sweeps with a very large number of points
+# can be counted, listed and estimated without holding them in memory.
+import json
+import itertools
+from ns3_command import ns3_program_name
+
+block_keys = ['sweep', 'derived', 'outputFileNamePrefix', 'args']
+
+def load_sweep_spec(file_name):
+    with open(file_name) as spec_file:
+        return json.load(spec_file)
+
+# Returns the blocks of spec, with the defaults of the top level specification
+# filled in
+def get_sweep_blocks(spec):
+    blocks = []
+    for block in spec.get('blocks', [{}]):
+        b = {key: block.get(key, spec.get(key)) for key in block_keys}
+        b['settings'] = dict(spec.get('settings', {}))
+        b['settings'].update(block.get('settings', {}))
+        b['sweep'] = b['sweep'] or []
+        b['derived'] = b['derived'] or {}
+        blocks.append(b)
+    return blocks
+
+# Returns the values of every dimension of the sweep of block: a list of
+# lists of dicts (setting name -> value)
+def get_dimensions(block):
+    dimensions = []
+    for dimension in block['sweep']:
+        names = list(dimension)
+        lengths = set(len(dimension[name]) for name in names)
+        if len(lengths) != 1:
+            raise ValueError("Zipped settings {} have a different number of values".format(names))
+        dimensions.append([dict(zip(names, values)) for values in zip(*[dimension[name] for name in names])])
+    return dimensions
+
+# Returns the number of points in the sweep without generating them
+def count_sweep_points(spec):
+    count = 0
+    for block in get_sweep_blocks(spec):
+        n = 1
+        for dimension in get_dimensions(block):
+            n *= len(dimension)
+        count += n
+    return count
+
+# Build the waf command line that runs the simulation of point
+def build_command(point, args):
+    ns3_args = " ".join("--{}={}".format(name, point[name]) for name in args)
+    return "./waf --run={} --command-template=\"%s {}\"".format(ns3_program_name, ns3_args)
+
+# Returns the point of block with the given values of the swept settings (a
+# list of dicts, setting name -> value): the dict of settings of the point
+# (including outputFileNamePrefix and the derived settings) and its command line
+def make_sweep_point(block, values):
+    point = dict(block['settings'])
+    for value in values:
+        point.update(value)
+    for name, expression in block['derived'].items():
+        point[name] = eval(expression, {"__builtins__": {}}, point)
+    point['outputFileNamePrefix'] = block['outputFileNamePrefix'].format(**point)
+    return point, build_command(point, block['args'])
+
+# Generate the points of the sweep, one dict of settings per point (including
+# outputFileNamePrefix and the derived settings) and its command line
+def iter_sweep_points(spec):
+    for block in get_sweep_blocks(spec):
+        for values in itertools.product(*get_dimensions(block)):
+            yield make_sweep_point(block, values)
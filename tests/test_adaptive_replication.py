@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# Checks the statistics of adaptive replication and its waves, with a fake
+# dispatcher that returns the PDR of every replica from a table
+import contextlib
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import adaptive_replication
+from adaptive_replication import t_quantile, confidence_interval, replica_command, get_metric, run_adaptive_replication
+from ns3_command import get_ns3_arg
+
+# Returns the command of the sweep point with output file name prefix name
+def make_command(name):
+    return './waf --run=lorawan-example-tracing --command-template="%s --randomSeed=12345 --outputFileNamePrefix=simulations/output/test/{}"'.format(name)
+
+# Returns the output of parse_macpackets_trace with a PDR of pdr
+def make_parsed_outputs(pdr):
+    return {'parse_macpackets_trace': {'simulationCompact': ("<nEndDevices>,<PDR>\n", ["100,{}\n".format(pdr)])}}
+
+class AdaptiveReplicationTest(unittest.TestCase):
+    def test_statistics(self):
+        # two-sided 95% quantiles of the Student t distribution
+        for degrees_of_freedom, quantile in [(1, 12.7062), (2, 4.3027), (4, 2.7764), (9, 2.2622), (100, 1.9840)]:
+            self.assertAlmostEqual(t_quantile(0.975, degrees_of_freedom), quantile, places=4)
+        mean, std_dev, half_width = confidence_interval([0.8, 0.9, 1.0], 0.95)
+        self.assertAlmostEqual(mean, 0.9)
+        self.assertAlmostEqual(std_dev, 0.1)
+        self.assertAlmostEqual(half_width, 4.3027 * 0.1 / 3**0.5, places=4)
+        self.assertEqual(confidence_interval([0.5], 0.95), (0.5, 0.0, float('inf')))
+
+    def test_replica_command(self):
+        command = make_command("LoRaWAN-test-100")
+        self.assertEqual(replica_command(command, 0, 1000), command)
+        self.assertEqual(get_ns3_arg(replica_command(command, 2, 1000), 'randomSeed'), "14345")
+        self.assertEqual(get_ns3_arg(replica_command(command, 2, 1000), 'outputFileNamePrefix'), "simulations/output/test/LoRaWAN-test-100_2")
+        with self.assertRaises(ValueError):
+            replica_command('./waf --run=lorawan-example-tracing --command-template="%s --nEndDevices=100"', 1, 1000)
+        self.assertEqual(get_metric(make_parsed_outputs(0.75), "parse_macpackets_trace:simulationCompact:PDR"), 0.75)
+        self.assertIsNone(get_metric({}, "parse_macpackets_trace:simulationCompact:PDR"))
+
+    def test_run_adaptive_replication(self):
+        # PDR of every replica (output file name prefix) of 3 points, None for
+        # a simulation that fails
+        pdrs = {"steady": 0.9, "steady_1": 0.9, "steady_2": 0.9,
+                "noisy": 0.5, "noisy_1": 0.9, "noisy_2": 0.6, "noisy_3": 0.8, "noisy_4": 0.55, "noisy_5": 0.85,
+                "failing": None, "failing_1": 0.7, "failing_2": 0.7, "failing_3": 0.7, "failing_4": 0.7}
+        waves = []
+        def dispatch_simulation_tasks(commands, parse=False, **dispatch_args):
+            self.assertTrue(parse)
+            waves.append([os.path.basename(get_ns3_arg(command, 'outputFileNamePrefix')) for command in commands])
+            results = {}
+            for j, name in enumerate(waves[-1]):
+                results[j] = {'returncode': 1 if pdrs[name] is None else 0, 'parsedOutputs': None if pdrs[name] is None else make_parsed_outputs(pdrs[name])}
+            return results
+
+        with mock.patch.object(adaptive_replication, 'dispatch_simulation_tasks', dispatch_simulation_tasks), contextlib.redirect_stdout(io.StringIO()):
+            points = run_adaptive_replication([make_command("steady"), make_command("noisy"), make_command("failing")], 0.1, min_seeds=3, max_seeds=6, wave_size=2)
+        # the steady point converges after the first wave, the noisy one stops
+        # at max_seeds, the failed replica of the last one is not a value
+        self.assertEqual(waves, [["steady", "steady_1", "steady_2", "noisy", "noisy_1", "noisy_2", "failing", "failing_1", "failing_2"],
+                                 ["noisy_3", "noisy_4", "failing_3", "failing_4"],
+                                 ["noisy_5"]])
+        self.assertEqual([point['values'] for point in points], [[0.9] * 3, [0.5, 0.9, 0.6, 0.8, 0.55, 0.85], [0.7] * 4])
+        self.assertEqual([point['converged'] for point in points], [True, False, True])
+        self.assertAlmostEqual(points[1]['mean'], 0.7)
+        self.assertEqual(points[2]['failed'], 1)
+
+    def test_dispatch_and_measure(self):
+        # the commands that were skipped (completed earlier) are parsed here, a
+        # parse that fails counts as a failed simulation
+        commands = [make_command(name) for name in ["ok", "lost", "failing", "skipped", "removed"]]
+        results = {0: {'returncode': 0, 'parsedOutputs': make_parsed_outputs(0.8)}, 1: RuntimeError("lost"), 2: {'returncode': 1, 'parsedOutputs': None}}
+        def parse_simulation_output(prefix, module_names):
+            if prefix.endswith("removed"):
+                raise FileNotFoundError(prefix)
+            return make_parsed_outputs(0.6)
+        with mock.patch.object(adaptive_replication, 'dispatch_simulation_tasks', lambda commands, parse=False, **dispatch_args: results), \
+             mock.patch.object(adaptive_replication, 'parse_simulation_output', parse_simulation_output), contextlib.redirect_stdout(io.StringIO()) as printed:
+            values = adaptive_replication.dispatch_and_measure(commands, adaptive_replication.default_metric)
+        self.assertEqual(values, [0.8, None, None, 0.6, None])
+        self.assertIn("Parsing the traces of {} has failed".format(commands[4]), printed.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
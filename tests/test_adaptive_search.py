@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# Checks the golden section search over a swept setting, with a fake
+# dispatcher whose metric has a known maximum
+import contextlib
+import io
+import math
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import adaptive_search
+from adaptive_search import golden_section_search, get_searches, run_adaptive_search, write_search_output
+from ns3_command import get_ns3_arg
+from sweep import load_sweep_spec
+
+repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Returns the positions a golden section search evaluates to find the maximum
+# of f over [low, high], and the position of the best successful evaluation
+def search_maximum(f, low, high, tolerance):
+    search = golden_section_search(low, high, tolerance)
+    evaluated = {}
+    positions = next(search)
+    try:
+        while True:
+            evaluated.update((position, f(position)) for position in positions)
+            positions = search.send([evaluated[position] for position in positions])
+    except StopIteration:
+        pass
+    return list(evaluated), max((position for position in evaluated if evaluated[position] is not None), key=evaluated.get)
+
+class AdaptiveSearchTest(unittest.TestCase):
+    def test_golden_section_search(self):
+        positions, best = search_maximum(lambda x: -(x - 0.3)**2, 0.0, 1.0, 0.01)
+        self.assertAlmostEqual(best, 0.3, delta=0.01)
+        self.assertEqual(len(positions), 12) # 2, then 1 per step: 0.618^10 < 0.01
+        # failed evaluations (None) count as the lowest values
+        positions, best = search_maximum(lambda x: None if x < 0.5 else -(x - 0.3)**2, 0.0, 1.0, 0.01)
+        self.assertAlmostEqual(best, 0.5, delta=0.01)
+
+    def test_get_searches(self):
+        spec = load_sweep_spec(os.path.join(repository_dir, "sweeps", "drcalc.json"))
+        searches = get_searches(spec, 'drCalcPerLimit')
+        # only the block of drCalcMethodIndex 0 sweeps drCalcPerLimit, one
+        # search per nEndDevices
+        self.assertEqual([search['fixed'] for search in searches], [[{'k': k}] for k in [1, 5, 10, 50, 100]])
+        self.assertEqual(searches[0]['range'], (0.001, 0.9))
+        with self.assertRaises(ValueError):
+            get_searches({'sweep': [{'drCalcPerLimit': [0.1, 0.01], 'k': [1, 2]}]}, 'drCalcPerLimit')
+
+    def test_run_adaptive_search(self):
+        # the PDR is highest at drCalcPerLimit 0.01 for 100 end devices and
+        # 0.1 for 500 end devices
+        best_limits = {'100': 0.01, '500': 0.1}
+        spec = load_sweep_spec(os.path.join(repository_dir, "sweeps", "drcalc.json"))
+        spec['blocks'] = spec['blocks'][:1]
+        spec['blocks'][0]['sweep'] = [{'drCalcPerLimit': [0.9, 0.001]}, {'k': [1, 5]}]
+        def dispatch_and_measure(commands, metric, **dispatch_args):
+            return [1.0 - (math.log10(float(get_ns3_arg(command, 'drCalcPerLimit'))) - math.log10(best_limits[get_ns3_arg(command, 'nEndDevices')]))**2 / 10
+                    for command in commands]
+        with mock.patch.object(adaptive_search, 'dispatch_and_measure', dispatch_and_measure), contextlib.redirect_stdout(io.StringIO()):
+            searches = run_adaptive_search(spec, 'drCalcPerLimit', tolerance=0.1)
+        for search, n_end_devices in zip(searches, ['100', '500']):
+            self.assertLess(abs(math.log10(search['best'][0] / best_limits[n_end_devices])), 0.1)
+            self.assertLessEqual(len(search['evaluations']), 10)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            write_search_output(searches, 'drCalcPerLimit', os.path.join(temp_dir, "search.csv"))
+            with open(os.path.join(temp_dir, "search.csv")) as output_file:
+                lines = output_file.read().splitlines()
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertEqual(lines[0], "<k>,<drCalcPerLimit>,<PDR>,<best>")
+        self.assertEqual(len(lines), 1 + sum(len(search['evaluations']) for search in searches))
+        self.assertEqual([line.split(',')[0] for line in lines[1:] if line.endswith(",1")], ['1', '5'])
+
+    def test_not_swept(self):
+        spec = load_sweep_spec(os.path.join(repository_dir, "sweeps", "confirmed.json"))
+        with self.assertRaises(ValueError):
+            run_adaptive_search(spec, 'drCalcPerLimit')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+# Checks that the completion manifest only reports a simulation as completed
+# while all of its recorded output files are still there
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from completion_manifest import load_manifest, is_completed, record_completion
+
+class CompletionManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.manifest_file_name = os.path.join(self.temp_dir, "output", "completion-manifest.jsonl")
+        self.prefix = os.path.join(self.temp_dir, "LoRaWAN-test-100")
+        self.command = './waf --run=lorawan-example-tracing --command-template="%s --nEndDevices=100 --outputFileNamePrefix={}"'.format(self.prefix)
+        for suffix, contents in [("-sim-settings.txt", "nEndDevices = 100\n"), ("-trace-mac-packets.csv", "time\n1.0\n")]:
+            with open(self.prefix + suffix, 'w') as output_file:
+                output_file.write(contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_record_completion(self):
+        self.assertEqual(load_manifest(self.manifest_file_name), {})
+        record_completion("fingerprint1", self.command, {'wallTime': 12.5}, self.manifest_file_name)
+        manifest = load_manifest(self.manifest_file_name)
+        self.assertEqual(manifest['fingerprint1']['command'], self.command)
+        self.assertEqual(manifest['fingerprint1']['wallTime'], 12.5)
+        self.assertEqual(manifest['fingerprint1']['outputFiles'], {self.prefix + "-sim-settings.txt": 18, self.prefix + "-trace-mac-packets.csv": 9})
+        self.assertTrue(is_completed(manifest, "fingerprint1"))
+        self.assertFalse(is_completed(manifest, "fingerprint2"))
+
+    def test_changed_output_files(self):
+        record_completion("fingerprint1", self.command, {'wallTime': 12.5}, self.manifest_file_name)
+        with open(self.prefix + "-trace-mac-packets.csv", 'a') as output_file:
+            output_file.write("2.0\n")
+        self.assertFalse(is_completed(load_manifest(self.manifest_file_name), "fingerprint1"))
+        os.remove(self.prefix + "-trace-mac-packets.csv")
+        self.assertFalse(is_completed(load_manifest(self.manifest_file_name), "fingerprint1"))
+
+    def test_missing_sim_settings(self):
+        # a simulation that did not write its sim-settings file never completed
+        os.remove(self.prefix + "-sim-settings.txt")
+        record_completion("fingerprint1", self.command, {'wallTime': 12.5}, self.manifest_file_name)
+        self.assertFalse(is_completed(load_manifest(self.manifest_file_name), "fingerprint1"))
+
+    def test_partial_last_line(self):
+        record_completion("fingerprint1", self.command, {'wallTime': 12.5}, self.manifest_file_name)
+        record_completion("fingerprint1", self.command, {'wallTime': 14.0}, self.manifest_file_name)
+        with open(self.manifest_file_name, 'a') as manifest_file:
+            manifest_file.write('{"fingerprint": "fingerprint2", "comm')
+        manifest = load_manifest(self.manifest_file_name)
+        self.assertEqual(list(manifest), ["fingerprint1"])
+        self.assertEqual(manifest['fingerprint1']['wallTime'], 14.0) # the latest record
+
+    def test_no_output_prefix(self):
+        record_completion("fingerprint1", "./waf --run=lorawan-example-tracing", {'wallTime': 1.0}, self.manifest_file_name)
+        self.assertFalse(os.path.exists(self.manifest_file_name))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# Checks the cost model used to dispatch the longest simulations first
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cost_model import prior_coefficients, cost_features, solve_linear_system, calibrate, estimate_cost
+
+# Returns the waf command of a simulation with the given ns-3 arguments
+def make_command(**ns3_args):
+    return './waf --run=lorawan-example-tracing --command-template="%s {}"'.format(" ".join("--{}={}".format(name, value) for name, value in ns3_args.items()))
+
+class CostModelTest(unittest.TestCase):
+    def test_cost_features(self):
+        features = cost_features(make_command(nEndDevices=1000, nGateways=4, totalTime=600000, usDataPeriod=600, traceMacPackets=1, tracePhyTransmissions=1, traceMisc=0))
+        for value, expected in zip(features, [1.0, math.log(1000), math.log(1000), math.log(4), 2.0]):
+            self.assertAlmostEqual(value, expected)
+        # settings that are not on the command line have their ns-3 default
+        self.assertEqual(cost_features(make_command()), [1.0, 0.0, 0.0, 0.0, 0.0])
+
+    def test_solve_linear_system(self):
+        x = solve_linear_system([[0.0, 2.0, 1.0], [1.0, 1.0, 0.0], [3.0, 0.0, 1.0]], [7.0, 3.0, 6.0]) # needs a row swap
+        for value, expected in zip(x, [1.0, 2.0, 3.0]):
+            self.assertAlmostEqual(value, expected)
+
+    def test_calibrate(self):
+        # without recorded runs (or with runs that follow the prior model) the
+        # model is the prior model
+        self.assertEqual([round(b, 9) for b in calibrate([])], prior_coefficients)
+        commands = [make_command(nEndDevices=n, nGateways=g, totalTime=t, usDataPeriod=600) for n in [100, 1000, 10000] for g in [1, 4] for t in [6000, 600000]]
+        run_times = [(command, estimate_cost(command)) for command in commands]
+        for b, expected in zip(calibrate(run_times), prior_coefficients):
+            self.assertAlmostEqual(b, expected)
+
+        # many runs that scale quadratically in the number of end devices
+        # move the fit away from the prior
+        true_coefficients = [-2.0, 2.0, 1.0, 0.5, 0.25]
+        coefficients = calibrate([(command, estimate_cost(command, true_coefficients)) for command in commands * 20])
+        self.assertAlmostEqual(coefficients[1], 2.0, delta=0.05)
+        self.assertLess(abs(math.log(estimate_cost(commands[-1], coefficients) / estimate_cost(commands[-1], true_coefficients))), 0.2)
+
+    def test_longest_first_order(self):
+        # dispatch_simulation_tasks sorts by decreasing estimated cost
+        commands = [make_command(nEndDevices=100, totalTime=6000, usDataPeriod=600), make_command(nEndDevices=1000, totalTime=600000, usDataPeriod=600),
+                    make_command(nEndDevices=1000, totalTime=6000, usDataPeriod=600), make_command(nEndDevices=100, totalTime=6000, usDataPeriod=600, nGateways=8)]
+        coefficients = calibrate([])
+        order = sorted(range(len(commands)), key=lambda i: estimate_cost(commands[i], coefficients), reverse=True)
+        self.assertEqual(order, [1, 2, 3, 0])
+
+if __name__ == '__main__':
+    unittest.main()
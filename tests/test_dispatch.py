@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+# Checks dispatch_simulation_tasks with the local backend, and with the celery
+# backend with the tasks run by the dispatcher (stubbed apply_async and
+# ResultSet.join_native), on shell commands that stand in for ns-3: they write
+# a sim-settings file for their outputFileNamePrefix and exit with the given
+# exit code, or copy the fixture simulation in tests/data
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import completion_manifest
+import run_metrics
+import simulation_tasks
+import utils
+from celery.result import ResultSet
+from completion_manifest import load_manifest
+from dispatch_journal import load_journal
+from utils import dispatch_simulation_tasks, iter_dispatch_order
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Returns a command that writes <prefix>-sim-settings.txt and exits with
+# returncode
+def make_command(prefix, returncode=0):
+    return "sh -c 'p=${{0#*=}}; echo nEndDevices = 1 > $p-sim-settings.txt; echo simulated; exit {}' --outputFileNamePrefix={}".format(returncode, prefix)
+
+# Returns a command that copies the output files of the fixture simulation to
+# the output files of prefix
+def make_fixture_command(prefix):
+    return "sh -c 'p=${{0#*=}}; for f in {}/LoRaWAN-fixture-*; do cp $f $p-${{f##*fixture-}}; done' --outputFileNamePrefix={}".format(data_dir, prefix)
+
+class DispatchTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.patches = [mock.patch.object(completion_manifest, 'manifest_file_name', os.path.join(self.temp_dir, "completion-manifest.jsonl")),
+                        mock.patch.object(run_metrics, 'run_metrics_file_name', os.path.join(self.temp_dir, "run-metrics.sqlite")),
+                        mock.patch.object(simulation_tasks, 'use_staged_program', False)]
+        for patch in self.patches:
+            patch.start()
+        self.commands = [make_command(os.path.join(self.temp_dir, "sim-{}".format(i)), returncode) for i, returncode in enumerate([0, 3, 0])]
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def dispatch(self, *args, **kwargs):
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            result = dispatch_simulation_tasks(*args, **kwargs)
+        return result, printed.getvalue()
+
+    # Dispatch with the celery backend: apply_async runs the task right away
+    # (checking that it was journaled before) and join_native hands the
+    # results to the callback in order of submission
+    def dispatch_celery(self, *args, **kwargs):
+        values = {}
+        journal_file_name = kwargs.get('journal_file_name')
+        def apply_async(args, task_id):
+            if journal_file_name:
+                self.assertEqual(load_journal(journal_file_name)[args[0]]['taskId'], task_id)
+            values[task_id] = simulation_tasks.run_simulation(*args)
+            return mock.Mock(id=task_id)
+        def join_native(result_set, callback, propagate):
+            for result in result_set.results:
+                callback(result.id, values[result.id])
+        with mock.patch.object(simulation_tasks.run_simulation_task, 'apply_async', apply_async), \
+             mock.patch.object(ResultSet, 'supports_native_join', True), \
+             mock.patch.object(ResultSet, 'join_native', join_native):
+            return self.dispatch(*args, backend='celery', **kwargs)
+
+    def test_local_backend(self):
+        result, printed = self.dispatch(self.commands, backend='local', processes=2)
+        self.assertIn("Simulation exited with a non-zero exit code, see {}".format(os.path.join(self.temp_dir, "sim-1-stderr.log")), printed)
+        with open(os.path.join(self.temp_dir, "sim-0-stdout.log")) as log_file:
+            self.assertEqual(log_file.read(), "simulated\n")
+        # only the successful simulations are recorded as completed, and
+        # skipped by the next dispatch
+        self.assertEqual(sorted(record['command'] for record in load_manifest().values()), [self.commands[0], self.commands[2]])
+        result, printed = self.dispatch(self.commands, backend='local', processes=2)
+        self.assertEqual(printed.count("Skipping (already completed)"), 2)
+        self.assertEqual(printed.count("has completed"), 1)
+        result, printed = self.dispatch(self.commands, skip_completed=False, backend='local', processes=2)
+        self.assertEqual(printed.count("has completed"), 3)
+
+    def test_celery_backend(self):
+        journal_file_name = os.path.join(self.temp_dir, "test.journal.jsonl")
+        result, printed = self.dispatch_celery(self.commands, journal_file_name=journal_file_name)
+        self.assertEqual([result[i]['returncode'] for i in range(3)], [0, 3, 0])
+        self.assertEqual(printed.count("has completed"), 3)
+        self.assertEqual([load_journal(journal_file_name)[command]['status'] for command in self.commands], ['completed', 'failed', 'completed'])
+        self.assertEqual(sorted(record['command'] for record in load_manifest().values()), [self.commands[0], self.commands[2]])
+
+    def test_dispatch_order(self):
+        # the commands are ordered by decreasing estimated cost per window
+        # of dispatch_window commands, which are read from the iterable as
+        # they are dispatched
+        commands = ["./simulation --nEndDevices={} --outputFileNamePrefix=sim-{}".format(n, i) for i, n in enumerate([10, 1000, 100, 10000, 1])]
+        read = []
+        def iter_commands():
+            for command in commands:
+                read.append(command)
+                yield command
+        with mock.patch.object(utils, 'dispatch_window', 2):
+            order = iter_dispatch_order(iter_commands())
+            self.assertEqual(next(order)[0], 1)
+            self.assertEqual(len(read), 2)
+            self.assertEqual([i for i, command, cost in order], [0, 3, 2, 4])
+        self.assertEqual([i for i, command, cost in iter_dispatch_order(iter(commands), longest_first=False)], [0, 1, 2, 3, 4])
+
+    def test_generator(self):
+        # a generator of commands, with the number of commands for the
+        # progress messages
+        result, printed = self.dispatch((command for command in self.commands), backend='local', processes=2, num_commands=3)
+        self.assertEqual([result[i]['returncode'] for i in range(3)], [0, 3, 0])
+        self.assertIn("/3 has completed (3/", printed)
+
+    def test_resume(self):
+        journal_file_name = os.path.join(self.temp_dir, "test.journal.jsonl")
+        self.dispatch(self.commands, skip_completed=False, backend='local', processes=2, journal_file_name=journal_file_name)
+        # the resumed dispatcher only runs the command that failed
+        result, printed = self.dispatch(self.commands, skip_completed=False, backend='local', processes=2, journal_file_name=journal_file_name, resume=True)
+        self.assertEqual(printed.count("Skipping (already completed)"), 2)
+        self.assertIn("has completed (1/1 done, exit code 3", printed)
+        self.assertEqual(load_journal(journal_file_name)[self.commands[1]]['status'], 'failed')
+
+    def test_parse(self):
+        # the traces are parsed by the worker, the dispatcher writes the
+        # output files of the parse scripts
+        for backend in ['local', 'celery']:
+            with self.subTest(backend=backend):
+                parse_output_dir = os.path.join(self.temp_dir, "parsed-" + backend)
+                commands = [make_fixture_command(os.path.join(self.temp_dir, "fixture-" + backend))]
+                if backend == 'local':
+                    self.dispatch(commands, backend='local', processes=1, parse=True, parse_output_dir=parse_output_dir)
+                else:
+                    self.dispatch_celery(commands, parse=True, parse_output_dir=parse_output_dir)
+                self.check_parse_outputs(parse_output_dir)
+
+    def check_parse_outputs(self, parse_output_dir):
+        output_file_names = sorted(file_name for trace_parser in simulation_tasks.trace_parsers.values() for file_name in trace_parser.output_file_names.values())
+        self.assertEqual(sorted(file_name for file_name in os.listdir(parse_output_dir) if file_name.endswith(".csv")), output_file_names)
+        for file_name in output_file_names:
+            with open(os.path.join(parse_output_dir, file_name)) as output_file, open(os.path.join(data_dir, "expected", file_name)) as expected_file:
+                self.assertEqual(output_file.read(), expected_file.read(), file_name)
+
+if __name__ == '__main__':
+    unittest.main()
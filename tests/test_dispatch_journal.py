@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# Checks the dispatcher journal: the state of every command after a crash of
+# the dispatcher, including a partially written last record
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dispatch_journal import open_journal, write_journal_event, load_journal
+
+class DispatchJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.journal_file_name = os.path.join(self.temp_dir, "output", "test.journal.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read_events(self):
+        with open(self.journal_file_name) as journal_file:
+            return [json.loads(line)['event'] for line in journal_file]
+
+    def test_load_journal(self):
+        self.assertEqual(load_journal(self.journal_file_name), {})
+        with open_journal(self.journal_file_name, False) as journal_file:
+            for task_id, command in [("t1", "command1"), ("t2", "command2"), ("t3", "command3")]:
+                write_journal_event(journal_file, "submitted", taskId=task_id, index=0, command=command)
+            write_journal_event(journal_file, "completed", taskId="t1", returncode=0, wallTime=1.0)
+            write_journal_event(journal_file, "failed", taskId="t2", error="worker lost")
+        self.assertEqual(load_journal(self.journal_file_name), {"command1": {'taskId': "t1", 'status': 'completed'},
+                                                                "command2": {'taskId': "t2", 'status': 'failed'},
+                                                                "command3": {'taskId': "t3", 'status': 'submitted'}})
+
+        # a resumed dispatcher resubmits the failed command: the state of the
+        # latest task counts, also when an earlier task of the command
+        # completes afterwards
+        with open_journal(self.journal_file_name, True) as journal_file:
+            write_journal_event(journal_file, "submitted", taskId="t4", index=1, command="command2")
+            write_journal_event(journal_file, "reattached", taskId="t3", index=2, command="command3")
+            write_journal_event(journal_file, "completed", taskId="t2", returncode=0, wallTime=1.0)
+            write_journal_event(journal_file, "completed", taskId="t3", returncode=0, wallTime=1.0)
+        journal = load_journal(self.journal_file_name)
+        self.assertEqual(journal["command2"], {'taskId': "t4", 'status': 'submitted'})
+        self.assertEqual(journal["command3"], {'taskId': "t3", 'status': 'completed'})
+        self.assertEqual(self.read_events()[0], "start")
+        self.assertEqual(self.read_events()[6], "resume")
+
+    def test_partial_last_record(self):
+        with open_journal(self.journal_file_name, False) as journal_file:
+            write_journal_event(journal_file, "submitted", taskId="t1", index=0, command="command1")
+            journal_file.write('{"event": "completed", "taskId": "t1", "retur')
+        self.assertEqual(load_journal(self.journal_file_name)["command1"]['status'], 'submitted')
+        # the partial record is terminated when the journal is reopened
+        with open_journal(self.journal_file_name, True) as journal_file:
+            write_journal_event(journal_file, "completed", taskId="t1", returncode=0, wallTime=1.0)
+        self.assertEqual(load_journal(self.journal_file_name)["command1"]['status'], 'completed')
+
+if __name__ == '__main__':
+    unittest.main()
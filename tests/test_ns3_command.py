@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+# Checks the parsing of ns-3 command lines and the lookup of output files in
+# ns3_command.py
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ns3_command import parse_ns3_args, get_waf_program, get_ns3_arg, canonical_ns3_args, command_fingerprint, list_output_files
+
+command = './waf --run=lorawan-example-tracing --command-template="%s --randomSeed=12345 --nEndDevices=100 --outputFileNamePrefix=simulations/output/LoRaWAN-test-100"'
+
+class Ns3CommandTest(unittest.TestCase):
+    def test_parse_ns3_args(self):
+        self.assertEqual(parse_ns3_args(command), [('randomSeed', '12345'), ('nEndDevices', '100'), ('outputFileNamePrefix', 'simulations/output/LoRaWAN-test-100')])
+        self.assertEqual(parse_ns3_args('./waf --run="lorawan-example-tracing --nGateways=2"'), [('nGateways', '2')])
+        self.assertEqual(get_ns3_arg(command, 'nEndDevices'), '100')
+        self.assertEqual(get_ns3_arg(command, 'nGateways', '1'), '1')
+
+    def test_get_waf_program(self):
+        self.assertEqual(get_waf_program(command), 'lorawan-example-tracing')
+        self.assertEqual(get_waf_program('../waf --run="lorawan-example-tracing --nGateways=2"'), 'lorawan-example-tracing')
+        self.assertIsNone(get_waf_program('build/scratch/lorawan-example-tracing --nGateways=2'))
+
+    def test_fingerprint(self):
+        # the order of the arguments does not matter, their values and the
+        # build do
+        reordered = './waf --run=lorawan-example-tracing --command-template="%s --nEndDevices=100 --outputFileNamePrefix=simulations/output/LoRaWAN-test-100 --randomSeed=12345"'
+        self.assertEqual(canonical_ns3_args(command), canonical_ns3_args(reordered))
+        self.assertEqual(command_fingerprint(command, "build1"), command_fingerprint(reordered, "build1"))
+        self.assertNotEqual(command_fingerprint(command, "build1"), command_fingerprint(command, "build2"))
+        self.assertNotEqual(command_fingerprint(command, "build1"), command_fingerprint(command.replace("12345", "12346"), "build1"))
+
+    def test_list_output_files(self):
+        # not the logs, nor the files of other simulations whose prefix starts
+        # with the same characters (e.g. replica 1 or 1000 end devices)
+        output_dir = tempfile.mkdtemp()
+        try:
+            for file_name in ["LoRaWAN-test-100-sim-settings.txt", "LoRaWAN-test-100-trace-mac-packets.csv", "LoRaWAN-test-100_1-sim-settings.txt",
+                              "LoRaWAN-test-100-stdout.log", "LoRaWAN-test-1000-sim-settings.txt", "LoRaWAN-test-10-sim-settings.txt"]:
+                open(os.path.join(output_dir, file_name), 'w').close()
+            self.assertEqual(list_output_files(os.path.join(output_dir, "LoRaWAN-test-100")),
+                             [os.path.join(output_dir, file_name) for file_name in ["LoRaWAN-test-100-sim-settings.txt", "LoRaWAN-test-100-trace-mac-packets.csv"]])
+            self.assertEqual(list_output_files(os.path.join(output_dir, "missing", "LoRaWAN-test-100")), [])
+        finally:
+            shutil.rmtree(output_dir)
+
+if __name__ == '__main__':
+    unittest.main()
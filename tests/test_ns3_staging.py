@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+# Checks the staging of the ns-3 program on local disk and the command lines
+# of staged simulations
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ns3_command
+import ns3_staging
+import simulation_tasks
+
+class StagingTest(unittest.TestCase):
+    def setUp(self):
+        # a fake ns-3 build: the program and a shared library
+        self.temp_dir = tempfile.mkdtemp()
+        self.ns3_root_dir = os.path.join(self.temp_dir, "ns-3")
+        self.program = os.path.join(self.ns3_root_dir, "build", "scratch", "ns3-dev-" + ns3_command.ns3_program_name + "-debug")
+        self.library = os.path.join(self.ns3_root_dir, "build", "lib", "libns3-dev-lorawan-debug.so")
+        for file_name in [self.program, self.library]:
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            with open(file_name, 'w') as build_file:
+                build_file.write("#!/bin/sh\n")
+        os.chmod(self.program, 0o755)
+        self.patches = [mock.patch.object(ns3_command, 'ns3_root_dir', self.ns3_root_dir),
+                        mock.patch.object(ns3_staging, 'staging_dir', os.path.join(self.temp_dir, "staged")),
+                        mock.patch.object(ns3_staging, 'staged', {})]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_stage_ns3_program(self):
+        program, lib_dir = ns3_staging.stage_ns3_program()
+        self.assertEqual(os.path.dirname(program), os.path.join(self.temp_dir, "staged", ns3_command.get_ns3_build_id()))
+        self.assertTrue(os.access(program, os.X_OK))
+        self.assertEqual(os.listdir(lib_dir), [os.path.basename(self.library)])
+        self.assertEqual(ns3_staging.stage_ns3_program(), (program, lib_dir))
+
+        # rebuilding ns-3 stages the new build and removes the old one
+        with open(self.library, 'a') as build_file:
+            build_file.write("rebuilt\n")
+        new_program, new_lib_dir = ns3_staging.stage_ns3_program()
+        self.assertNotEqual(new_program, program)
+        self.assertFalse(os.path.exists(program))
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, "staged")), [ns3_command.get_ns3_build_id()])
+
+    def test_not_built(self):
+        os.remove(self.program)
+        self.assertIsNone(ns3_staging.stage_ns3_program())
+
+    def test_get_simulation_argv(self):
+        program, lib_dir = ns3_staging.stage_ns3_program()
+        with mock.patch.object(simulation_tasks, 'stage_ns3_program', ns3_staging.stage_ns3_program):
+            argv, env = simulation_tasks.get_simulation_argv('./waf --run=lorawan-example-tracing --command-template="%s --nEndDevices=100 --verbose=0"')
+            self.assertEqual(argv, [program, "--nEndDevices=100", "--verbose=0"])
+            self.assertEqual(env['LD_LIBRARY_PATH'].split(':')[0], lib_dir)
+            # other commands are run as they are
+            self.assertEqual(simulation_tasks.get_simulation_argv('./waf --run=other-program'), (["./waf", "--run=other-program"], None))
+            self.assertEqual(simulation_tasks.get_simulation_argv('sh -c "exit 0"'), (["sh", "-c", "exit 0"], None))
+
+if __name__ == '__main__':
+    unittest.main()
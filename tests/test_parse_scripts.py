@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# Checks the outputs of the parse scripts for the fixture traces in tests/data
+# against tests/data/expected, with and without NumPy. The expected outputs
+# are the outputs of the parse scripts before trace_loader, except for the
+# (un)delivered transmissions per data rate of
+# parse_phytx_trace_per_simulation.csv, which changed with the fix of the
+# data rate of the first drop of a transmission.
+import contextlib
+import io
+import os
+import sys
+import unittest
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trace_loader
+import parse_macpackets_trace
+import parse_phytx_trace
+import parse_nsdsmsgs_trace
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+fixture_prefix = os.path.join(data_dir, "LoRaWAN-fixture-")
+
+# Parse scripts with the suffix of the trace they parse
+parse_scripts = [(parse_macpackets_trace, "trace-mac-packets.csv"),
+                 (parse_phytx_trace, "trace-phy-tx.csv"),
+                 (parse_nsdsmsgs_trace, "trace-ns-dsmsgs.csv")]
+
+# Returns the outputs of parse_trace_file(csvfilename, *args) of module (see
+# parse_trace_file of the parse scripts), with or without NumPy
+def parse_fixture(module, csvfilename, use_numpy, args=()):
+    numpy = trace_loader.numpy
+    trace_loader.numpy = numpy if use_numpy else None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return module.parse_trace_file(csvfilename, *args)
+    finally:
+        trace_loader.numpy = numpy
+
+class ParseScriptsTest(unittest.TestCase):
+    def setUp(self):
+        self.trace_cache = trace_loader.trace_cache
+        trace_loader.trace_cache = False
+
+    def tearDown(self):
+        trace_loader.trace_cache = self.trace_cache
+
+    def check_outputs(self, module, outputs):
+        for output_name, (header, lines) in outputs.items():
+            with open(os.path.join(data_dir, "expected", module.output_file_names[output_name])) as expected_file:
+                self.assertEqual(header + "".join(lines), expected_file.read(), module.output_file_names[output_name])
+
+    def test_parse_scripts(self):
+        for module, suffix in parse_scripts:
+            for use_numpy in sorted({False, trace_loader.numpy is not None}):
+                self.check_outputs(module, parse_fixture(module, fixture_prefix + suffix, use_numpy))
+
+    def test_mac_streaming(self):
+        for use_numpy in sorted({False, trace_loader.numpy is not None}):
+            self.check_outputs(parse_macpackets_trace, parse_fixture(parse_macpackets_trace, fixture_prefix + "trace-mac-packets.csv", use_numpy, (3600,)))
+
+    def test_mac_streaming_complete(self):
+        # A horizon just longer than the lifetime of the fixture packets (12
+        # seconds), and packets that are processed as soon as their fate is
+        # known while a long-lived packet is still in flight
+        for use_numpy in sorted({False, trace_loader.numpy is not None}):
+            self.check_outputs(parse_macpackets_trace, parse_fixture(parse_macpackets_trace, fixture_prefix + "trace-mac-packets.csv", use_numpy, (13,)))
+        MacTx, MacTxOk, MacTxDrop, MacRx, MacRxDrop, MacSentPkt = range(6)
+        # (time, device type, node id, trace source, packet, misc)
+        events = [(0.0, 1, 2, MacTx, "long", 0), (1.0, 1, 3, MacTx, "sent", 0), (1.5, 0, 0, MacRx, "sent", 0), (2.0, 1, 3, MacTxOk, "sent", 0),
+                  (2.0, 1, 3, MacSentPkt, "sent", 1), (2.5, 0, 1, MacRxDrop, "sent", 0), (3.0, 1, 4, MacTx, "dropped", 0), (9.0, 1, 4, MacTxDrop, "dropped", 0),
+                  (10.0, 0, 0, MacTx, "downstream", 0), (10.0, 0, 0, MacTxOk, "downstream", 0), (11.0, 1, 2, MacRx, "downstream", 0), (50.0, 1, 2, MacTx, "long", 0)]
+        times, device_types, node_ids, trace_sources, packets, miscs = zip(*events)
+        block = {'time': list(times), 'DeviceType': list(device_types), 'NodeId': list(node_ids), 'TraceSource': list(trace_sources), 'Packet': list(packets),
+                 'PhyIndex': [0] * len(events), 'PacketLength': [21] * len(events), 'Misc': list(miscs)}
+        stream = parse_macpackets_trace.new_mac_stream()
+        parse_macpackets_trace.add_mac_stream_block(stream, block, 100)
+        self.assertEqual(list(stream['inFlight']), ["long"])
+        stats = stream['stats']
+        self.assertEqual((stats['upstream']['nrPackets'], stats['upstream']['nrDelivered'], stats['downstream']['nrDelivered']), (2, 1, 1))
+        self.assertEqual(stats['nodes'][3]['PacketsDropped'], 1) # the MacRxDrop after MacSentPkt
+        # the packet without MacTxOk or MacTxDrop is reported when the stream
+        # is finished
+        stats = parse_macpackets_trace.finish_mac_stream(stream)
+        self.assertEqual((stats['upstream']['nrPackets'], len(stats['messages'])), (2, 1))
+
+    def test_partitioned(self):
+        # The traces split into chunks that are parsed by 2 processes
+        for use_numpy in sorted({False, trace_loader.numpy is not None}):
+            self.check_outputs(parse_macpackets_trace, parse_fixture(parse_macpackets_trace, fixture_prefix + "trace-mac-packets.csv", use_numpy, (None, 2)))
+            self.check_outputs(parse_phytx_trace, parse_fixture(parse_phytx_trace, fixture_prefix + "trace-phy-tx.csv", use_numpy, (False, 2)))
+
+    @unittest.skipIf(trace_loader.numpy is None, "NumPy is not installed")
+    def test_group_mac_events(self):
+        # Cases the fixture trace (one gateway) does not have: packets without
+        # MacTx, with more than one transmitter and with more than 4 receptions
+        from parse_macpackets_trace import MAC_TX, MAC_TX_OK, MAC_RX, MAC_SENT_PKT
+        nodes = {0: {'DeviceType': 0}, 1: {'DeviceType': 0}, 2: {'DeviceType': 1}, 3: {'DeviceType': 1}, 5: {'DeviceType': 1}}
+        events = [(0, MAC_TX, 2, 0), (0, MAC_RX, 0, 0), (0, MAC_RX, 1, 0), (0, MAC_SENT_PKT, 2, 3), (0, MAC_SENT_PKT, 2, 1),
+                  (1, MAC_RX, 3, 0), (1, MAC_TX_OK, 3, 0),
+                  (2, MAC_TX, 3, 0), (2, MAC_TX, 5, 0), (2, MAC_TX, 3, 0), (2, MAC_RX, 5, 0)] + \
+                 [(3, MAC_TX, 0, 0)] + [(3, MAC_RX, node_id, 0) for node_id in [2, 3, 2, 5, 3, 2]] + [(4, MAC_RX, node_id, 0) for node_id in [0, 1, 0, 1, 0]]
+        table = {'events': tuple(array(typecode, column) for typecode, column in zip('ibii', zip(*events))), 'timestamps': array('d', [0.0] * 5)}
+        groups = parse_macpackets_trace.group_mac_events(table, nodes)
+        self.assertEqual(groups['nrTransmitters'], [1, 0, 2, 1, 0])
+        self.assertEqual(groups['nrReceivers'], [2, 1, 1, 3, 2])
+        self.assertEqual(list(groups['sentTries']), [3, 0, 0, 0, 0])
+        self.assertEqual(list(groups['receivedByOtherDeviceType']), [1, 0, 0, 1, 0])
+        numpy_groups = parse_macpackets_trace.group_mac_events_numpy(table, nodes)
+        for name, values in groups.items():
+            self.assertEqual([list(value) for value in values] if name == 'counts' else list(values),
+                             [list(value) for value in numpy_groups[name]] if name == 'counts' else list(numpy_groups[name]), name)
+
+    @unittest.skipIf(trace_loader.numpy is None, "NumPy is not installed")
+    def test_phy_events(self):
+        # Transmissions with two PhyTxBegin, without PhyTxEnd, not ended by a
+        # receiver and delivered or dropped by receivers of either device type
+        nodes = {0: 0, 1: 0, 2: 1, 3: 1, 4: 1}
+        PhyTxBegin, PhyRxBegin, PhyTxEnd, PhyRxEnd, PhyRxDrop, PhyTxDrop = range(6)
+        events = [(2, PhyTxBegin, 1, 3, 2), (0, PhyRxBegin, 1, 0, 0), (1, PhyRxBegin, 1, 0, 0), (3, PhyRxBegin, 1, 0, 0), (2, PhyTxEnd, 1, 0, 0),
+                  (0, PhyRxEnd, 1, 0, 0), (0, PhyRxDrop, 1, 2, 0), (1, PhyRxEnd, 1, 0, 0), (3, PhyRxDrop, 1, 1, 0),
+                  (3, PhyTxBegin, 2, 1, 5), (3, PhyTxBegin, 2, 1, 5), (0, PhyRxBegin, 2, 0, 0),
+                  (0, PhyTxBegin, 3, 0, 1), (2, PhyRxBegin, 3, 0, 0), (4, PhyRxBegin, 3, 0, 0), (0, PhyTxEnd, 3, 0, 0), (2, PhyRxEnd, 3, 0, 0),
+                  (4, PhyRxEnd, 3, 0, 0), (2, PhyRxDrop, 3, 1, 0), (4, PhyRxDrop, 3, 0, 0), (1, PhyRxDrop, 3, 0, 0),
+                  (4, PhyTxBegin, 4, 2, 0), (0, PhyRxBegin, 4, 0, 0), (4, PhyTxEnd, 4, 0, 0), (1, PhyRxDrop, 4, 1, 0),
+                  (2, PhyTxBegin, 5, 0, 3), (1, PhyRxBegin, 5, 0, 0), (2, PhyTxEnd, 5, 0, 0), (1, PhyRxEnd, 5, 0, 0), (0, PhyRxDrop, 5, 0, 0),
+                  (3, PhyTxBegin, 6, 4, 4)]
+        block = {name: array(typecode, column) for name, typecode, column in zip(['NodeId', 'TraceSource', 'PhyTraceIdTag', 'Misc1', 'Misc2'], 'qqQqq', zip(*events))}
+        phy_transmissions = {}
+        positions = array('q')
+        parse_phytx_trace.add_phy_events(phy_transmissions, positions, block)
+        stats = parse_phytx_trace.process_phy_transmissions(phy_transmissions, positions, nodes)
+        numpy_stats = parse_phytx_trace.process_phy_events_numpy(block, nodes)
+        self.assertEqual((stats['nDelivered'], stats['nUndelivered'], stats['nTx'], len(stats['messages'])), (2, 2, 5, 2))
+        self.assertEqual(stats['dropCounts'], {(0, 1, 1): 1, (0, 1, 0): 1, (4, 0, 1): 1})
+        for name in stats:
+            self.assertEqual(numpy_stats[name], stats[name], name)
+
+    def test_phy_tx_drop(self):
+        # aborted transmissions are not implemented, the parse fails with an
+        # error instead of exiting the process
+        PhyTxBegin, PhyRxBegin, PhyTxEnd, PhyRxEnd, PhyRxDrop, PhyTxDrop = range(6)
+        events = [(2, PhyTxBegin, 1, 3, 2), (0, PhyRxBegin, 1, 0, 0), (2, PhyTxDrop, 1, 0, 0)]
+        block = {name: array(typecode, column) for name, typecode, column in zip(['NodeId', 'TraceSource', 'PhyTraceIdTag', 'Misc1', 'Misc2'], 'qqQqq', zip(*events))}
+        phy_transmissions = {}
+        positions = array('q')
+        parse_phytx_trace.add_phy_events(phy_transmissions, positions, block)
+        with self.assertRaisesRegex(ValueError, "aborted"):
+            parse_phytx_trace.process_phy_transmissions(phy_transmissions, positions, {0: 0, 2: 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# Checks the outputs of parse_simulation.py for the fixture simulation in
+# tests/data: the outputs of the parse scripts are the outputs of the scripts
+# themselves (tests/data/expected), the cross-layer outputs are checked
+# against tests/data/expected and against the totals of the other outputs
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trace_loader
+import parse_simulation
+import parse_macpackets_trace
+import parse_phytx_trace
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+class ParseSimulationTest(unittest.TestCase):
+    def setUp(self):
+        self.trace_cache = trace_loader.trace_cache
+        trace_loader.trace_cache = False
+
+    def tearDown(self):
+        trace_loader.trace_cache = self.trace_cache
+
+    def test_parse_simulation(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim_settings, parsed_outputs = parse_simulation.parse_simulation(os.path.join(data_dir, "LoRaWAN-fixture-sim-settings.txt"))
+        self.assertEqual((sim_settings['nEndDevices'], sim_settings['seed']), (60, 12345))
+        results_outputs = parse_simulation.get_results_outputs(parsed_outputs)
+        self.assertEqual(sorted(results_outputs), sorted(os.path.splitext(file_name)[0] for output_file_names in parse_simulation.parse_output_file_names.values()
+                                                         for file_name in output_file_names.values()))
+        for table_name, (header, lines) in results_outputs.items():
+            with open(os.path.join(data_dir, "expected", table_name + ".csv")) as expected_file:
+                self.assertEqual(header + "".join(lines), expected_file.read(), table_name)
+
+        # the totals per simulation are the sums of the outputs per end device
+        header, lines = parsed_outputs['parse_simulation']['simulation']
+        simulation = dict(zip(header.strip().split(','), lines[0].strip().split(',')))
+        header, lines = parsed_outputs['parse_simulation']['enddevices']
+        enddevices = [dict(zip(header.strip().split(','), line.strip().split(','))) for line in lines]
+        for simulation_column, enddevice_column in [('<usPackets>', '<packetsGenerated>'), ('<usUndelivered>', '<packetsNotDelivered>'),
+                                                    ('<phyUsSent>', '<phySent>'), ('<phyUsDrops>', '<phyDrops>')]:
+            self.assertEqual(int(simulation[simulation_column]), sum(int(enddevice[enddevice_column]) for enddevice in enddevices), simulation_column)
+        self.assertEqual(int(simulation['<phyUsDrops>']), sum(int(simulation['<phyUsDrops{}>'.format(reason)]) for reason in range(6)))
+
+    def test_unknown_transmitter(self):
+        # drops of a transmitter that is in none of the node tables are
+        # counted per transmitter, but not as drops of end devices
+        sim_settings = {'nGateways': 1, 'nEndDevices': 1, 'totalTime': 100, 'drCalcMethod': 0, 'drCalcMethodMisc': 0, 'seed': 1, 'usConfirmedData': 0, 'usDataPeriod': 10}
+        mac_stats = parse_macpackets_trace.new_mac_stats({})
+        phy_stats = {'nodes': {1: dict(parse_phytx_trace.new_phy_node(1), TransmissionsSent=2)}, 'dropCounts': {(1, 0, 2): 1, (7, 0, 1): 3}}
+        with contextlib.redirect_stdout(io.StringIO()):
+            outputs = parse_simulation.get_cross_layer_outputs(mac_stats, phy_stats, {}, sim_settings)
+        header, lines = outputs['simulation']
+        simulation = dict(zip(header.strip().split(','), lines[0].strip().split(',')))
+        self.assertEqual((simulation['<phyUsDrops>'], simulation['<phyUsDrops2>'], simulation['<phyUsDrops1>']), ('1', '1', '0'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# Checks storing the outputs of the parse scripts in the results database of
+# results_db.py and exporting the CSV output files from it
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import results_db
+
+table_names = {'simulation': "parse_test_per_simulation", 'enddevices': "parse_test_per_enddevice"}
+simulation_header = "<nGateways>,<seed>,<pdr>\n"
+enddevices_header = "<nGateways>,<seed>,<nodeId>,<pdr>,\n"
+
+# Returns the outputs of a parse script for the simulation with n_gateways
+# and seed, with the PDR of every end device in pdrs
+def get_outputs(n_gateways, seed, pdrs):
+    return {'simulation': (simulation_header, ["{},{},{:.4f}\n".format(n_gateways, seed, sum(pdrs) / len(pdrs))]),
+            'enddevices': (enddevices_header, ["{},{},{},{:.4f},\n".format(n_gateways, seed, node_id, pdr) for node_id, pdr in enumerate(pdrs)])}
+
+class ResultsDbTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.connection = results_db.open_results(os.path.join(self.temp_dir, "parse_results.sqlite"))
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.temp_dir)
+
+    def store(self, n_gateways, seed, pdrs, prefix="output/LoRaWAN"):
+        prefix = os.path.join(self.temp_dir, prefix)
+        results_db.store_results(self.connection, table_names, prefix, {'nGateways': n_gateways, 'seed': seed}, get_outputs(n_gateways, seed, pdrs))
+
+    # Returns the contents of the CSV file exported from results table table_name
+    def export(self, table_name):
+        file_name = os.path.join(self.temp_dir, table_name + ".csv")
+        results_db.export_results(self.connection, table_name, file_name)
+        with open(file_name) as csv_file:
+            return csv_file.read()
+
+    def test_get_header_columns(self):
+        self.assertEqual(results_db.get_header_columns("<nGateways>,<pdr>,<pdr>, <nodeId>,\n"), ['nGateways', 'pdr', 'pdr2', 'nodeId'])
+        self.assertEqual(results_db.get_results_table_names({'simulation': "parse_phytx_trace_per_simulation.csv"}), {'simulation': "parse_phytx_trace_per_simulation"})
+
+    def test_store_results(self):
+        self.store(1, 1, [0.5, 1.0])
+        self.store(4, 1, [1.0])
+        self.store(1, 1, [0.25, 0.75, 1.0]) # parsed again: replaces the rows of the simulation
+        self.assertEqual(self.export("parse_test_per_simulation"), simulation_header + "1,1,0.6667\n4,1,1.0000\n")
+        self.assertEqual(self.export("parse_test_per_enddevice"), enddevices_header + "1,1,0,0.2500,\n1,1,1,0.7500,\n1,1,2,1.0000,\n4,1,0,1.0000,\n")
+        # the values are stored as numbers
+        self.assertEqual(self.connection.execute("SELECT nodeId, pdr FROM parse_test_per_enddevice WHERE nGateways = 1 AND pdr > 0.5 ORDER BY nodeId").fetchall(), [(1, 0.75), (2, 1.0)])
+
+        with self.assertRaises(ValueError):
+            results_db.store_results(self.connection, table_names, self.temp_dir, {'nGateways': 1, 'seed': 2}, {'simulation': ("<nGateways>,<seed>\n", ["1,2\n"])})
+        self.assertEqual(self.export("parse_test_per_simulation"), simulation_header + "1,1,0.6667\n4,1,1.0000\n")
+
+    def test_simulation_prefix(self):
+        self.assertEqual(results_db.get_simulation_prefix("output/LoRaWAN-1-trace-mac-packets.csv.gz", "trace-mac-packets.csv"), os.path.abspath("output/LoRaWAN-1"))
+        self.assertEqual(results_db.get_simulation_prefix("output/LoRaWAN-1-sim-settings.txt", "sim-settings.txt"), os.path.abspath("output/LoRaWAN-1"))
+        # a simulation with the same settings under another prefix (e.g. a
+        # rerun into another output directory) is stored separately
+        self.store(1, 1, [0.5])
+        with contextlib.redirect_stdout(io.StringIO()) as printed:
+            self.store(1, 1, [1.0], "rerun/LoRaWAN")
+        self.assertIn("has the same settings", printed.getvalue())
+        self.store(1, 1, [0.25])
+        self.assertEqual(self.export("parse_test_per_simulation"), simulation_header + "1,1,0.2500\n1,1,1.0000\n")
+
+    def test_keep_unexported_outputs(self):
+        output_files = {output_name: os.path.join(self.temp_dir, table_name + ".csv") for output_name, table_name in table_names.items()}
+        with open(output_files['simulation'], 'w') as csv_file:
+            csv_file.write(simulation_header + "1,1,0.5000\n")
+        results_db.keep_unexported_outputs(self.connection, table_names, output_files)
+        self.assertFalse(os.path.exists(output_files['simulation']))
+        with open(output_files['simulation'] + ".orig") as csv_file:
+            self.assertEqual(csv_file.read(), simulation_header + "1,1,0.5000\n")
+
+        # files exported from the database are replaced by the next export,
+        # unless they changed since (e.g. appended to with --no-results)
+        self.store(1, 1, [0.5])
+        self.export("parse_test_per_simulation")
+        results_db.keep_unexported_outputs(self.connection, table_names, output_files)
+        self.assertTrue(os.path.exists(output_files['simulation']))
+        with open(output_files['simulation'], 'a') as csv_file:
+            csv_file.write("4,1,1.0000\n")
+        results_db.keep_unexported_outputs(self.connection, table_names, output_files)
+        self.assertFalse(os.path.exists(output_files['simulation']))
+        with open(output_files['simulation'] + ".orig.1") as csv_file:
+            self.assertEqual(csv_file.read(), simulation_header + "1,1,0.5000\n4,1,1.0000\n")
+
+if __name__ == '__main__':
+    unittest.main()
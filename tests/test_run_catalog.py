@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+# Checks the scanning of an output tree into the run catalog of run_catalog.py
+# and the selection of runs by their settings
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run_catalog
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+class RunCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, "output")
+        self.connection = run_catalog.open_run_catalog(os.path.join(self.temp_dir, "run-catalog.sqlite"))
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.temp_dir)
+
+    # Write the output files of a run with prefix (relative to the output
+    # directory) and the fixture settings with nGateways
+    def write_run(self, prefix, n_gateways):
+        prefix = os.path.join(self.output_dir, prefix)
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        with open(os.path.join(data_dir, "LoRaWAN-fixture-sim-settings.txt")) as settings_file:
+            settings = settings_file.read().replace("nGateways = 1", "nGateways = {}".format(n_gateways))
+        with open(prefix + "sim-settings.txt", 'w') as settings_file:
+            settings_file.write(settings)
+        shutil.copyfile(os.path.join(data_dir, "LoRaWAN-fixture-trace-misc.csv"), prefix + "trace-misc.csv")
+        for suffix in ["trace-mac-packets.csv.gz", "trace-phy-tx.csv", "simulation.log"]:
+            open(prefix + suffix, 'w').close()
+        return prefix
+
+    def test_scan_output_tree(self):
+        prefixes = [self.write_run("a/LoRaWAN-1-", 1), self.write_run("a/LoRaWAN-4-", 4), self.write_run("b/LoRaWAN-4-", 4)]
+        self.write_run(".trace-cache/LoRaWAN-1-", 1)
+        self.assertEqual(run_catalog.scan_output_tree(self.connection, self.output_dir), 3)
+        self.assertEqual(run_catalog.scan_output_tree(self.connection, self.output_dir), 0)
+
+        runs = run_catalog.find_runs(self.connection)
+        self.assertEqual([run['prefix'] for run in runs], sorted(prefixes))
+        self.assertEqual(sorted(runs[0]['files']), ["sim-settings.txt", "trace-mac-packets.csv.gz", "trace-misc.csv", "trace-phy-tx.csv"])
+        self.assertEqual((runs[0]['settings']['nEndDevices'], runs[0]['settings']['drCalcPerLimit'], runs[0]['misc']['nrRW2Missed']), (60, 0.01, 8))
+
+        conditions = run_catalog.parse_conditions(["nGateways=4", "drCalcPerLimit=0.01"])
+        self.assertEqual(conditions, {'nGateways': 4, 'drCalcPerLimit': 0.01})
+        self.assertEqual([run['prefix'] for run in run_catalog.find_runs(self.connection, conditions)], prefixes[1:])
+        self.assertEqual(run_catalog.find_run_files(self.connection, "trace-mac-packets.csv", conditions), [prefix + "trace-mac-packets.csv.gz" for prefix in prefixes[1:]])
+        self.assertEqual(run_catalog.find_runs(self.connection, {'nGateways': 2}), [])
+        with self.assertRaises(ValueError):
+            run_catalog.parse_conditions(["nGateways"])
+
+        # a changed and a removed run
+        self.write_run("a/LoRaWAN-4-", 2)
+        os.utime(prefixes[1] + "sim-settings.txt", ns=(0, 0))
+        shutil.rmtree(os.path.join(self.output_dir, "b"))
+        self.assertEqual(run_catalog.scan_output_tree(self.connection, self.output_dir), 1)
+        self.assertEqual([run['prefix'] for run in run_catalog.find_runs(self.connection, {'nGateways': 2})], [prefixes[1]])
+        self.assertEqual([run['prefix'] for run in run_catalog.find_runs(self.connection)], prefixes[:2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+# Checks the run metrics database and the scaling report
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from run_metrics import open_run_metrics, record_run_metrics, load_run_metrics
+from run_metrics_report import fit_exponent, print_report
+
+# Returns the summary of a run (see run_simulation) with the given metrics
+def make_summary(returncode, wall_time, output_bytes):
+    return {'returncode': returncode, 'wallTime': wall_time, 'startTime': 1000.0, 'cpuTime': wall_time * 0.9, 'maxRss': 50000000,
+            'outputBytes': output_bytes, 'host': "worker1"}
+
+class RunMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.connection = open_run_metrics(os.path.join(self.temp_dir, "output", "run-metrics.sqlite"))
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_record_run_metrics(self):
+        command = './waf --run=lorawan-example-tracing --command-template="%s --nEndDevices=100 --nGateways=2"'
+        record_run_metrics(self.connection, command, make_summary(0, 10.0, {"-trace-mac-packets.csv": 3000, "-sim-settings.txt": 200}), "confirmed")
+        record_run_metrics(self.connection, command, make_summary(1, 1.0, {}), "confirmed")
+        record_run_metrics(self.connection, command, make_summary(0, 5.0, {}), "drcalc")
+        runs = load_run_metrics(self.connection, "confirmed")
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs[0]['settings'], {'nEndDevices': '100', 'nGateways': '2'})
+        self.assertEqual((runs[0]['wallTime'], runs[0]['outputBytes'], runs[0]['host']), (10.0, 3200, "worker1"))
+        self.assertEqual([run['returncode'] for run in load_run_metrics(self.connection, "confirmed", successful_only=False)], [0, 1])
+        self.assertEqual([run['sweep'] for run in load_run_metrics(self.connection)], ["confirmed", "drcalc"])
+        self.assertEqual(self.connection.execute("SELECT suffix, bytes FROM runOutputFiles ORDER BY suffix").fetchall(),
+                         [("-sim-settings.txt", 200), ("-trace-mac-packets.csv", 3000)])
+
+    def test_report(self):
+        for n_end_devices in [100, 1000, 10000]:
+            command = './waf --run=lorawan-example-tracing --command-template="%s --nEndDevices={}"'.format(n_end_devices)
+            record_run_metrics(self.connection, command, make_summary(0, n_end_devices**1.5 / 100, {"-trace-mac-packets.csv": n_end_devices * 1000}), "confirmed")
+        self.assertAlmostEqual(fit_exponent([(x, 3 * x**1.5) for x in [10.0, 100.0, 1000.0]]), 1.5)
+        self.assertIsNone(fit_exponent([(10.0, 1.0)]))
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            print_report(load_run_metrics(self.connection), ['nEndDevices'])
+        lines = printed.getvalue().splitlines()
+        self.assertEqual(lines[1].split(), ["100", "1", "10.0", "9.0", "50.0", "0.1"])
+        self.assertIn("Wall time ~ nEndDevices^1.50", lines)
+        self.assertIn("Output bytes ~ nEndDevices^1.00", lines)
+
+if __name__ == '__main__':
+    unittest.main()
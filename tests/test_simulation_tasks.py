@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# Checks the simulation task helpers of simulation_tasks.py that do not run
+# ns-3
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import simulation_tasks
+from simulation_tasks import stream_to_log, move_output_files
+
+class StreamToLogTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file_name = os.path.join(self.temp_dir, "simulation-stdout.log")
+        self.max_log_size = simulation_tasks.max_log_size
+        simulation_tasks.max_log_size = 1000
+
+    def tearDown(self):
+        simulation_tasks.max_log_size = self.max_log_size
+        shutil.rmtree(self.temp_dir)
+
+    def test_short_output(self):
+        byte_count = [0]
+        stream_to_log(io.BytesIO(b"line\n" * 10), self.log_file_name, byte_count)
+        self.assertEqual(byte_count, [50])
+        with open(self.log_file_name, 'rb') as log_file:
+            self.assertEqual(log_file.read(), b"line\n" * 10)
+
+    def test_truncated_output(self):
+        byte_count = [0]
+        stream_to_log(io.BytesIO(b"x" * 200000), self.log_file_name, byte_count)
+        self.assertEqual(byte_count, [200000])
+        with open(self.log_file_name, 'rb') as log_file:
+            self.assertEqual(log_file.read(), b"x" * 1000 + b"\n[log truncated, 1000 of 200000 bytes written]\n")
+
+class MoveOutputFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.scratch_dir = os.path.join(self.temp_dir, "scratch")
+        self.output_dir = os.path.join(self.temp_dir, "output")
+        os.makedirs(self.scratch_dir)
+        os.makedirs(self.output_dir)
+        self.suffixes = ["-sim-settings.txt", "-trace-mac-packets.csv.gz", "-trace-misc.csv.gz"]
+        for suffix in self.suffixes:
+            with open(os.path.join(self.scratch_dir, "LoRaWAN-test-100" + suffix), 'w') as scratch_file:
+                scratch_file.write(suffix)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_move_output_files(self):
+        moved_files = move_output_files(os.path.join(self.scratch_dir, "LoRaWAN-test-100"), os.path.join(self.output_dir, "LoRaWAN-test-100_2"))
+        self.assertEqual(sorted(moved_files), sorted(os.path.join(self.output_dir, "LoRaWAN-test-100_2" + suffix) for suffix in self.suffixes))
+        self.assertEqual(sorted(os.listdir(self.output_dir)), sorted("LoRaWAN-test-100_2" + suffix for suffix in self.suffixes))
+        for suffix in self.suffixes:
+            with open(os.path.join(self.output_dir, "LoRaWAN-test-100_2" + suffix)) as output_file:
+                self.assertEqual(output_file.read(), suffix)
+
+    def test_failed_move(self):
+        # output files of an earlier run with the same prefix
+        for suffix in self.suffixes[:2]:
+            with open(os.path.join(self.output_dir, "LoRaWAN-test-100_2" + suffix), 'w') as output_file:
+                output_file.write("earlier run")
+        # renaming the new sim-settings file (the last one) into place fails
+        rename = os.rename
+        def failing_rename(source, destination):
+            if os.path.basename(os.path.dirname(source)).startswith(".incoming-") and destination.endswith("-sim-settings.txt"):
+                raise OSError("rename failed")
+            rename(source, destination)
+        with mock.patch('os.rename', failing_rename):
+            self.assertRaises(OSError, move_output_files, os.path.join(self.scratch_dir, "LoRaWAN-test-100"), os.path.join(self.output_dir, "LoRaWAN-test-100_2"))
+        self.assertEqual(sorted(os.listdir(self.output_dir)), sorted("LoRaWAN-test-100_2" + suffix for suffix in self.suffixes[:2]))
+        for suffix in self.suffixes[:2]:
+            with open(os.path.join(self.output_dir, "LoRaWAN-test-100_2" + suffix)) as output_file:
+                self.assertEqual(output_file.read(), "earlier run")
+
+if __name__ == '__main__':
+    unittest.main()
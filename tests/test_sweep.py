@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# Checks the sweep engine: the sweeps in the sweeps folder generate the same
+# commands, in the same order, as the dispatch scripts they replaced (in
+# tests/data/sweeps, except for the output directory of unconfirmed_4nbrep,
+# which was a home directory), and the rules of sweep specifications
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sweep import load_sweep_spec, get_sweep_blocks, get_dimensions, count_sweep_points, iter_sweep_points
+
+repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data_dir = os.path.join(repository_dir, "tests", "data", "sweeps")
+
+class SweepTest(unittest.TestCase):
+    def test_sweep_files(self):
+        for file_name in sorted(os.listdir(data_dir)):
+            spec = load_sweep_spec(os.path.join(repository_dir, "sweeps", file_name.replace(".txt", ".json")))
+            with open(os.path.join(data_dir, file_name)) as commands_file:
+                expected_commands = commands_file.read().splitlines()
+            commands = [command for point, command in iter_sweep_points(spec)]
+            self.assertEqual(commands, expected_commands, file_name)
+            self.assertEqual(count_sweep_points(spec), len(commands), file_name)
+
+    def test_sweep_spec(self):
+        spec = {'name': 'test',
+                'settings': {'nGateways': 1, 'usDataPeriod': 600, 'totalTime': 6000, 'seedBase': 10},
+                'sweep': [{'k': [1, 2]}, {'usDataPeriod': [600, 6000], 'totalTime': [60000, 600000]}],
+                'derived': {'nEndDevices': "100*k", 'randomSeed': "seedBase + nEndDevices"},
+                'outputFileNamePrefix': "simulations/output/test/LoRaWAN-{nGateways}-{usDataPeriod}-{nEndDevices}",
+                'args': ['randomSeed', 'nEndDevices', 'usDataPeriod', 'outputFileNamePrefix'],
+                'blocks': [{}, {'settings': {'nGateways': 4}, 'sweep': [{'k': [3]}]}]}
+        points = list(iter_sweep_points(spec))
+        self.assertEqual(count_sweep_points(spec), 5)
+        # the first dimension is the outer loop, zipped settings change together
+        self.assertEqual([(point['nGateways'], point['nEndDevices'], point['usDataPeriod'], point['totalTime']) for point, command in points],
+                         [(1, 100, 600, 60000), (1, 100, 6000, 600000), (1, 200, 600, 60000), (1, 200, 6000, 600000), (4, 300, 600, 6000)])
+        point, command = points[1]
+        self.assertEqual(point['randomSeed'], 110)
+        self.assertEqual(point['outputFileNamePrefix'], "simulations/output/test/LoRaWAN-1-6000-100")
+        self.assertEqual(command, './waf --run=lorawan-example-tracing --command-template="%s --randomSeed=110 --nEndDevices=100 --usDataPeriod=6000 --outputFileNamePrefix=simulations/output/test/LoRaWAN-1-6000-100"')
+        # a block takes the keys it does not have from the top level
+        self.assertEqual(points[4][0]['outputFileNamePrefix'], "simulations/output/test/LoRaWAN-4-600-300")
+        self.assertEqual(len(get_sweep_blocks(spec)), 2)
+
+    def test_zipped_lengths(self):
+        block = get_sweep_blocks({'sweep': [{'usDataPeriod': [600, 6000], 'totalTime': [60000]}]})[0]
+        with self.assertRaises(ValueError):
+            get_dimensions(block)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+# Checks following a trace file while it is written with trace_follow.py: the
+# fixture MAC packets trace is appended in pieces that cut lines in half
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trace_loader
+import trace_follow
+from trace_loader import load_trace
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+columns = ['time', 'NodeId', 'TraceSource', 'Packet']
+
+class TraceFollowTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.temp_dir, "LoRaWAN-follow-trace-mac-packets.csv")
+        self.saved = (trace_loader.trace_cache, trace_follow.poll_interval)
+        trace_loader.trace_cache = False
+        trace_follow.poll_interval = 0
+
+    def tearDown(self):
+        trace_loader.trace_cache, trace_follow.poll_interval = self.saved
+        shutil.rmtree(self.temp_dir)
+
+    def test_find_line_end(self):
+        trace_file = io.BytesIO(b"a,b\n1,2\n3,")
+        self.assertEqual(trace_follow.find_line_end(trace_file, 4, 10), 8)
+        self.assertEqual(trace_follow.find_line_end(trace_file, 8, 10), 8)
+        self.assertEqual(trace_follow.find_line_end(trace_file, 0, 4), 4)
+
+    def test_follow_trace_blocks(self):
+        with open(os.path.join(data_dir, "LoRaWAN-fixture-trace-mac-packets.csv"), 'rb') as trace_file:
+            trace = trace_file.read()
+        codes = {}
+        blocks = trace_follow.follow_trace_blocks(self.file_name, columns, codes)
+        self.assertIsNone(next(blocks)) # waits for the trace to be created
+        followed = {name: [] for name in columns + ['Position']}
+        # pieces that end in the header line and in the middle of lines
+        for start, end in zip([0, 10, 500, 501, 3000], [10, 500, 501, 3000, len(trace)]):
+            with open(self.file_name, 'ab') as trace_file:
+                trace_file.write(trace[start:end])
+            for block in blocks:
+                if block is None: # all complete lines were read
+                    break
+                for name in followed:
+                    followed[name].extend(block[name])
+        os.remove(self.file_name)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(list(blocks), []) # ends when the trace is removed
+
+        with open(self.file_name, 'wb') as trace_file:
+            trace_file.write(trace)
+        expected_codes = {}
+        expected = load_trace(self.file_name, columns, expected_codes)
+        self.assertEqual(followed, dict({name: list(column) for name, column in expected.items()}, Position=list(range(len(expected['time'])))))
+        self.assertEqual(list(codes['Packet']), list(expected_codes['Packet']))
+
+    def test_idle_timeout(self):
+        with open(os.path.join(data_dir, "LoRaWAN-fixture-trace-mac-packets.csv"), 'rb') as trace_file:
+            header = trace_file.readline()
+        with open(self.file_name, 'wb') as trace_file:
+            trace_file.write(header)
+        with contextlib.redirect_stdout(io.StringIO()) as printed:
+            self.assertEqual(list(trace_follow.follow_trace_blocks(self.file_name, columns, idle_timeout=0)), [])
+        self.assertIn("No lines appended", printed.getvalue())
+        with self.assertRaises(ValueError):
+            next(trace_follow.follow_trace_blocks(self.file_name + ".gz", columns))
+
+    def test_get_interval_values(self):
+        self.assertEqual(trace_follow.get_interval_values({'nrPackets': 10, 'nrDelivered': 7}, None), {'nrPackets': 10, 'nrDelivered': 7})
+        self.assertEqual(trace_follow.get_interval_values({'nrPackets': 10, 'nrDelivered': 7}, {'nrPackets': 4, 'nrDelivered': 4}), {'nrPackets': 6, 'nrDelivered': 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+# Checks the compression of trace files, the lookup of the other output files
+# of a (compressed) trace, the parsing of the sim-settings and trace-misc files
+# and the parsing of trace files in parallel in trace_io.py
+import concurrent.futures
+import contextlib
+import functools
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trace_io import available_compression_methods, strip_compression_extension, open_trace, find_trace_file, compress_file, \
+    append_output_lines, parse_trace_files, parse_sim_settings, load_sim_settings, load_trace_misc
+import trace_loader
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+trace_text = "time,DeviceType,NodeId\r\n" + "".join("{}.5,1,{}\r\n".format(i, i % 7) for i in range(1000))
+
+# parse_trace_file of a parse script for test_parse_trace_files: prints the
+# file name and returns it with the arguments
+def parse_file_name(csvfilename, suffix):
+    print("Parsing {}".format(csvfilename))
+    return {'simulation': ("header\n", [os.path.basename(csvfilename) + suffix + "\n"])}
+
+# parse_trace_file of a parse script for test_parse_trace_files_cache: returns
+# the cache settings of the process that parses the file
+def get_parse_cache_settings(csvfilename):
+    return trace_loader.get_cache_settings()
+
+class TraceIoTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.trace_file_name = os.path.join(self.temp_dir, "LoRaWAN-test-trace-mac-packets.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_trace(self):
+        with open(self.trace_file_name, 'w', newline='') as trace_file:
+            trace_file.write(trace_text)
+
+    def test_compress_file(self):
+        for method in available_compression_methods():
+            self.write_trace()
+            compressed_file_name = compress_file(self.trace_file_name, method)
+            self.assertEqual(strip_compression_extension(compressed_file_name), self.trace_file_name)
+            self.assertFalse(os.path.exists(self.trace_file_name))
+            self.assertLess(os.path.getsize(compressed_file_name), len(trace_text))
+            # read back in text mode, without translating the line endings
+            with open_trace(compressed_file_name) as trace_file:
+                self.assertEqual(trace_file.read(), trace_text, method)
+            with open_trace(compressed_file_name, 'rb') as trace_file:
+                self.assertEqual(trace_file.read(), trace_text.encode('ascii'), method)
+            os.remove(compressed_file_name)
+
+    def test_find_trace_file(self):
+        sim_settings_file_name = os.path.join(self.temp_dir, "LoRaWAN-test-sim-settings.txt")
+        self.assertEqual(find_trace_file(self.trace_file_name + ".gz", "trace-mac-packets.csv", "sim-settings.txt"), sim_settings_file_name)
+        open(sim_settings_file_name + ".xz", 'w').close()
+        self.assertEqual(find_trace_file(self.trace_file_name + ".gz", "trace-mac-packets.csv", "sim-settings.txt"), sim_settings_file_name + ".xz")
+        open(sim_settings_file_name, 'w').close()
+        self.assertEqual(find_trace_file(self.trace_file_name, "trace-mac-packets.csv", "sim-settings.txt"), sim_settings_file_name)
+
+    def test_parse_sim_settings(self):
+        sim_settings = load_sim_settings(os.path.join(data_dir, "LoRaWAN-fixture-sim-settings.txt"))
+        self.assertEqual(sim_settings, {'nGateways': 1, 'nEndDevices': 60, 'totalTime': 60000, 'usConfirmedData': 1, 'usDataPeriod': 600, 'seed': 12345,
+                                        'drCalcMethod': 0, 'drCalcPerLimit': 0.01, 'drCalcMethodMisc': 0.01,
+                                        'dsDataGenerate': 1, 'dsDataExpMean': 6000, 'dsConfirmedData': 1})
+        # settings that are not in the file, a fixed data rate and other settings
+        sim_settings = parse_sim_settings("nGateways = 4\nData rate assignment method index: 2\nFixed Data Rate Index: 5\nchannel = EU868 \n")
+        self.assertEqual((sim_settings['nGateways'], sim_settings['nEndDevices'], sim_settings['drCalcMethodMisc'], sim_settings['channel']), (4, -1, 5, "EU868"))
+
+    def test_load_trace_misc(self):
+        self.assertEqual(load_trace_misc(os.path.join(data_dir, "LoRaWAN-fixture-trace-misc.csv")), {"nrRW1Sent": 5, "nrRW2Sent": 6, "nrRW1Missed": 7, "nrRW2Missed": 8})
+
+    def test_append_output_lines(self):
+        output_file_name = os.path.join(self.temp_dir, "output.csv")
+        append_output_lines(output_file_name, "a,b\n", ["1,2\n"])
+        append_output_lines(output_file_name, "a,b\n", ["3,4\n", "5,6\n"])
+        with open(output_file_name) as output_file:
+            self.assertEqual(output_file.read(), "a,b\n1,2\n3,4\n5,6\n")
+
+    def test_parse_trace_files(self):
+        # the outputs and what is printed are in sorted order of the file names
+        # whatever the number of jobs
+        file_names = ["LoRaWAN-{}-trace-mac-packets.csv".format(i) for i in [3, 1, 10, 2]]
+        for jobs in [1, 2]:
+            printed = io.StringIO()
+            with contextlib.redirect_stdout(printed):
+                outputs = list(parse_trace_files(parse_file_name, file_names, jobs, ("-x",)))
+            self.assertEqual([csvfilename for csvfilename, output in outputs], sorted(file_names))
+            self.assertEqual([output['simulation'][1] for csvfilename, output in outputs], [[csvfilename + "-x\n"] for csvfilename in sorted(file_names)])
+            self.assertEqual(printed.getvalue(), "".join("Parsing {}\n".format(csvfilename) for csvfilename in sorted(file_names)))
+
+    def test_parse_trace_files_cache(self):
+        # the processes of the pool use the cache settings of this process,
+        # also when they do not inherit them (spawn start method)
+        settings = trace_loader.get_cache_settings()
+        spawn_executor = functools.partial(concurrent.futures.ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+        trace_loader.set_cache_settings((False, os.path.join(self.temp_dir, "cache")))
+        try:
+            with mock.patch('concurrent.futures.ProcessPoolExecutor', spawn_executor), contextlib.redirect_stdout(io.StringIO()):
+                outputs = list(parse_trace_files(get_parse_cache_settings, ["a", "b"], 2, (), trace_loader.set_cache_settings, (trace_loader.get_cache_settings(),)))
+        finally:
+            trace_loader.set_cache_settings(settings)
+        self.assertEqual([output for csvfilename, output in outputs], [(False, os.path.join(self.temp_dir, "cache"))] * 2)
+
+if __name__ == '__main__':
+    unittest.main()
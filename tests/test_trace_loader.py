@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+# Checks that trace_loader converts the fixture traces in tests/data to the
+# same columns with and without NumPy, and to the same values as converting
+# the fields of csv.reader rows one by one (as the parse scripts did before
+# trace_loader), and that the columns read from the cache of a trace are the
+# same. Run with python3 -m unittest discover tests (or pytest).
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trace_loader
+from array import array
+from trace_loader import trace_schemas, load_trace, iter_trace_blocks, get_block_lists
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+fixture_prefix = os.path.join(data_dir, "LoRaWAN-fixture-")
+
+# Returns the columns (all columns of its schema, as lists) and codes of trace
+# file file_name loaded by trace_loader with or without NumPy, in blocks of
+# block_size characters
+def load_fixture(file_name, use_numpy, block_size=2000):
+    numpy = trace_loader.numpy
+    saved_block_size = trace_loader.block_size
+    trace_loader.numpy = numpy if use_numpy else None
+    trace_loader.block_size = block_size
+    try:
+        codes = {}
+        trace = load_trace(file_name, list(trace_loader.get_trace_schema(file_name)['columns']), codes)
+    finally:
+        trace_loader.numpy = numpy
+        trace_loader.block_size = saved_block_size
+    return get_block_lists(trace), codes
+
+# Returns the columns of trace file file_name loaded by trace_loader (with or
+# without the cache, see trace_loader.trace_cache) and the codes, as lists in
+# order of code
+def load_cache_fixture(file_name, columns):
+    codes = {}
+    trace = load_trace(file_name, columns, codes)
+    return get_block_lists(trace), {name: list(code_of) for name, code_of in codes.items()}
+
+class TraceLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.trace_cache = trace_loader.trace_cache
+        self.cache_root = trace_loader.cache_root
+        trace_loader.trace_cache = False
+        self.temp_dir = tempfile.mkdtemp()
+        trace_loader.cache_root = os.path.join(self.temp_dir, "cache")
+
+    def tearDown(self):
+        trace_loader.trace_cache = self.trace_cache
+        trace_loader.cache_root = self.cache_root
+        shutil.rmtree(self.temp_dir)
+
+    def test_csv_reader(self):
+        for suffix, schema in trace_schemas.items():
+            trace, codes = load_fixture(fixture_prefix + suffix, trace_loader.numpy is not None)
+            with open(fixture_prefix + suffix) as trace_file:
+                rows = list(csv.reader(trace_file, delimiter=',', quotechar='|'))[1 if schema['header'] else 0:]
+            for name, (index, column_type) in schema['columns'].items():
+                if column_type == 'code':
+                    strings = list(codes[name])
+                    self.assertEqual([strings[code] for code in trace[name]], [row[index] for row in rows], suffix + " " + name)
+                else:
+                    convert = float if column_type == 'd' else int
+                    self.assertEqual(trace[name], [convert(row[index]) for row in rows], suffix + " " + name)
+
+    def test_column_types(self):
+        # NumPy arrays of the types of the schema when NumPy is installed,
+        # arrays otherwise, also when read from the cache
+        numpy = trace_loader.numpy
+        file_name = os.path.join(self.temp_dir, "LoRaWAN-fixture-trace-phy-tx.csv")
+        shutil.copyfile(fixture_prefix + "trace-phy-tx.csv", file_name)
+        columns = ['time', 'NodeId', 'TraceSource', 'PhyTraceIdTag']
+        for use_numpy in sorted({False, numpy is not None}):
+            for trace_cache in [False, True, True]:
+                trace_loader.numpy = numpy if use_numpy else None
+                trace_loader.trace_cache = trace_cache
+                try:
+                    blocks = list(iter_trace_blocks(file_name, columns, {}))
+                finally:
+                    trace_loader.numpy = numpy
+                for name, typecode in zip(columns, 'dqqQ'):
+                    for block in blocks:
+                        if use_numpy:
+                            self.assertIsInstance(block[name], numpy.ndarray)
+                            self.assertEqual(block[name].dtype, numpy.dtype(typecode))
+                        else:
+                            self.assertIsInstance(block[name], array)
+                            self.assertEqual(block[name].typecode, typecode)
+
+    def test_cache(self):
+        # The columns read from the cache are the columns converted from the
+        # CSV file, also after adding a column to the cache, and the cache is
+        # not used once the trace has changed
+        file_name = os.path.join(self.temp_dir, "LoRaWAN-fixture-trace-mac-packets.csv")
+        shutil.copyfile(fixture_prefix + "trace-mac-packets.csv", file_name)
+        for columns in [['NodeId', 'TraceSource', 'Packet'], ['NodeId', 'TraceSource', 'Packet'], ['time', 'Packet']]:
+            trace_loader.trace_cache = False
+            expected = load_cache_fixture(file_name, columns)
+            trace_loader.trace_cache = True
+            self.assertEqual(load_cache_fixture(file_name, columns), expected, columns)
+        cache_dir = trace_loader.get_cache_dir(file_name)
+        self.assertEqual(sorted(trace_loader.load_cache_meta(file_name, cache_dir)['columns']), ['NodeId', 'Packet', 'TraceSource', 'time'])
+
+        with open(fixture_prefix + "trace-mac-packets.csv") as trace_file:
+            last_line = trace_file.readlines()[-1]
+        with open(file_name, 'a') as trace_file:
+            trace_file.write(last_line)
+        self.assertIsNone(trace_loader.load_cache_meta(file_name, cache_dir))
+        trace_loader.trace_cache = False
+        expected = load_cache_fixture(file_name, ['time', 'Packet'])
+        trace_loader.trace_cache = True
+        self.assertEqual(load_cache_fixture(file_name, ['time', 'Packet']), expected)
+        self.assertEqual(trace_loader.load_cache_meta(file_name, cache_dir)['nLines'], len(expected[0]['time']))
+
+    def test_prune_cache(self):
+        # the caches of traces that were removed or changed are pruned
+        file_names = [os.path.join(self.temp_dir, "LoRaWAN-{}-trace-mac-packets.csv".format(i)) for i in range(3)]
+        trace_loader.trace_cache = True
+        for file_name in file_names:
+            shutil.copyfile(fixture_prefix + "trace-mac-packets.csv", file_name)
+            load_cache_fixture(file_name, ['NodeId'])
+        os.remove(file_names[0])
+        with open(file_names[1], 'a') as trace_file:
+            trace_file.write("\n")
+        self.assertEqual(trace_loader.prune_cache(), 2)
+        self.assertEqual(os.listdir(trace_loader.cache_root), [os.path.basename(trace_loader.get_cache_dir(file_names[2]))])
+
+    @unittest.skipIf(trace_loader.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        for suffix in trace_schemas:
+            for block_size in [2000, trace_loader.block_size]:
+                trace, codes = load_fixture(fixture_prefix + suffix, True, block_size)
+                python_trace, python_codes = load_fixture(fixture_prefix + suffix, False, block_size)
+                self.assertEqual(trace, python_trace, suffix)
+                self.assertEqual(list(codes.items()), list(python_codes.items()), suffix) # also the order of the codes
+
+    @unittest.skipIf(trace_loader.numpy is None, "NumPy is not installed")
+    def test_numpy_long_strings(self):
+        # Packet keys longer than the initial width of string columns
+        temp_dir = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(temp_dir, "LoRaWAN-long-trace-mac-packets.csv")
+            with open(fixture_prefix + "trace-mac-packets.csv") as trace_file, open(file_name, 'w') as long_file:
+                long_file.write(trace_file.readline())
+                for i, line in enumerate(trace_file):
+                    fields = line.split(',')
+                    fields[6] = fields[6] * (i % 7 + 1)
+                    long_file.write(",".join(fields))
+            self.assertEqual(load_fixture(file_name, True), load_fixture(file_name, False))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @unittest.skipIf(trace_loader.numpy is None, "NumPy is not installed")
+    def test_numpy_strings(self):
+        file_name = fixture_prefix + "trace-mac-packets.csv"
+        numpy = trace_loader.numpy
+        blocks = {}
+        for use_numpy in [True, False]:
+            trace_loader.numpy = numpy if use_numpy else None
+            try:
+                blocks[use_numpy] = [get_block_lists(block) for block in iter_trace_blocks(file_name, ['NodeId', 'TraceSource', 'Packet'], {}, strings=['Packet'])]
+            finally:
+                trace_loader.numpy = numpy
+        self.assertEqual(blocks[True], blocks[False])
+
+if __name__ == '__main__':
+    unittest.main()
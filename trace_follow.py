@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# Following a trace file while a running simulation writes it, like tail -f.
+# Every poll only the complete lines appended since the previous poll are read
+# (with the byte ranges of trace_loader), so following a trace costs time in
+# proportion to the appended bytes. The parse scripts process the events of the
+# appended lines in streaming mode and print a snapshot of their statistics
+# every snapshot_interval seconds, see follow_trace.
+#
+# Simulations that run on a worker write their traces to a scratch directory on
+# the local disk of the worker (see scratch_dir in simulation_tasks.py), follow
+# them there, or set scratch_dir to None.
+import os
+import time
+from trace_io import strip_compression_extension
+from trace_loader import iter_trace_blocks, get_trace_schema, write_json_file, range_column
+
+poll_interval = 1.0 # seconds between checks for lines appended to a followed trace
+snapshot_interval = 10.0 # seconds between snapshots of a followed trace
+
+# Returns the position after the last complete line of trace_file between
+# positions start and end (start when there is none)
+def find_line_end(trace_file, start, end):
+    position = end
+    while position > start:
+        read_start = max(start, position - 64*1024)
+        trace_file.seek(read_start)
+        i = trace_file.read(position - read_start).rfind(b'\n')
+        if i >= 0:
+            return read_start + i + 1
+        position = read_start
+    return start
+
+# Follow trace file file_name while it is written: yields the blocks (see
+# iter_trace_blocks) of the complete lines appended to it, with the number of
+# every line (after the header) in column 'Position', and None every
+# poll_interval seconds while no lines are appended. Waits for the trace to be
+# created. Ends when the trace is removed (e.g. compressed or moved after the
+# simulation completed) or when no lines were appended for idle_timeout
+# seconds.
+def follow_trace_blocks(file_name, columns, codes=None, strings=(), idle_timeout=None):
+    if strip_compression_extension(file_name) != file_name:
+        raise ValueError("Can not follow compressed trace {}".format(file_name))
+    schema = get_trace_schema(file_name)
+    offset = None # position of the first line that was not read yet
+    n_lines = 0
+    idle_since = time.time()
+    while True:
+        end = offset
+        try:
+            with open(file_name, 'rb') as trace_file:
+                if offset is None and trace_file.readline().endswith(b'\n' if schema['header'] else b''):
+                    offset = trace_file.tell() if schema['header'] else 0
+                if offset is not None:
+                    end = find_line_end(trace_file, offset, os.fstat(trace_file.fileno()).st_size)
+        except FileNotFoundError:
+            if offset is not None:
+                print("{} was removed".format(file_name))
+                return
+        if offset is not None and end > offset:
+            for block in iter_trace_blocks(file_name, columns, codes, schema, strings, byte_range=(offset, end)):
+                block_lines = len(block[columns[0]])
+                block['Position'] = range_column(n_lines, n_lines + block_lines)
+                n_lines += block_lines
+                yield block
+            offset = end
+            idle_since = time.time()
+        elif idle_timeout is not None and time.time() - idle_since >= idle_timeout:
+            print("No lines appended to {} for {} seconds".format(file_name, idle_timeout))
+            return
+        else:
+            yield None
+            time.sleep(poll_interval)
+
+# Returns the differences of the values of snapshot values and the previous
+# snapshot previous (None for the first snapshot)
+def get_interval_values(values, previous):
+    return {name: value - (previous[name] if previous else 0) for name, value in values.items()}
+
+# Print the snapshot returned by get_snapshot(previous): a tuple (text,
+# values), with previous the values of the previous snapshot (None for the
+# first snapshot). The values are also written to snapshot_file (as JSON, the
+# file is replaced in one step, so other processes can read the latest
+# snapshot). Returns the values.
+def print_snapshot(get_snapshot, previous, snapshot_file=None):
+    text, values = get_snapshot(previous)
+    print(text, flush=True)
+    if snapshot_file:
+        write_json_file(snapshot_file, dict(values, wallTime=time.time()))
+    return values
+
+# Follow trace file file_name (see follow_trace_blocks): add_block(block) is
+# called with every block of appended lines and a snapshot (see print_snapshot)
+# is printed every snapshot_interval seconds, until the trace is no longer
+# followed or Ctrl-C is pressed. Returns the values of the last snapshot.
+def follow_trace(file_name, columns, codes, strings, add_block, get_snapshot, snapshot_file=None, idle_timeout=None):
+    print("Following {} (Ctrl-C to stop)".format(file_name), flush=True)
+    previous = None
+    snapshot_time = time.time()
+    try:
+        for block in follow_trace_blocks(file_name, columns, codes, strings, idle_timeout):
+            if block is not None:
+                add_block(block)
+            if time.time() - snapshot_time >= snapshot_interval:
+                previous = print_snapshot(get_snapshot, previous, snapshot_file)
+                snapshot_time = time.time()
+    except KeyboardInterrupt:
+        print("Stopped following {}".format(file_name))
+    return previous
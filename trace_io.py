@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# Reading and compressing ns-3 lorawan output files, and writing the output of
+# the parse scripts. Trace files may be compressed with gzip (.gz), xz (.xz) or
+# zstd (.zst, requires the zstandard module), all parse scripts read them
+# transparently.
+import gzip
+import lzma
+import io
+import os
+import shutil
+import contextlib
+import concurrent.futures
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+compression_extensions = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst'}
+
+# Returns the compression methods that are available on this machine, in
+# order of preference
+def available_compression_methods():
+    methods = ['gzip', 'xz']
+    if zstandard is not None:
+        methods.insert(0, 'zstd')
+    return methods
+
+def strip_compression_extension(file_name):
+    for extension in compression_extensions.values():
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+# Open a (possibly compressed) trace file for reading in text mode, ready to
+# be passed to csv.reader
+def open_trace(file_name, mode='rt'):
+    if file_name.endswith('.gz'):
+        f = gzip.open(file_name, 'rb')
+    elif file_name.endswith('.xz'):
+        f = lzma.open(file_name, 'rb')
+    elif file_name.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Reading {} requires the zstandard module (pip3 install zstandard)".format(file_name))
+        f = zstandard.ZstdDecompressor().stream_reader(open(file_name, 'rb'), closefd=True)
+    else:
+        return open(file_name, mode, newline='')
+    if mode == 'rb':
+        return f
+    return io.TextIOWrapper(io.BufferedReader(f) if not isinstance(f, io.BufferedIOBase) else f, newline='')
+
+# Returns the name of the output file with suffix other_suffix (e.g.
+# "sim-settings.txt") of the same simulation as trace file csvfilename (whose
+# name ends with trace_suffix, e.g. "trace-mac-packets.csv", optionally
+# followed by a compression extension). Compressed and uncompressed variants
+# are both looked up.
+def find_trace_file(csvfilename, trace_suffix, other_suffix):
+    file_name = strip_compression_extension(csvfilename).replace(trace_suffix, other_suffix)
+    candidates = [file_name] + [file_name + extension for extension in compression_extensions.values()]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return file_name
+
+# Names of the settings in sim-settings files that are not written as
+# "<name> = <value>", and the defaults of the settings the parse scripts
+# output (-1: not in the file)
+sim_settings_names = {'Data rate assignment method index': 'drCalcMethod', 'PER limit': 'drCalcPerLimit', 'Fixed Data Rate Index': 'drCalcFixedDataRateIndex'}
+sim_settings_defaults = {"nGateways": -1, "nEndDevices": -1, "totalTime": -1, "usConfirmedData": -1, "usDataPeriod": -1, "seed": -1, "drCalcMethod": -1, "drCalcMethodMisc": -1, "dsDataGenerate": -1, "dsDataExpMean": -1, "dsConfirmedData": -1}
+trace_misc_defaults = {"nrRW1Sent": -1, "nrRW2Sent": -1, "nrRW1Missed": -1, "nrRW2Missed": -1}
+
+# Returns value (a string) as an int or float when it is a number
+def parse_setting_value(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+# Returns the settings in the contents of a sim-settings file (text), in a
+# single pass over its lines ("nGateways = 4", "Data rate assignment method
+# index: 0", ...): a dict name -> value (see sim_settings_names), with
+# drCalcMethodMisc the PER limit or fixed data rate index of the data rate
+# assignment method
+def parse_sim_settings(text):
+    sim_settings = dict(sim_settings_defaults)
+    for line in text.splitlines():
+        name, separator, value = line.partition(" = ")
+        if not separator:
+            name, separator, value = line.partition(": ")
+        if separator:
+            sim_settings[sim_settings_names.get(name.strip(), name.strip())] = parse_setting_value(value.strip())
+    if sim_settings['drCalcMethod'] == 0 and 'drCalcPerLimit' in sim_settings:
+        sim_settings['drCalcMethodMisc'] = float(sim_settings['drCalcPerLimit'])
+    if sim_settings['drCalcMethod'] == 2 and 'drCalcFixedDataRateIndex' in sim_settings:
+        sim_settings['drCalcMethodMisc'] = int(sim_settings['drCalcFixedDataRateIndex'])
+    return sim_settings
+
+# Returns the settings in sim-settings file file_name (see parse_sim_settings)
+def load_sim_settings(file_name):
+    with open_trace(file_name) as sim_settings_file:
+        return parse_sim_settings(sim_settings_file.read())
+
+# Returns the counters in trace-misc file file_name (a header line and a line
+# with the values): a dict name -> value
+def load_trace_misc(file_name):
+    trace_misc = dict(trace_misc_defaults)
+    with open_trace(file_name) as trace_misc_file:
+        names = trace_misc_file.readline().strip().split(',')
+        values = trace_misc_file.readline().strip().split(',')
+    trace_misc.update(zip(names, map(int, values)))
+    return trace_misc
+
+# Compress file_name with method (gzip, xz or zstd) and remove the original.
+# Returns the name of the compressed file.
+def compress_file(file_name, method):
+    compressed_file_name = file_name + compression_extensions[method]
+    with open(file_name, 'rb') as f_in:
+        if method == 'gzip':
+            f_out = gzip.open(compressed_file_name, 'wb', compresslevel=6)
+        elif method == 'xz':
+            f_out = lzma.open(compressed_file_name, 'wb')
+        elif method == 'zstd':
+            f_out = zstandard.ZstdCompressor(level=9).stream_writer(open(compressed_file_name, 'wb'), closefd=True)
+        with f_out:
+            shutil.copyfileobj(f_in, f_out, 1024*1024)
+    shutil.copystat(file_name, compressed_file_name)
+    os.remove(file_name)
+    return compressed_file_name
+
+# Append the output lines of a parse script to the output CSV file file_name,
+# starting with header when the file is empty. The file is locked while the
+# lines are appended, so parse scripts that run at the same time append whole
+# lines and write the header once.
+def append_output_lines(file_name, header, lines):
+    with open(file_name, 'a') as output_file: # append to output file
+        if fcntl is not None:
+            fcntl.flock(output_file, fcntl.LOCK_EX)
+        output_file.seek(0, os.SEEK_END)
+        if output_file.tell() == 0:
+            output_file.write(header)
+        output_file.writelines(lines)
+        output_file.flush()
+
+# Run parse_trace_file(csvfilename, *args) in a process of the pool of
+# parse_trace_files, returns (what it printed, its outputs)
+def parse_trace_file_quietly(parse_trace_file, csvfilename, args):
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        outputs = parse_trace_file(csvfilename, *args)
+    return printed.getvalue(), outputs
+
+# Parse the trace files csvfilenames with parse_trace_file(csvfilename, *args)
+# (the function of a parse script) in sorted order of the file names. Yields
+# (file name, outputs) in that order, so the output files of the parse script
+# are the same whatever the number of jobs. With jobs > 1 the files are parsed
+# in a pool of jobs processes; what is printed while parsing a file is printed
+# at once when the file gets its turn. initializer(*initargs) is called in
+# every process of the pool, e.g. trace_loader.set_cache_settings: the
+# processes do not inherit the module settings of this process with the spawn
+# and forkserver start methods.
+def parse_trace_files(parse_trace_file, csvfilenames, jobs=1, args=(), initializer=None, initargs=()):
+    csvfilenames = sorted(csvfilenames)
+    if jobs <= 1:
+        for csvfilename in csvfilenames:
+            yield csvfilename, parse_trace_file(csvfilename, *args)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as executor:
+        futures = [executor.submit(parse_trace_file_quietly, parse_trace_file, csvfilename, args) for csvfilename in csvfilenames]
+        for csvfilename, future in zip(csvfilenames, futures):
+            printed, outputs = future.result()
+            print(printed, end='')
+            yield csvfilename, outputs
@@ -0,0 +1,471 @@
+#!/usr/bin/python3
+# Fast loading of ns-3 lorawan trace CSV files for the parse scripts.
+#
+# trace_schemas describes the columns of every trace file. The parse scripts
+# only load the columns they need: the trace is read in large blocks of lines
+# and every column is converted at once into a typed array, so no Python object
+# is kept per field. When NumPy is installed, the fields of a block are split
+# and converted by numpy.loadtxt and the columns are NumPy arrays. Otherwise
+# they are split and converted in Python and the columns are arrays of the
+# array module, with the same values. String columns with few distinct values
+# (e.g. TraceSource: MacTx, PhyRxDrop, ...) and packet keys are interned to
+# small integer codes, the strings are in the codes dict passed to the loader
+# (column name -> {string: code}, codes are assigned in order of first
+# appearance).
+import argparse
+import os
+import json
+import hashlib
+import mmap
+import shutil
+import tempfile
+from array import array
+from trace_io import open_trace, strip_compression_extension
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Column types: 'd' float, 'q' signed and 'Q' unsigned 64 bit integer (array
+# type codes), 'code' interned string
+trace_schemas = {
+    'trace-mac-packets.csv': {'header': True,
+                              'columns': {'time': (0, 'd'), 'DeviceType': (1, 'q'), 'NodeId': (2, 'q'), 'IsNetworkServer': (3, 'q'), 'PhyIndex': (4, 'q'),
+                                          'TraceSource': (5, 'code'), 'Packet': (6, 'code'), 'PacketLength': (7, 'q'), 'Misc': (8, 'q')}},
+    'trace-phy-tx.csv': {'header': True,
+                         'columns': {'time': (0, 'd'), 'DeviceType': (1, 'q'), 'NodeId': (2, 'q'), 'IsNetworkServer': (3, 'q'), 'PhyIndex': (4, 'q'),
+                                     'TraceSource': (5, 'code'), 'PhyTraceIdTag': (6, 'Q'), 'Packet': (7, 'code'), 'PacketLength': (8, 'q'),
+                                     'Misc1': (9, 'q'), 'Misc2': (10, 'q')}},
+    'trace-ns-dsmsgs.csv': {'header': True,
+                            'columns': {'time': (0, 'd'), 'TraceSource': (1, 'code'), 'NodeId': (2, 'q'), 'MsgType': (3, 'q'), 'TxRemaining': (4, 'q'),
+                                        'Packet': (5, 'code'), 'PacketLength': (6, 'q'), 'ReceiveWindow': (7, 'q')}},
+    'nodes.csv': {'header': False,
+                  'columns': {'NodeId': (0, 'q'), 'DeviceType': (1, 'q'), 'Distance': (4, 'd'), 'DataRateIndex': (5, 'q')}},
+}
+
+block_size = 1024*1024 # characters of CSV per block
+cache_block_lines = 64*1024 # lines per block read from the cache
+trace_cache = True # cache the columns of the traces, see iter_trace_blocks
+cache_version = 1 # part of the fingerprint of a cache, increment when the format of the cache changes
+# Directory of the caches of the traces, on local disk: the caches are larger
+# than the (compressed) traces and do not belong in the shared output tree
+cache_root = os.path.join(tempfile.gettempdir(), "lorawan-trace-cache-{}".format(os.getuid()))
+cache_pruned = False # whether this process has pruned cache_root (see prune_cache)
+
+# Returns the cache settings of this process (trace_cache and cache_root), for
+# set_cache_settings
+def get_cache_settings():
+    return trace_cache, cache_root
+
+# Initializer of the processes of a pool that parse traces: use the cache
+# settings (see get_cache_settings) of the process that started the pool
+def set_cache_settings(settings):
+    global trace_cache, cache_root
+    trace_cache, cache_root = settings
+
+# Returns the schema of trace file file_name (optionally compressed)
+def get_trace_schema(file_name):
+    file_name = strip_compression_extension(file_name)
+    for suffix, schema in trace_schemas.items():
+        if file_name.endswith(suffix):
+            return schema
+    raise ValueError("Unknown trace file {}".format(file_name))
+
+# Returns column (an array of the array module) as a column of the loader: a
+# NumPy array with the same values when NumPy is installed, column otherwise
+def as_column(column):
+    if numpy is not None and isinstance(column, array):
+        return numpy.frombuffer(column, column.typecode)
+    return column
+
+# Returns the column with the values of start to stop (excluded), e.g. the
+# position of the lines of a block
+def range_column(start, stop):
+    return as_column(array('q', range(start, stop)))
+
+# Returns the values of column (a column of the loader or a list) at indexes,
+# in a column of the same kind
+def take_column(column, indexes):
+    if isinstance(column, list):
+        return [column[i] for i in indexes]
+    if numpy is not None and isinstance(column, numpy.ndarray):
+        return column[numpy.asarray(indexes, numpy.intp)]
+    return array(column.typecode, map(column.__getitem__, indexes))
+
+# Returns column (a column of the loader) converted to type typecode (array
+# type code), e.g. to a smaller type to keep the events of a whole trace
+def convert_column(column, typecode):
+    if numpy is not None and isinstance(column, numpy.ndarray):
+        return column.astype(typecode, copy=False)
+    return column if column.typecode == typecode else array(typecode, column)
+
+# Returns the concatenation of columns (a non-empty list of columns of the same
+# kind, see take_column)
+def concatenate_columns(columns):
+    if isinstance(columns[0], list):
+        return [value for column in columns for value in column]
+    if numpy is not None and isinstance(columns[0], numpy.ndarray):
+        return numpy.concatenate(columns)
+    column = array(columns[0].typecode)
+    for other in columns:
+        column.extend(other)
+    return column
+
+# Returns the columns in names (all columns when None) of block as lists, for the
+# code that processes the lines of a block one by one: iterating a list is
+# faster than iterating an array, and the values are Python ints and floats
+def get_block_lists(block, names=None):
+    return {name: block[name] if isinstance(block[name], list) else block[name].tolist() for name in (block if names is None else names)}
+
+# Convert the values (strings) of a column of a block to a column of codes,
+# adding the new strings to code_of (string -> code)
+def intern_column(values, code_of):
+    for value in dict.fromkeys(values): # distinct values in order of appearance
+        if value not in code_of:
+            code_of[value] = len(code_of)
+    return as_column(array('q', map(code_of.__getitem__, values)))
+
+# Returns the index of the first occurrence of every distinct value of column
+# (an array of byte strings) and the index of the distinct value of every
+# element, like numpy.unique(column, return_index=True, return_inverse=True)
+# but faster: the values are grouped by a hash of their bytes instead of
+# sorting the strings (exact numpy.unique when two values have the same hash)
+def get_distinct_values(column):
+    words = numpy.ascontiguousarray(column).view(numpy.uint64).reshape(len(column), -1)
+    hashes = words[:, 0].copy()
+    for i in range(1, words.shape[1]):
+        hashes *= numpy.uint64(0x100000001b3)
+        hashes ^= words[:, i]
+    hashes, first_indexes, value_indexes = numpy.unique(hashes, return_index=True, return_inverse=True)
+    if not numpy.array_equal(column[first_indexes][value_indexes], column):
+        values, first_indexes, value_indexes = numpy.unique(column, return_index=True, return_inverse=True)
+    return first_indexes, value_indexes
+
+# Convert the lines of a block (list of strings) to the columns of
+# column_types (see iter_csv_blocks) with numpy.loadtxt, like convert_block.
+# String columns are read as byte strings of the width in string_widths
+# (column name -> number of bytes, a multiple of 8), a column with a value
+# that may have been truncated is read again with twice the width. Returns
+# None when loadtxt can not convert the block (e.g. lines with fewer fields),
+# loadtxt accepts a subset of the numbers int and float accept.
+def convert_block_numpy(lines, column_types, codes, strings, string_widths):
+    while True:
+        dtype = numpy.dtype([(name, 'S{}'.format(string_widths.setdefault(name, 32)) if column_type == 'code' else column_type) for name, index, column_type in column_types])
+        try:
+            table = numpy.loadtxt(lines, delimiter=',', dtype=dtype, usecols=[index for name, index, column_type in column_types], comments=None, ndmin=1)
+        except ValueError:
+            return None
+        truncated = [name for name, index, column_type in column_types if column_type == 'code' and len(table) and numpy.char.str_len(table[name]).max() == string_widths[name]]
+        if not truncated:
+            break
+        for name in truncated:
+            string_widths[name] *= 2
+    block = {}
+    for name, index, column_type in column_types:
+        column = table[name]
+        if column_type == 'code' and name in strings:
+            block[name] = numpy.char.decode(column, 'ascii').tolist()
+        elif column_type == 'code':
+            # a code per distinct value, in order of appearance
+            first_indexes, value_indexes = get_distinct_values(column)
+            code_of = codes[name]
+            value_codes = numpy.empty(len(first_indexes), numpy.int64)
+            for i in numpy.argsort(first_indexes):
+                value_codes[i] = code_of.setdefault(column[first_indexes[i]].decode('ascii'), len(code_of))
+            block[name] = value_codes[value_indexes]
+        else:
+            block[name] = numpy.ascontiguousarray(column)
+    return block
+
+# Convert the fields (strings) of a block (see iter_csv_blocks) to the columns
+# of column_types, get_column(index) returns the fields of column index. The
+# columns are converted to NumPy arrays when NumPy is installed (see
+# as_column), for the blocks that convert_block_numpy can not convert.
+def convert_block(get_column, column_types, codes, strings):
+    block = {}
+    for name, index, column_type in column_types:
+        values = get_column(index)
+        if column_type == 'code' and name in strings:
+            block[name] = values
+        elif column_type == 'code':
+            block[name] = intern_column(values, codes[name])
+        elif column_type == 'd':
+            block[name] = array('d', map(float, values))
+        else:
+            distinct = dict.fromkeys(values)
+            if len(distinct) * 8 < len(values):
+                # few distinct values (e.g. DeviceType): convert every value once
+                distinct = {value: int(value) for value in distinct}
+                block[name] = array(column_type, map(distinct.__getitem__, values))
+            else:
+                block[name] = array(column_type, map(int, values))
+        block[name] = as_column(block[name])
+    return block
+
+# Read the columns (list of column names) of trace file file_name in blocks of
+# lines. Yields a dict per block: column name -> column (a NumPy array or an
+# array, see as_column). codes (column name ->
+# {string: code}) is updated with the codes of the interned columns, except for
+# the interned columns in strings, which are returned as lists of strings (e.g.
+# the packet keys of a trace that is processed in streaming mode, for which the
+# codes would grow with the length of the trace). With byte_range (start, end)
+# only the lines in that part of the (uncompressed) file are read, start and
+# end must be at the start of a line after the header (see trace_partitions).
+#
+# Unless trace_cache is off, the columns of the whole file are read from the
+# cache of the trace when it has them (see get_cache_dir), otherwise they are
+# converted from the CSV file and added to the cache.
+def iter_trace_blocks(file_name, columns, codes=None, schema=None, strings=(), byte_range=None):
+    schema = schema or get_trace_schema(file_name)
+    codes = codes if codes is not None else {}
+    column_types = [(name,) + schema['columns'][name] for name in columns]
+    for name, index, column_type in column_types:
+        if column_type == 'code' and name not in strings:
+            codes.setdefault(name, {})
+    if not trace_cache or byte_range is not None:
+        return iter_csv_blocks(file_name, column_types, codes, schema, strings, byte_range)
+    cache_dir = get_cache_dir(file_name)
+    meta = load_cache_meta(file_name, cache_dir)
+    if meta is not None and all(meta['columns'].get(name) == [index, column_type] for name, index, column_type in column_types):
+        return iter_cached_blocks(cache_dir, meta, column_types, codes, strings)
+    return iter_caching_blocks(file_name, cache_dir, meta, column_types, codes, schema, strings)
+
+# Yields the blocks of columns (column_types: list of (name, index, type)) of
+# trace file file_name converted from the CSV file (see iter_trace_blocks)
+def iter_csv_blocks(file_name, column_types, codes, schema, strings=(), byte_range=None):
+    with open_trace(file_name) if byte_range is None else open(file_name, 'rb') as trace_file:
+        n_fields = None
+        string_widths = {}
+        if byte_range is not None:
+            trace_file.seek(byte_range[0])
+            remaining = byte_range[1] - byte_range[0]
+        elif schema['header']:
+            n_fields = trace_file.readline().count(',') + 1
+        while True:
+            if byte_range is None:
+                text = trace_file.read(block_size)
+                if not text:
+                    break
+                text += trace_file.readline() # complete the last line of the block
+            else:
+                if remaining <= 0:
+                    break
+                data = trace_file.read(min(block_size, remaining))
+                if not data:
+                    break
+                if len(data) < remaining:
+                    data += trace_file.readline()
+                remaining -= len(data)
+                text = data.decode()
+            text = text.replace('\r', '').rstrip('\n')
+            if n_fields is None:
+                n_fields = text.partition('\n')[0].count(',') + 1
+            block = None
+            if numpy is not None and text.isascii(): # loadtxt reads byte strings as latin-1
+                block = convert_block_numpy(text.split('\n'), column_types, codes, strings, string_widths)
+            if block is None:
+                # Split all fields of the block at once, column i of the block
+                # is then every n_fields'th field starting at i. Blocks with
+                # lines with a different number of fields are split line by
+                # line.
+                fields = text.replace('\n', ',').split(',')
+                n_lines = text.count('\n') + 1
+                if len(fields) == n_fields * n_lines:
+                    get_column = lambda index: fields[index::n_fields]
+                else:
+                    rows = [line.split(',') for line in text.split('\n') if line]
+                    get_column = lambda index: [row[index] for row in rows]
+                block = convert_block(get_column, column_types, codes, strings)
+                del fields
+            yield block
+
+# Cache of the columns of a trace file: a directory in cache_root, named after
+# a hash of the path of the trace file and its name, with a binary file per
+# column (the values as a typed array, interned strings as codes, with a JSON
+# file with the strings in order of code) and meta.json with the fingerprint of
+# the trace file (see get_trace_fingerprint), the number of lines and the
+# index and type of every cached column. A cache whose fingerprint or column
+# definitions do not match the trace file and trace_schemas is not used and is
+# replaced by the next read.
+def get_cache_dir(file_name):
+    path = os.path.abspath(file_name)
+    return os.path.join(cache_root, "{}-{}".format(hashlib.sha1(path.encode()).hexdigest()[:16], os.path.basename(path)))
+
+def get_trace_fingerprint(file_name):
+    stat = os.stat(file_name)
+    return {'cacheVersion': cache_version, 'path': os.path.abspath(file_name), 'size': stat.st_size, 'mtimeNs': stat.st_mtime_ns}
+
+# Returns the metadata of the cache of trace file file_name in cache_dir, None
+# if there is no valid cache
+def load_cache_meta(file_name, cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+    if meta.get('fingerprint') != get_trace_fingerprint(file_name):
+        return None
+    return meta
+
+# Remove the caches in cache_root of trace files that no longer exist (e.g.
+# compressed, moved or removed) or that changed since they were cached.
+# Returns the number of removed caches.
+def prune_cache():
+    global cache_pruned
+    cache_pruned = True
+    try:
+        cache_names = sorted(os.listdir(cache_root))
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for cache_name in cache_names:
+        cache_dir = os.path.join(cache_root, cache_name)
+        try:
+            with open(os.path.join(cache_dir, "meta.json")) as meta_file:
+                fingerprint = json.load(meta_file)['fingerprint']
+        except (OSError, ValueError, KeyError):
+            continue # e.g. the first columns of the cache are still being written
+        try:
+            if fingerprint == get_trace_fingerprint(fingerprint['path']):
+                continue
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        removed += 1
+    return removed
+
+# Yields the blocks of columns (see iter_csv_blocks) from the cache in
+# cache_dir (see load_cache_meta), in blocks of cache_block_lines lines. The
+# column files are memory mapped, the codes of interned columns are translated
+# to codes in order of first appearance, as if the trace was read from the CSV
+# file.
+def iter_cached_blocks(cache_dir, meta, column_types, codes, strings=()):
+    n_lines = meta['nLines']
+    if n_lines == 0:
+        return
+    views = {}
+    cached_codes = {}
+    for name, index, column_type in column_types:
+        with open(os.path.join(cache_dir, name + ".bin"), 'rb') as column_file:
+            views[name] = memoryview(mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ))
+        if column_type == 'code':
+            with open(os.path.join(cache_dir, name + ".json")) as codes_file:
+                cached_codes[name] = json.load(codes_file)
+    code_maps = {name: [None] * len(cached_codes[name]) for name in cached_codes if name not in strings}
+    for start in range(0, n_lines, cache_block_lines):
+        block = {}
+        for name, index, column_type in column_types:
+            column = array(meta['typecodes'][name])
+            column.frombytes(views[name][start * column.itemsize:(start + cache_block_lines) * column.itemsize])
+            if column_type == 'code' and name in strings:
+                column = list(map(cached_codes[name].__getitem__, column))
+            elif column_type == 'code':
+                code_map = code_maps[name]
+                code_of = codes[name]
+                for cached_code in dict.fromkeys(column): # distinct codes in order of appearance
+                    if code_map[cached_code] is None:
+                        code_map[cached_code] = code_of.setdefault(cached_codes[name][cached_code], len(code_of))
+                if any(code_map[cached_code] != cached_code for cached_code in dict.fromkeys(column)):
+                    column = array('q', map(code_map.__getitem__, column))
+            block[name] = as_column(column)
+        yield block
+
+# Yields the blocks of columns (see iter_csv_blocks) converted from the CSV
+# file, and writes the columns that are not in the cache yet to the cache once
+# the whole file has been read. meta is the metadata of the existing cache
+# (None when there is no valid cache).
+def iter_caching_blocks(file_name, cache_dir, meta, column_types, codes, schema, strings=()):
+    fingerprint = get_trace_fingerprint(file_name)
+    if meta is None:
+        meta = {'fingerprint': fingerprint, 'nLines': 0, 'columns': {}, 'typecodes': {}}
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        if not cache_pruned: # once per process, a new cache often replaces the cache of a trace that was compressed or moved
+            prune_cache()
+    new_columns = [(name, index, column_type) for name, index, column_type in column_types if meta['columns'].get(name) != [index, column_type]]
+    column_files = {}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for name, index, column_type in new_columns:
+            column_files[name] = open(os.path.join(cache_dir, "{}.bin.{}".format(name, os.getpid())), 'wb')
+    except OSError as e:
+        print("Not caching {}: {}".format(file_name, e))
+        for column_file in column_files.values():
+            column_file.close()
+        column_files = {}
+    string_codes = {name: {} for name in strings} # codes of the string columns in the cache
+    n_lines = 0
+    completed = False
+    try:
+        for block in iter_csv_blocks(file_name, column_types, codes, schema, strings):
+            if column_files:
+                for name, index, column_type in new_columns:
+                    column = block[name]
+                    if name in strings:
+                        column = intern_column(column, string_codes[name])
+                    column.tofile(column_files[name])
+                n_lines += len(block[column_types[0][0]])
+            yield block
+        completed = True
+    finally:
+        for column_file in column_files.values():
+            column_file.close()
+            if not completed: # the blocks were not all read, the columns are incomplete
+                os.remove(column_file.name)
+    if not column_files:
+        return
+
+    # The whole file has been read: move the new columns into the cache
+    try:
+        if get_trace_fingerprint(file_name) != fingerprint or (meta['columns'] and meta['nLines'] != n_lines):
+            raise OSError("the trace file has changed while it was read")
+        for name, index, column_type in new_columns:
+            if column_type == 'code':
+                write_json_file(os.path.join(cache_dir, name + ".json"), list(string_codes[name] if name in strings else codes[name]))
+            os.replace(column_files[name].name, os.path.join(cache_dir, name + ".bin"))
+            meta['columns'][name] = [index, column_type]
+            meta['typecodes'][name] = 'q' if column_type == 'code' else column_type
+        meta['nLines'] = n_lines
+        write_json_file(os.path.join(cache_dir, "meta.json"), meta)
+    except OSError as e:
+        print("Not caching {}: {}".format(file_name, e))
+        for column_file in column_files.values():
+            if os.path.exists(column_file.name):
+                os.remove(column_file.name)
+
+# Write data as JSON to file_name, replacing the file in one step
+def write_json_file(file_name, data):
+    tmp_file_name = "{}.{}".format(file_name, os.getpid())
+    with open(tmp_file_name, 'w') as json_file:
+        json.dump(data, json_file)
+    os.replace(tmp_file_name, file_name)
+
+# Add the --no-cache and --cache-dir arguments to the parser of a parse script
+def add_cache_arguments(parser):
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='Do not read or write the cache of the parsed trace columns (see trace_loader.py)')
+    parser.add_argument('--cache-dir', dest='cachedir', default=cache_root, help='Directory of the cache of the parsed trace columns (default: {})'.format(cache_root))
+
+# Returns the columns of trace file file_name: a dict column name -> column
+# with the values of all lines (see iter_trace_blocks)
+def load_trace(file_name, columns, codes=None, schema=None):
+    schema = schema or get_trace_schema(file_name)
+    blocks = {name: [as_column(array('q' if schema['columns'][name][1] == 'code' else schema['columns'][name][1]))] for name in columns}
+    for block in iter_trace_blocks(file_name, columns, codes, schema):
+        for name in columns:
+            blocks[name].append(block[name])
+    return {name: concatenate_columns(column_blocks) for name, column_blocks in blocks.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show or prune the cache of the parsed trace columns.')
+    parser.add_argument('--cache-dir', dest='cachedir', default=cache_root, help='Directory of the cache (default: {})'.format(cache_root))
+    parser.add_argument('--prune', action='store_true', help='Remove the caches of traces that no longer exist or changed')
+    args = parser.parse_args()
+
+    cache_root = args.cachedir
+    if args.prune:
+        print("Removed {} caches".format(prune_cache()))
+    n_caches = 0
+    n_bytes = 0
+    for dir_path, dir_names, file_names in os.walk(cache_root):
+        n_caches += dir_path != cache_root
+        n_bytes += sum(os.path.getsize(os.path.join(dir_path, file_name)) for file_name in file_names)
+    print("{} caches, {:.1f} MB in {}".format(n_caches, n_bytes / 1e6, cache_root))
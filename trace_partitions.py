@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# Parsing of a single large trace file in parallel. The trace is split into
+# byte ranges of whole lines (chunks) that are read by a pool of processes.
+# Every chunk is split by the key of its events (e.g. the PhyTraceIdTag of the
+# PHY trace, the packet of the MAC trace) into partitions, so all events with
+# the same key end up in the same partition, in trace order. The partitions
+# are then processed in parallel and the parse script merges their results
+# (see merge_counts).
+#
+# The lines of a chunk are numbered by their position: chunk index << 32 plus
+# the line number in the chunk, so results of the partitions can be put back
+# in trace order (e.g. the messages about unexpected packets).
+import os
+import zlib
+import bisect
+import itertools
+import concurrent.futures
+import trace_loader
+from trace_io import compression_extensions
+from trace_loader import iter_trace_blocks, get_trace_schema, range_column, take_column, concatenate_columns
+
+chunks_per_job = 4 # chunks and partitions per process, so one slow chunk or partition does not hold up the others
+
+# Returns whether trace file file_name can be split into chunks, compressed
+# files can only be read from the start
+def can_partition(file_name):
+    return not any(file_name.endswith(extension) for extension in compression_extensions.values())
+
+# Returns the byte ranges (start, end) of at most n_chunks chunks of whole lines
+# of trace file file_name, after the header line if header is set
+def get_chunk_ranges(file_name, n_chunks, header=True):
+    size = os.path.getsize(file_name)
+    with open(file_name, 'rb') as trace_file:
+        if header:
+            trace_file.readline()
+        boundaries = [trace_file.tell()]
+        for i in range(1, n_chunks):
+            position = boundaries[0] + (size - boundaries[0]) * i // n_chunks
+            if position - 1 < boundaries[-1]:
+                continue
+            trace_file.seek(position - 1)
+            trace_file.readline() # the next chunk starts at the next line
+            boundaries.append(trace_file.tell())
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+# Yields the blocks (see iter_trace_blocks) of chunk chunk_index (a byte range
+# of trace file file_name), with the position of every line in column
+# 'Position'
+def iter_chunk_blocks(file_name, chunk, chunk_index, columns, codes=None, strings=()):
+    position = chunk_index << 32
+    for block in iter_trace_blocks(file_name, columns, codes, strings=strings, byte_range=chunk):
+        n_lines = len(block[columns[0]])
+        block['Position'] = range_column(position, position + n_lines)
+        position += n_lines
+        yield block
+
+# Returns the partition of every key of keys (a list of strings or a column of
+# integers, see trace_loader), the same in every process (unlike hash() of a
+# string): a list for strings, a column otherwise
+def get_partitions(keys, n_partitions):
+    if isinstance(keys, list):
+        return [zlib.crc32(key.encode()) % n_partitions for key in keys]
+    if trace_loader.numpy is not None and isinstance(keys, trace_loader.numpy.ndarray):
+        return keys % n_partitions
+    return [key % n_partitions for key in keys]
+
+# Split block (column name -> column or list) by the partition of every line
+# (see get_partitions). Returns a block per partition, the lines of every
+# partition stay in trace order.
+def partition_block(block, partitions, n_partitions):
+    if isinstance(partitions, list):
+        order = sorted(range(len(partitions)), key=partitions.__getitem__) # stable, so in trace order per partition
+        sorted_partitions = [partitions[i] for i in order]
+        bounds = [bisect.bisect_left(sorted_partitions, partition) for partition in range(n_partitions + 1)]
+    else:
+        order = trace_loader.numpy.argsort(partitions, kind='stable')
+        bounds = trace_loader.numpy.searchsorted(partitions[order], range(n_partitions + 1)).tolist()
+    partition_blocks = [{} for partition in range(n_partitions)]
+    for name, column in block.items():
+        column = take_column(column, order)
+        for partition in range(n_partitions):
+            partition_blocks[partition][name] = column[bounds[partition]:bounds[partition + 1]]
+    return partition_blocks
+
+# Returns the concatenation of blocks (in trace order) with the same columns
+def concatenate_blocks(blocks):
+    columns = {}
+    for other in blocks:
+        for name, column in other.items():
+            columns.setdefault(name, []).append(column)
+    return {name: concatenate_columns(name_columns) for name, name_columns in columns.items()}
+
+# Add the counts of other to total: numbers are added, lists and tuples element
+# by element and dicts (including Counters) key by key, keys that are not in
+# total yet are copied. Returns total (a new tuple for tuples and numbers).
+def merge_counts(total, other):
+    if isinstance(total, dict):
+        for key, value in other.items():
+            total[key] = merge_counts(total[key], value) if key in total else value
+        return total
+    if isinstance(total, list):
+        for i, value in enumerate(other):
+            total[i] = merge_counts(total[i], value)
+        return total
+    if isinstance(total, tuple):
+        return tuple(merge_counts(a, b) for a, b in zip(total, other))
+    return total + other
+
+# Parse trace file file_name with jobs processes.
+# read_chunk(file_name, chunk, chunk_index, n_partitions) reads a chunk (see
+# iter_chunk_blocks) and returns (chunk result, list with a block per
+# partition). combine_chunks(chunk results) combines the results of all
+# chunks, in trace order, into the context of the partitions (e.g. the device
+# type of every node). process_partition(block, context) processes the events
+# of a partition, in trace order. Returns (context, results of
+# process_partition).
+def parse_partitioned(file_name, jobs, read_chunk, combine_chunks, process_partition):
+    chunks = get_chunk_ranges(file_name, jobs * chunks_per_job, get_trace_schema(file_name)['header'])
+    n_partitions = jobs * chunks_per_job
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=trace_loader.set_cache_settings, initargs=(trace_loader.get_cache_settings(),)) as executor:
+        chunk_results = list(executor.map(read_chunk, itertools.repeat(file_name), chunks, range(len(chunks)), itertools.repeat(n_partitions)))
+        context = combine_chunks([chunk_result for chunk_result, partition_blocks in chunk_results])
+        partitions = [concatenate_blocks([partition_blocks[partition] for chunk_result, partition_blocks in chunk_results]) for partition in range(n_partitions)]
+        del chunk_results
+        return context, list(executor.map(process_partition, partitions, itertools.repeat(context)))
@@ -1,33 +1,237 @@
 #!/usr/bin/python3
-# Dispatch a number of simulation tasks to a celery task queue
-import time
-from simulation_tasks import run_simulation_task
-
-def dispatch_simulation_tasks(cli_commands):
-    print("Dispatching following cli commands to celery workers:")
-    results = list()
-    for i in range(len(cli_commands)):
-        cli_command = cli_commands[i]
+# Dispatch a number of simulation tasks to a celery task queue or to a local
+# pool of processes
+import os
+import uuid
+import itertools
+import concurrent.futures
+from celery.result import ResultSet, AsyncResult
+from celery.backends.rpc import RPCBackend
+import simulation_tasks
+from simulation_tasks import app, run_simulation_task, run_simulation, trace_parsers
+from ns3_command import get_ns3_build_id, command_fingerprint
+from completion_manifest import load_manifest, is_completed, record_completion
+from cost_model import calibrate, load_run_times, estimate_cost
+from dispatch_journal import open_journal, write_journal_event, load_journal
+from results_db import results_file_name, open_results, get_results_table_names, keep_unexported_outputs, store_results, export_results
+from run_metrics import open_run_metrics, record_run_metrics
+
+# Number of commands that are ordered by estimated cost at a time (see
+# iter_dispatch_order): a sweep is expanded and dispatched one window at a time
+dispatch_window = 1000
+
+# Add the command line arguments of dispatch_simulation_tasks to parser
+def add_dispatch_arguments(parser):
+    parser.add_argument('--backend', choices=['celery', 'local'], default='celery', help='Run the simulations on celery workers (default) or in a pool of local processes (no broker needed)')
+    parser.add_argument('--processes', type=int, default=None, help='Number of simulations run in parallel by the local backend (default: number of CPUs)')
+    parser.add_argument('--no-skip-completed', dest='skipcompleted', action='store_false', help='Also dispatch simulations that are in the completion manifest')
+    parser.add_argument('--journal', default=None, help='Journal file of the dispatched tasks (default: output/<sweep name>.journal.jsonl)')
+    parser.add_argument('--resume', action='store_true', help='Resume the dispatcher that wrote the journal: reattach to tasks that are still running and only resubmit tasks that never finished')
+    parser.add_argument('--parse', action='store_true', help='Parse the traces of every simulation on the worker right after the simulation, store the output of the parse scripts in the results database and export their output files from it')
+    parser.add_argument('--parse-output-dir', dest='parseoutputdir', default='.', help='Directory of the results database and the output files of the parse scripts (with --parse, default: current directory)')
+
+# Returns the output files of the parse scripts in output_dir, by name of the
+# parse script (module): (table names, output files) of its outputs (see
+# results_db.py)
+def get_parse_output_files(output_dir):
+    return {trace_parser.__name__: (get_results_table_names(trace_parser.output_file_names),
+                                    {output_name: os.path.join(output_dir, file_name) for output_name, file_name in trace_parser.output_file_names.items()})
+            for trace_parser in trace_parsers.values()}
+
+# Store the output of the parse scripts of a simulation (parsedOutputs of its
+# summary) in the results database results_db
+def store_parsed_outputs(results_db, summary):
+    parse_modules = {trace_parser.__name__: trace_parser for trace_parser in trace_parsers.values()}
+    for module_name, outputs in sorted(summary['parsedOutputs'].items()):
+        store_results(results_db, get_results_table_names(parse_modules[module_name].output_file_names), summary['outputFileNamePrefix'], summary['simSettings'], outputs)
+
+# Export the output files of the parse scripts in output_dir from the results
+# database results_db
+def export_parsed_outputs(results_db, output_dir):
+    for module_name, (table_names, output_files) in sorted(get_parse_output_files(output_dir).items()):
+        for output_name, file_name in sorted(output_files.items()):
+            print("Exporting {} to {}".format(table_names[output_name], file_name))
+            export_results(results_db, table_names[output_name], file_name)
+
+# Initializer of the processes of the local backend
+def init_local_process():
+    if simulation_tasks.use_staged_program:
+        simulation_tasks.stage_ns3_program()
+
+def print_dispatched_command(cli_command, cost):
+    if cost is not None:
+        print("[estimated cost {:.1f}] {}".format(cost, cli_command))
+    else:
         print(cli_command)
-        task_id = "{}".format(i) # apparently integers don't work
-
-        r = run_simulation_task.apply_async((cli_command,), task_id=task_id) # set task id to command
-        results.append(r)
-
-    print("\nWaiting for all tasks to complete:")
-    stop = False
-    num_tasks = len(results)
-    while not stop:
-        for i in range(len(results)):
-            r = results[i]
-            if r.ready():
-                task_id = r.id
-                list_index = int(task_id)
-                print ("Task #{}/{} has completed: {}".format(task_id, num_tasks, cli_commands[list_index]))
-                results.pop(i) # task finished, so remove it from results
-                break
-
-        if len(results) == 0:
-            print("All tasks have completed. Stopping")
-            stop = True
-        time.sleep(0.100)
+
+# Yields (index, command, estimated cost) of the commands of cli_commands (an
+# iterable, e.g. a generator of the commands of a sweep) in dispatch order. With
+# longest_first, the commands are read in windows of dispatch_window commands
+# and the commands of every window are yielded in order of decreasing estimated
+# run time (see cost_model.py), otherwise in order (with cost None). Only a
+# window of commands is in memory, and the first window is dispatched before
+# the rest of the sweep is expanded.
+def iter_dispatch_order(cli_commands, longest_first=True):
+    coefficients = calibrate(load_run_times()) if longest_first else None
+    commands = enumerate(cli_commands)
+    while True:
+        window = [(i, cli_command, estimate_cost(cli_command, coefficients) if longest_first else None) for i, cli_command in itertools.islice(commands, dispatch_window)]
+        if not window:
+            return
+        if longest_first:
+            window.sort(key=lambda task: task[2], reverse=True)
+        yield from window
+
+# cli_commands is an iterable of commands, which is read once, while the
+# commands are dispatched. num_commands is the number of commands, for the
+# progress messages (default: len(cli_commands)).
+# When skip_completed is set, simulations that already completed with the
+# current ns-3 build (according to the completion manifest) are not dispatched
+# again.
+# When longest_first is set, the simulations are dispatched in order of
+# decreasing estimated run time (see cost_model.py), so the longest simulations
+# do not end up last and determine the duration of the whole sweep. The
+# commands are ordered per window of dispatch_window commands (see
+# iter_dispatch_order).
+# backend is either 'celery' (run on the celery workers) or 'local' (run the
+# simulations in a pool of parallel processes on this machine).
+# Every submitted, completed and failed task is recorded in the journal file
+# journal_file_name. With resume set, the journal of a previous dispatcher is
+# used to skip its completed tasks and to reattach to its tasks that are still
+# running (celery backend with a persistent result backend only, results sent
+# to the rpc:// backend are lost with the dispatcher that submitted the
+# tasks, so these tasks are resubmitted).
+# With parse set, the workers parse the traces of every simulation as soon as it
+# has completed. The output of the parse scripts is stored in the results
+# database in parse_output_dir as the results come in (see results_db.py), and
+# their output files in parse_output_dir are exported from it when all tasks
+# have completed.
+# The resource usage of every simulation is recorded in the run metrics database
+# (see run_metrics.py) under sweep_name.
+# Returns a dict mapping the index in cli_commands of every task that was run to
+# its result (the summary returned by run_simulation, or the exception raised by
+# the task).
+def dispatch_simulation_tasks(cli_commands, skip_completed=True, longest_first=True, backend='celery', processes=None, journal_file_name=None, resume=False, parse=False, parse_output_dir='.', sweep_name=None, num_commands=None):
+    build_id = get_ns3_build_id()
+    manifest = load_manifest() if skip_completed else {}
+    journaled = load_journal(journal_file_name) if journal_file_name and resume else {}
+    can_reattach = backend == 'celery' and not isinstance(app.backend, RPCBackend)
+    num_tasks = num_commands if num_commands is not None else len(cli_commands)
+    num_skipped = [0]
+
+    # Yields (index in cli_commands, command, estimated cost, id of the task to
+    # reattach to or None) of the commands to dispatch, in dispatch order
+    def iter_tasks():
+        for i, cli_command, cost in iter_dispatch_order(cli_commands, longest_first):
+            journal_state = journaled.get(cli_command, {}).get('status')
+            if is_completed(manifest, command_fingerprint(cli_command, build_id)) or journal_state == 'completed':
+                print("Skipping (already completed): {}".format(cli_command))
+                num_skipped[0] += 1
+            elif journal_state == 'submitted' and can_reattach:
+                yield i, cli_command, cost, journaled[cli_command]['taskId']
+            else:
+                yield i, cli_command, cost, None
+
+    journal_file = open_journal(journal_file_name, resume) if journal_file_name else None
+    results_db = None
+    if parse:
+        os.makedirs(parse_output_dir, exist_ok=True)
+        results_db = open_results(os.path.join(parse_output_dir, results_file_name))
+        for table_names, output_files in get_parse_output_files(parse_output_dir).values():
+            keep_unexported_outputs(results_db, table_names, output_files)
+    run_metrics = open_run_metrics()
+    task_indexes = {} # task id -> index in cli_commands
+    commands = {} # index in cli_commands -> command of the tasks that have not completed yet
+    results_by_index = {} # index in cli_commands -> result of the task
+    completed = [0] # mutable counter so the callback can update it
+
+    # Called for every task result as soon as it is available, in order of
+    # completion:
+    def on_task_completed(task_id, value):
+        completed[0] += 1
+        list_index = task_indexes[task_id]
+        cli_command = commands.pop(list_index)
+        num_waiting = len(task_indexes)
+        results_by_index[list_index] = value
+        if isinstance(value, Exception):
+            print ("Task #{}/{} has failed ({}/{} done): {}: {}".format(list_index, num_tasks, completed[0], num_waiting, cli_command, value))
+            if journal_file:
+                write_journal_event(journal_file, "failed", taskId=task_id, error=str(value))
+        else:
+            print ("Task #{}/{} has completed ({}/{} done, exit code {}, {:.1f}s): {}".format(list_index, num_tasks, completed[0], num_waiting, value['returncode'], value['wallTime'], cli_command))
+            record_run_metrics(run_metrics, cli_command, value, sweep_name)
+            if value['returncode'] != 0:
+                print ("Simulation exited with a non-zero exit code, see {}".format(value['stderrLog']))
+            else:
+                record_completion(command_fingerprint(cli_command, build_id), cli_command, value)
+            if value.get('parseError'):
+                print ("Parsing the traces of task #{}/{} has failed: {}".format(list_index, num_tasks, value['parseError']))
+            elif value.get('parsedOutputs'):
+                store_parsed_outputs(results_db, value)
+            if journal_file:
+                write_journal_event(journal_file, "completed" if value['returncode'] == 0 else "failed", taskId=task_id, returncode=value['returncode'], wallTime=value['wallTime'])
+
+    # Called when a task has been handed to the backend:
+    def on_task_submitted(list_index, cli_command, task_id, event="submitted"):
+        task_indexes[task_id] = list_index
+        commands[list_index] = cli_command
+        if journal_file:
+            write_journal_event(journal_file, event, taskId=task_id, index=list_index, command=cli_command)
+
+    if backend == 'local':
+        processes = processes or os.cpu_count()
+        print("Running following cli commands in {} local processes:".format(processes))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=init_local_process) as executor:
+            futures = {}
+            for i, cli_command, cost, reattach_task_id in iter_tasks():
+                print_dispatched_command(cli_command, cost)
+                task_id = uuid.uuid4().hex
+                on_task_submitted(i, cli_command, task_id)
+                futures[executor.submit(run_simulation, cli_command, parse)] = task_id
+
+            print("\nWaiting for all tasks to complete ({} skipped):".format(num_skipped[0]))
+            for future in concurrent.futures.as_completed(futures):
+                value = future.exception() or future.result()
+                on_task_completed(futures[future], value)
+    elif backend == 'celery':
+        print("Dispatching following cli commands to celery workers:")
+        async_results = list()
+        for i, cli_command, cost, reattach_task_id in iter_tasks():
+            if reattach_task_id is not None:
+                print("Reattaching to task {}: {}".format(reattach_task_id, cli_command))
+                async_results.append(AsyncResult(reattach_task_id, app=app))
+                on_task_submitted(i, cli_command, reattach_task_id, "reattached")
+                continue
+            print_dispatched_command(cli_command, cost)
+            task_id = uuid.uuid4().hex # unique over all dispatcher runs, so a resumed dispatcher can reattach to it
+            # Journal the task before it is sent: a dispatcher that dies right
+            # after sending it must not leave a task running that a resumed
+            # dispatcher does not know about (and runs a second time)
+            on_task_submitted(i, cli_command, task_id)
+            try:
+                r = run_simulation_task.apply_async((cli_command, parse), task_id=task_id)
+            except Exception as e:
+                if journal_file:
+                    write_journal_event(journal_file, "failed", taskId=task_id, error=str(e))
+                raise
+            async_results.append(r)
+
+        print("\nWaiting for all tasks to complete ({} skipped):".format(num_skipped[0]))
+        # Results are pushed to us by the result backend (e.g. the rpc:// reply
+        # queue) instead of polling every AsyncResult, so the load on the backend
+        # does not grow with the number of tasks in the sweep.
+        result_set = ResultSet(async_results)
+        if result_set.supports_native_join:
+            result_set.join_native(callback=on_task_completed, propagate=False)
+        else:
+            result_set.join(callback=on_task_completed, propagate=False)
+    else:
+        raise ValueError("Unknown backend {}".format(backend))
+    if journal_file:
+        journal_file.close()
+    run_metrics.close()
+    if parse:
+        export_parsed_outputs(results_db, parse_output_dir)
+        results_db.close()
+    print("All tasks have completed. Stopping")
+    return results_by_index